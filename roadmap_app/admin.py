@@ -1,9 +1,30 @@
 from django.contrib import admin
 from .models import (
     MineralType, Stage, Question, 
-    Work, UserGanttChart
+    Work, UserGanttChart, ChartScenario,
+    WorkingCalendar, CalendarDay
 )
 from django import forms
+from .stage_graph import clean_stage_form
+from .versioning import batched_changes
+
+class BatchedVersionAdmin(admin.ModelAdmin):
+    """
+    Одна версия справочника на действие админки: удаление с каскадом,
+    правку списка (list_editable) или сохранение записи со связями
+    """
+    
+    def changelist_view(self, request, extra_context=None):
+        with batched_changes('bulk'):
+            return super().changelist_view(request, extra_context)
+    
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with batched_changes('save'):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+    
+    def delete_view(self, request, object_id, extra_context=None):
+        with batched_changes('delete'):
+            return super().delete_view(request, object_id, extra_context)
 
 class WorkAdminForm(forms.ModelForm):
     """
@@ -17,14 +38,28 @@ class WorkAdminForm(forms.ModelForm):
             'executor': forms.Textarea(attrs={'rows': 2}),
         }
 
+class StageAdminForm(forms.ModelForm):
+    """
+    Форма этапа с проверкой графа зависимостей
+    """
+    class Meta:
+        model = Stage
+        fields = '__all__'
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        clean_stage_form(self, cleaned_data)
+        return cleaned_data
+
 @admin.register(MineralType)
-class MineralTypeAdmin(admin.ModelAdmin):
+class MineralTypeAdmin(BatchedVersionAdmin):
     list_display = ('name', 'code', 'created_at')
     search_fields = ('name', 'code')
     prepopulated_fields = {'code': ('name',)}
 
 @admin.register(Stage)
-class StageAdmin(admin.ModelAdmin):
+class StageAdmin(BatchedVersionAdmin):
+    form = StageAdminForm
     list_display = ('name', 'mineral_type', 'order', 'duration_months', 'start_month')
     list_filter = ('mineral_type',)
     search_fields = ('name', 'description')
@@ -35,7 +70,7 @@ class StageAdmin(admin.ModelAdmin):
             'fields': ('mineral_type', 'name', 'code', 'order', 'description')
         }),
         ('Время', {
-            'fields': ('duration_months', 'start_month')
+            'fields': ('duration_months', 'duration_min_months', 'duration_max_months', 'start_month')
         }),
         ('Отображение', {
             'fields': ('color',)
@@ -47,13 +82,13 @@ class StageAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(BatchedVersionAdmin):
     list_display = ('text', 'code')
     search_fields = ('text', 'code')
     filter_horizontal = ('mineral_types', 'target_stages')
 
 @admin.register(Work)
-class WorkAdmin(admin.ModelAdmin):
+class WorkAdmin(BatchedVersionAdmin):
     form = WorkAdminForm
     list_display = ('number', 'title', 'stage', 'duration_months', 'start_month', 'order')
     list_filter = ('stage__mineral_type', 'stage')
@@ -67,7 +102,7 @@ class WorkAdmin(admin.ModelAdmin):
             'fields': ('description', 'executor')
         }),
         ('Время', {
-            'fields': ('duration_months', 'start_month')
+            'fields': ('duration_months', 'duration_min_months', 'duration_max_months', 'start_month', 'is_field_work')
         }),
         ('Порядок', {
             'fields': ('order',)
@@ -76,7 +111,41 @@ class WorkAdmin(admin.ModelAdmin):
 
 @admin.register(UserGanttChart)
 class UserGanttChartAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'mineral_type', 'start_stage', 'created_at')
-    list_filter = ('mineral_type', 'created_at')
+    list_display = (
+        'title', 'user', 'mineral_type', 'start_stage',
+        'total_duration', 'stage_count', 'work_count',
+        'critical_path_length', 'payload_bytes', 'created_at'
+    )
+    list_filter = ('mineral_type', 'calendar', 'created_at')
+    list_select_related = ('user', 'mineral_type', 'start_stage')
     search_fields = ('title', 'user__username')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = (
+        'created_at', 'updated_at',
+        'total_duration', 'stage_count', 'work_count',
+        'critical_path_length', 'payload_bytes'
+    )
+    
+    def get_queryset(self, request):
+        # Сводные колонки заменяют разбор chart_data в списке
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('chart_data')
+        return queryset
+
+@admin.register(ChartScenario)
+class ChartScenarioAdmin(admin.ModelAdmin):
+    list_display = ('name', 'chart', 'total_duration', 'updated_at')
+    list_select_related = ('chart',)
+    search_fields = ('name', 'chart__title')
+    raw_id_fields = ('chart',)
+    readonly_fields = ('total_duration', 'created_at', 'updated_at')
+
+class CalendarDayInline(admin.TabularInline):
+    model = CalendarDay
+    extra = 1
+
+@admin.register(WorkingCalendar)
+class WorkingCalendarAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'weekend_days', 'field_season_start', 'field_season_end', 'is_default')
+    search_fields = ('name', 'code')
+    inlines = [CalendarDayInline]
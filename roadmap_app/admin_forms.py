@@ -3,12 +3,11 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import json
-import pandas as pd
-from io import StringIO
 from .models import (
     MineralType, Stage, Work, Question, FAQ,
     DataImportTemplate, DataImportLog
 )
+from .stage_graph import clean_stage_form
 
 class MineralTypeForm(forms.ModelForm):
     class Meta:
@@ -34,7 +33,8 @@ class StageForm(forms.ModelForm):
     class Meta:
         model = Stage
         fields = ['mineral_type', 'name', 'code', 'order', 'description', 
-                 'duration_months', 'start_month', 'color', 'depends_on']
+                 'duration_months', 'duration_min_months', 'duration_max_months',
+                 'start_month', 'color', 'depends_on']
         widgets = {
             'mineral_type': forms.Select(attrs={'class': 'form-control'}),
             'name': forms.TextInput(attrs={
@@ -57,6 +57,14 @@ class StageForm(forms.ModelForm):
                 'class': 'form-control',
                 'min': 1
             }),
+            'duration_min_months': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 0
+            }),
+            'duration_max_months': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1
+            }),
             'start_month': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'min': 0
@@ -70,12 +78,25 @@ class StageForm(forms.ModelForm):
                 'style': 'width: 100%;'
             }),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Подпись этапа включает тип ПИ: без JOIN был бы запрос на каждый вариант.
+        # Поля может не быть в форме пакетной правки (bulk), суженной до измененных полей
+        if 'depends_on' in self.fields:
+            self.fields['depends_on'].queryset = Stage.objects.select_related('mineral_type')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        clean_stage_form(self, cleaned_data)
+        return cleaned_data
 
 class WorkForm(forms.ModelForm):
     class Meta:
         model = Work
         fields = ['stage', 'number', 'title', 'description', 'executor',
-                 'duration_months', 'start_month', 'order']
+                 'duration_months', 'duration_min_months', 'duration_max_months',
+                 'start_month', 'order']
         widgets = {
             'stage': forms.Select(attrs={'class': 'form-control'}),
             'number': forms.TextInput(attrs={
@@ -98,6 +119,14 @@ class WorkForm(forms.ModelForm):
                 'class': 'form-control',
                 'min': 1
             }),
+            'duration_min_months': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 0
+            }),
+            'duration_max_months': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1
+            }),
             'start_month': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'min': 0
@@ -107,6 +136,11 @@ class WorkForm(forms.ModelForm):
                 'min': 0
             }),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'stage' in self.fields:
+            self.fields['stage'].queryset = Stage.objects.select_related('mineral_type')
 
 class QuestionForm(forms.ModelForm):
     class Meta:
@@ -132,6 +166,11 @@ class QuestionForm(forms.ModelForm):
                 'class': 'form-control select2'
             }),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'target_stages' in self.fields:
+            self.fields['target_stages'].queryset = Stage.objects.select_related('mineral_type')
 
 class FAQForm(forms.ModelForm):
     class Meta:
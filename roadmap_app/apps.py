@@ -4,3 +4,11 @@ class RoadmapAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'roadmap_app'
     verbose_name = 'Диаграммы Ганта'
+    
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .db_tuning import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='roadmap_app.sqlite_pragmas')
@@ -0,0 +1,147 @@
+"""
+Потоковый ZIP-архив с несколькими диаграммами Ганта.
+
+Архив пишется zipfile в неперематываемый буфер, который опустошается
+после каждой порции данных, поэтому скачивание начинается сразу,
+а память не зависит от числа диаграмм. Файлы диаграмм готовятся
+в пуле потоков, но в работе одновременно не больше
+2 × CHART_ARCHIVE_WORKERS диаграмм, и в архив они попадают
+в исходном порядке.
+"""
+import json
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .artifacts import download_stem, get_or_build
+from .exporters import plan_start_date, write_csv, write_xlsx
+
+ARCHIVE_FORMATS = ('json', 'csv', 'xlsx')
+ARCHIVE_WORKERS = getattr(settings, 'CHART_ARCHIVE_WORKERS', 4)
+ARCHIVE_CHART_FIELDS = ('id', 'title', 'anchor_date', 'created_at', 'updated_at', 'chart_data')
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+class _ZipStream:
+    """
+    Файл только для записи: zipfile, не найдя tell(), пишет архив
+    с дескрипторами данных, не возвращаясь назад
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """
+        Отдает накопленные байты одной порцией (или ничего, если буфер пуст)
+        """
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+
+def _chart_json(chart):
+    return json.dumps({
+        'id': chart.id,
+        'title': chart.title,
+        'created_at': chart.created_at,
+        'updated_at': chart.updated_at,
+        'chart_data': chart.chart_data,
+    }, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def render_chart_files(chart, formats):
+    """
+    Готовит файлы одной диаграммы: [(имя в архиве, bytes или путь к файлу)]
+    """
+    from .calendars import export_dates
+    chart_data = chart.chart_data or {}
+    stem = download_stem(chart)
+    files = []
+
+    for export_format in formats:
+        name = f'{chart.id}_{stem}.{export_format}'
+        if export_format == 'json':
+            files.append((name, _chart_json(chart)))
+        elif export_format == 'csv':
+            buffer = BytesIO()
+            write_csv(chart_data, buffer, start_date=plan_start_date(chart), dates=export_dates(chart))
+            files.append((name, buffer.getvalue()))
+        elif export_format == 'xlsx':
+            # Книга берется из общего кэша экспорта и копируется в архив с диска
+            path = get_or_build(chart, 'xlsx', lambda out: write_xlsx(
+                chart_data, out, title=chart.title,
+                start_date=plan_start_date(chart), stamp=chart.updated_at, dates=export_dates(chart),
+            ))
+            files.append((name, path))
+
+    return files
+
+
+def _zip_info(name, chart, compress_type):
+    info = zipfile.ZipInfo(name, date_time=timezone.localtime(chart.updated_at).timetuple()[:6])
+    info.compress_type = compress_type
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def iter_archive(charts, formats=ARCHIVE_FORMATS, workers=ARCHIVE_WORKERS):
+    """
+    Генератор порций ZIP-архива для StreamingHttpResponse
+    """
+    stream = _ZipStream()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-archive')
+    pending = deque()
+    charts = iter(charts)
+
+    def submit_next():
+        chart = next(charts, None)
+        if chart is not None:
+            pending.append((chart, executor.submit(render_chart_files, chart, formats)))
+
+    try:
+        with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for _ in range(workers * 2):
+                submit_next()
+
+            while pending:
+                chart, future = pending.popleft()
+                files = future.result()
+                submit_next()
+
+                for name, content in files:
+                    if isinstance(content, bytes):
+                        archive.writestr(_zip_info(name, chart, zipfile.ZIP_DEFLATED), content)
+                        yield from stream.drain()
+                        continue
+
+                    # XLSX уже сжат, поэтому кладется без повторного сжатия
+                    info = _zip_info(name, chart, zipfile.ZIP_STORED)
+                    info.file_size = content.stat().st_size
+                    with open(content, 'rb') as source, archive.open(info, 'w') as target:
+                        while chunk := source.read(COPY_CHUNK_SIZE):
+                            target.write(chunk)
+                            yield from stream.drain()
+                    yield from stream.drain()
+
+        yield from stream.drain()
+    finally:
+        # Клиент мог оборвать загрузку: незапущенные задачи отменяются
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def archive_name():
+    return f'charts_{timezone.localdate():%Y%m%d}.zip'
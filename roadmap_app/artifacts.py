@@ -0,0 +1,116 @@
+"""
+Файловый кэш экспортированных диаграмм.
+
+Файл определяется диаграммой, ее версией (updated_at), версией ее
+рабочего календаря и форматом, поэтому изменение диаграммы или календаря
+(даты в экспорте идут по нему) автоматически делает старые файлы
+неактуальными; они удаляются при следующей сборке того же формата.
+"""
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Блокировки сборки по пути файла: параллельные запросы одного и того же
+# экспорта ждут первую сборку, а не строят файл заново
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def cache_dir():
+    return Path(getattr(settings, 'CHART_EXPORT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'chart_exports'))
+
+
+def chart_version(chart):
+    return int(chart.updated_at.timestamp() * 1_000_000)
+
+
+def _variant_name(variant):
+    return re.sub(r'[^0-9A-Za-z_-]', '_', str(variant)) if variant else 'default'
+
+
+def calendar_version(chart):
+    """
+    Версия рабочего календаря диаграммы (или календаря по умолчанию); 0 — календаря нет
+    """
+    from .calendars import chart_calendar
+
+    calendar = chart_calendar(chart)
+    return int(calendar.updated_at.timestamp() * 1_000_000) if calendar else 0
+
+
+def artifact_path(chart, extension, variant=''):
+    name = f'{chart.id}-{chart_version(chart)}-{calendar_version(chart)}-{_variant_name(variant)}.{extension}'
+    return cache_dir() / str(chart.id) / name
+
+
+def get_or_build(chart, extension, builder, variant=''):
+    """
+    Возвращает путь к файлу экспорта, собирая его при отсутствии.
+
+    builder(out) пишет файл в бинарный поток. Запись идет во временный
+    файл с последующим атомарным переименованием, поэтому параллельные
+    запросы никогда не увидят недописанный файл.
+    """
+    path = artifact_path(chart, extension, variant)
+    if path.exists():
+        return path
+
+    with _build_lock(path):
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+        try:
+            with open(temporary, 'wb') as out:
+                builder(out)
+            os.replace(temporary, path)
+        finally:
+            if temporary.exists():
+                temporary.unlink()
+
+    _remove_stale(path, extension, variant)
+    return path
+
+
+@contextmanager
+def _build_lock(path):
+    key = str(path)
+    with _build_locks_guard:
+        lock, users = _build_locks.get(key, (None, 0))
+        lock = lock or threading.Lock()
+        _build_locks[key] = (lock, users + 1)
+
+    try:
+        with lock:
+            yield
+    finally:
+        with _build_locks_guard:
+            users = _build_locks[key][1] - 1
+            if users:
+                _build_locks[key] = (lock, users)
+            else:
+                del _build_locks[key]
+
+
+def _remove_stale(current, extension, variant):
+    suffix = f'-{_variant_name(variant)}.{extension}'
+    for candidate in current.parent.iterdir():
+        if candidate != current and candidate.name.endswith(suffix):
+            try:
+                candidate.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def download_stem(chart):
+    # Убираем символы, недопустимые в именах файлов
+    return re.sub(r'[\\/:*?"<>|]+', '_', chart.title).strip() or f'gantt_{chart.id}'
+
+
+def download_name(chart, extension):
+    return f'{download_stem(chart)}.{extension}'
@@ -0,0 +1,311 @@
+"""
+Пакетная правка ячеек таблицы справочника (data_management).
+
+Пакет — список изменений {'id', 'field', 'value'} по многим строкам
+и полям. Каждая затронутая строка проверяется формой раздела
+модератора — теми же правилами, что и при редактировании записи, —
+но только по измененным полям: класс формы сужается через
+modelform_factory, поэтому проверки уникальности и зависимостей
+выполняются лишь тогда, когда затронуты их поля.
+
+Если ошибок нет, все строки записываются одним bulk_update в
+транзакции; иначе не записывается ничего, а ошибки возвращаются
+по ячейкам.
+
+Массовая правка (одно значение одного поля для списка id) приводит
+значение через поле модели, проверяет строки, обновляет их частями
+под лимит параметров запроса и пишет компактный журнал для отмены.
+Обе операции отправляют одно событие reference_data_changed.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, models, transaction
+from django.forms import modelform_factory
+from django.utils import timezone
+
+from .admin_forms import FAQForm, MineralTypeForm, QuestionForm, StageForm, WorkForm
+from .models import BulkEditJournal, Stage
+from .signals import reference_data_changed
+from .stage_graph import dependency_graph_errors, new_dependency_graph_errors
+
+EDIT_FORMS = {
+    'mineral_type': MineralTypeForm,
+    'stage': StageForm,
+    'work': WorkForm,
+    'question': QuestionForm,
+    'faq': FAQForm,
+}
+BULK_EDIT_MAX_CELLS = 5000
+BULK_EDIT_MAX_ROWS = 1000
+# Размер части списка id, если у СУБД нет лимита параметров запроса
+BULK_EDIT_CHUNK = 5000
+# Параметры запроса сверх списка id (значение, updated_at, фильтр)
+RESERVED_QUERY_PARAMS = 10
+BOOLEAN_STRINGS = {'true': True, 'да': True, '1': True, 'false': False, 'нет': False, '0': False}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def editable_fields(model_type):
+    """
+    Поля, которые можно менять в таблице: поля формы, кроме связей многие-ко-многим
+    """
+    form_class = EDIT_FORMS[model_type]
+    model = form_class._meta.model
+    return [name for name in form_class._meta.fields if not model._meta.get_field(name).many_to_many]
+
+
+def group_changes(changes):
+    """
+    Изменения по строкам: {id: {поле: значение}}; ошибки формата пакета — ValueError
+    """
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Ожидается непустой список изменений')
+    if len(changes) > BULK_EDIT_MAX_CELLS:
+        raise ValueError(f'За один запрос можно изменить не больше {BULK_EDIT_MAX_CELLS} ячеек')
+
+    rows = {}
+    for change in changes:
+        if not isinstance(change, dict) or set(change) != {'id', 'field', 'value'}:
+            raise ValueError('Каждое изменение должно содержать id, field и value')
+        try:
+            row_id = int(change['id'])
+        except (TypeError, ValueError):
+            raise ValueError(f'Некорректный id: {change["id"]}')
+        rows.setdefault(row_id, {})[str(change['field'])] = change['value']
+
+    if len(rows) > BULK_EDIT_MAX_ROWS:
+        raise ValueError(f'За один запрос можно изменить не больше {BULK_EDIT_MAX_ROWS} записей')
+    return rows
+
+
+def _cell_error(row_id, field, message):
+    return {'id': row_id, 'field': field, 'message': message}
+
+
+def validate_rows(model_type, rows):
+    """
+    Проверяет строки формой по измененным полям и переносит значения в объекты.
+
+    Возвращает (объекты {id: instance}, ошибки по ячейкам); field = None —
+    ошибка строки целиком
+    """
+    form_class = EDIT_FORMS[model_type]
+    model = form_class._meta.model
+    allowed = set(editable_fields(model_type))
+    instances = model.objects.in_bulk(list(rows))
+    forms_by_fields = {}
+    errors = []
+
+    for row_id, values in rows.items():
+        unknown = [field for field in values if field not in allowed]
+        for field in unknown:
+            errors.append(_cell_error(row_id, field, 'Поле нельзя изменить в таблице'))
+        instance = instances.get(row_id)
+        if instance is None:
+            errors.append(_cell_error(row_id, None, 'Запись не найдена'))
+        if unknown or instance is None:
+            continue
+
+        fields = tuple(sorted(values))
+        if fields not in forms_by_fields:
+            forms_by_fields[fields] = modelform_factory(model, form=form_class, fields=fields)
+        # Значения формы переносятся в instance при проверке (ModelForm._post_clean)
+        form = forms_by_fields[fields](data=values, instance=instance)
+        if not form.is_valid():
+            for field, messages in form.errors.items():
+                errors.append(_cell_error(row_id, None if field == '__all__' else field, ' '.join(messages)))
+
+    return instances, errors
+
+
+def apply_cell_changes(model_type, changes):
+    """
+    Применяет пакет изменений: {'success', 'updated', 'rows': {id: {поле: значение}}}
+    или {'success': False, 'errors': [...]}; ошибки формата пакета — ValueError
+    """
+    rows = group_changes(changes)
+    instances, errors = validate_rows(model_type, rows)
+    if errors:
+        return {'success': False, 'errors': errors}
+
+    model = EDIT_FORMS[model_type]._meta.model
+    fields = sorted({field for values in rows.values() for field in values})
+    changed = [instances[row_id] for row_id in rows]
+    # bulk_update не обновляет auto_now, поэтому время изменения ставится явно
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        now = timezone.now()
+        for instance in changed:
+            instance.updated_at = now
+        fields.append('updated_at')
+
+    # Смена типа ПИ может сделать зависимости этапов недопустимыми
+    check_graph = model is Stage and 'mineral_type' in fields
+    try:
+        with transaction.atomic():
+            known_errors = dependency_graph_errors() if check_graph else []
+            model.objects.bulk_update(changed, fields)
+            if check_graph:
+                graph_errors = new_dependency_graph_errors(known_errors)
+                if graph_errors:
+                    raise _Rollback(graph_errors)
+    except _Rollback as e:
+        return {'success': False, 'errors': [_cell_error(None, 'mineral_type', message) for message in e.args[0]]}
+    except IntegrityError as e:
+        return {'success': False, 'errors': [_cell_error(None, None, f'Изменения нарушают ограничение базы данных: {e}')]}
+
+    reference_data_changed.send(sender=model, ids=list(rows), fields=fields)
+    return {
+        'success': True,
+        'updated': len(changed),
+        'rows': {
+            row_id: {field: model._meta.get_field(field).value_from_object(instances[row_id]) for field in values}
+            for row_id, values in rows.items()
+        },
+    }
+
+
+def id_chunks(ids):
+    """
+    Части списка id, умещающиеся в лимит параметров запроса (999 в SQLite)
+    """
+    limit = connection.features.max_query_params
+    size = limit - RESERVED_QUERY_PARAMS if limit else BULK_EDIT_CHUNK
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def coerce_value(model_field, raw_value):
+    """
+    Значение из формы, приведенное и проверенное полем модели; ошибки — ValidationError
+    """
+    if isinstance(raw_value, str):
+        raw_value = raw_value.strip()
+        if isinstance(model_field, models.BooleanField):
+            raw_value = BOOLEAN_STRINGS.get(raw_value.lower(), raw_value)
+        elif raw_value == '' and model_field.null:
+            raw_value = None
+    # to_python, обязательность, choices и валидаторы поля; для ForeignKey — и существование записи
+    return model_field.clean(raw_value, None)
+
+
+def _journal_value(value):
+    # Ключ группировки: значения сравниваются в том виде, в каком попадут в JSON
+    return json.dumps(value, cls=DjangoJSONEncoder, sort_keys=True)
+
+
+def _check_unique(model, model_field, value, ids):
+    if not model_field.unique or value is None:
+        return
+    if len(ids) > 1:
+        raise ValidationError(f'Поле «{model_field.verbose_name}» уникально: одно значение нельзя задать нескольким записям')
+    if model.objects.filter(**{model_field.attname: value}).exclude(id__in=ids).exists():
+        raise ValidationError(f'Значение «{value}» поля «{model_field.verbose_name}» уже занято')
+
+
+def _read_old_values(model, model_field, value, ids):
+    """
+    Прежние значения {значение JSON: (значение, [id])}; если у модели есть
+    собственная проверка строки (clean), она выполняется с новым значением
+    """
+    attname = model_field.attname
+    groups = {}
+    errors = []
+    row_check = model.clean is not models.Model.clean
+
+    for chunk in id_chunks(ids):
+        if row_check:
+            rows = []
+            for instance in model.objects.filter(id__in=chunk):
+                rows.append((instance.id, getattr(instance, attname)))
+                setattr(instance, attname, value)
+                try:
+                    instance.clean()
+                except ValidationError as e:
+                    errors.append(f'#{instance.id}: {" ".join(e.messages)}')
+        else:
+            rows = model.objects.filter(id__in=chunk).values_list('id', attname)
+        for row_id, old_value in rows:
+            groups.setdefault(_journal_value(old_value), (old_value, []))[1].append(row_id)
+
+    if errors:
+        shown = '; '.join(errors[:5])
+        more = f' и еще {len(errors) - 5}' if len(errors) > 5 else ''
+        raise ValidationError(f'Значение не подходит для записей {shown}{more}')
+    return groups
+
+
+def _update_rows(model, updates, ids, only_if=None):
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        updates = {**updates, 'updated_at': timezone.now()}
+    updated = 0
+    for chunk in id_chunks(ids):
+        updated += model.objects.filter(id__in=chunk, **(only_if or {})).update(**updates)
+    return updated
+
+
+def bulk_set_field(model_type, ids, field_name, raw_value, user=None):
+    """
+    Задает одно значение поля всем записям из ids и возвращает запись журнала.
+    Ошибки поля, значения и проверок строк — ValidationError
+    """
+    if field_name not in editable_fields(model_type):
+        raise ValidationError(f'Поле «{field_name}» нельзя изменить массово')
+    model = EDIT_FORMS[model_type]._meta.model
+    model_field = model._meta.get_field(field_name)
+    value = coerce_value(model_field, raw_value)
+    ids = sorted(set(ids))
+
+    check_graph = model is Stage and field_name == 'mineral_type'
+    with transaction.atomic():
+        _check_unique(model, model_field, value, ids)
+        groups = _read_old_values(model, model_field, value, ids)
+        changed_ids = sorted(row_id for _, group_ids in groups.values() for row_id in group_ids)
+        known_errors = dependency_graph_errors() if check_graph else []
+        try:
+            _update_rows(model, {model_field.attname: value}, changed_ids)
+        except IntegrityError as e:
+            raise ValidationError(f'Изменение нарушает ограничение базы данных: {e}')
+        if check_graph:
+            graph_errors = new_dependency_graph_errors(known_errors)
+            if graph_errors:
+                raise ValidationError(graph_errors)
+        journal = BulkEditJournal.objects.create(
+            user=user,
+            model_type=model_type,
+            field_name=field_name,
+            new_value=value,
+            old_values=[[old_value, group_ids] for old_value, group_ids in groups.values()],
+            row_count=len(changed_ids),
+        )
+
+    reference_data_changed.send(sender=model, ids=changed_ids, fields=[field_name])
+    return journal
+
+
+def revert_bulk_edit(journal):
+    """
+    Возвращает прежние значения массовой правки. Записи, у которых значение
+    с тех пор изменили, не трогаются. Возвращает число восстановленных записей
+    """
+    if journal.undone_at:
+        raise ValueError('Правка уже отменена')
+    model = EDIT_FORMS[journal.model_type]._meta.model
+    model_field = model._meta.get_field(journal.field_name)
+    current = {model_field.attname: model_field.to_python(journal.new_value)}
+
+    restored = 0
+    restored_ids = []
+    with transaction.atomic():
+        for old_value, ids in journal.old_values:
+            restored += _update_rows(model, {model_field.attname: model_field.to_python(old_value)}, ids, only_if=current)
+            restored_ids.extend(ids)
+        journal.undone_at = timezone.now()
+        journal.save(update_fields=['undone_at'])
+
+    reference_data_changed.send(sender=model, ids=restored_ids, fields=[journal.field_name])
+    return restored
@@ -0,0 +1,222 @@
+"""
+Календарная привязка диаграмм: месяцы плана переводятся в реальные даты.
+
+Для рабочего календаря строится таблица на диапазон лет: признак
+рабочего дня (и рабочего дня полевого сезона) для каждого дня,
+префиксные суммы по ним и номера самих рабочих дней. Число рабочих
+дней между датами, ближайший рабочий день и k-й рабочий день после
+даты — по одному обращению к спискам, поэтому перевод тысяч работ
+в даты — один проход по этапам без циклов по дням. Таблицы кэшируются
+в процессе до изменения календаря.
+
+Расписание по дням строится поверх помесячного: работа требует столько
+рабочих дней, сколько их в ее месяцах по плану, и занимает первые
+подходящие дни начиная с плановой даты. Полевые работы идут только
+в полевой сезон, поэтому могут сдвинуть окончание своего этапа,
+а вслед за ним — и следующие этапы.
+"""
+import math
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from .exporters import add_months, plan_start_date
+from .models import CalendarDay, WorkingCalendar
+
+DEFAULT_WEEKEND = (5, 6)
+# Запас лет в таблице сверх длительности плана; при нехватке таблица удваивается
+CALENDAR_MARGIN_YEARS = 2
+CALENDAR_MAX_YEARS = 200
+CALENDAR_TABLES_CACHED = 32
+
+
+class CalendarTable:
+    """
+    Рабочие дни на отрезке [first_day, first_day + days).
+
+    Дни адресуются индексом от first_day; kind — 'working' (все рабочие
+    дни) или 'field' (рабочие дни полевого сезона).
+    """
+
+    def __init__(self, first_day, days, weekend=DEFAULT_WEEKEND, exceptions=(), season=None):
+        self.first_day = first_day
+        self.days = days
+
+        offsets = np.arange(days)
+        working = ~np.isin((first_day.weekday() + offsets) % 7, list(weekend))
+        for day, is_working in exceptions:
+            index = (day - first_day).days
+            if 0 <= index < days:
+                working[index] = is_working
+
+        field = working
+        if season:
+            start, end = season
+            months = (np.datetime64(first_day, 'D') + offsets).astype('datetime64[M]').astype(np.int64) % 12 + 1
+            in_season = (months >= start) & (months <= end) if start <= end else (months >= start) | (months <= end)
+            field = working & in_season
+
+        self._prefix, self._positions = {}, {}
+        for kind, mask in (('working', working), ('field', field)):
+            self._prefix[kind] = np.concatenate([[0], np.cumsum(mask)]).tolist()
+            self._positions[kind] = np.flatnonzero(mask).tolist()
+
+    def index(self, day):
+        return (day - self.first_day).days
+
+    def date(self, index):
+        return self.first_day + timedelta(days=index)
+
+    def working_days(self, start, end, kind='working'):
+        """
+        Число рабочих дней в [start, end) (индексы)
+        """
+        prefix = self._prefix[kind]
+        return prefix[end] - prefix[start] if end > start else 0
+
+    def nth_on_or_after(self, index, count=1, kind='working'):
+        """
+        Индекс count-го рабочего дня начиная с index; IndexError — за пределами таблицы
+        """
+        return self._positions[kind][self._prefix[kind][index] + count - 1]
+
+    def last_before(self, index, kind='working'):
+        """
+        Индекс последнего рабочего дня до index
+        """
+        rank = self._prefix[kind][index] - 1
+        return self._positions[kind][rank] if rank >= 0 else index - 1
+
+
+@lru_cache(maxsize=CALENDAR_TABLES_CACHED)
+def _cached_table(calendar_id, version, first_year, years):
+    first_day = date(first_year, 1, 1)
+    days = (date(first_year + years, 1, 1) - first_day).days
+    if calendar_id is None:
+        return CalendarTable(first_day, days)
+
+    calendar = WorkingCalendar.objects.get(id=calendar_id)
+    exceptions = CalendarDay.objects.filter(calendar_id=calendar_id).values_list('date', 'is_working')
+    season = None
+    if calendar.field_season_start and calendar.field_season_end:
+        season = (calendar.field_season_start, calendar.field_season_end)
+    return CalendarTable(first_day, days, calendar.weekend_numbers(), exceptions, season)
+
+
+def calendar_table(calendar, first_year, years):
+    """
+    Таблица календаря (None — пн-пт без праздников) на years лет с first_year
+    """
+    if calendar is None:
+        return _cached_table(None, None, first_year, years)
+    return _cached_table(calendar.id, calendar.updated_at.timestamp(), first_year, years)
+
+
+def chart_calendar(chart):
+    """
+    Календарь диаграммы или календарь по умолчанию
+    """
+    if chart.calendar_id:
+        return chart.calendar
+    return WorkingCalendar.objects.filter(is_default=True).first()
+
+
+def schedule_dates(chart_data, anchor, table):
+    """
+    Даты этапов и работ: {'stages': {id: [начало, окончание]}, 'works': {...}, 'end_date'}.
+
+    Даты — первый и последний рабочий день (окончание включительно), ISO.
+    IndexError означает, что план не уместился в таблицу.
+    """
+    month_index = {}
+
+    def month(number):
+        if number not in month_index:
+            month_index[number] = table.index(add_months(anchor, number))
+        return month_index[number]
+
+    stages, works = {}, {}
+    finish = {}
+    previous_end = table.index(anchor)
+
+    for stage in chart_data.get('stages') or []:
+        nominal = month(stage.get('start') or 0)
+        start = max(
+            [nominal, previous_end] + [finish[dep] for dep in stage.get('dependencies') or [] if dep in finish]
+        )
+        # Сдвиг этапа из-за полевого сезона предшественников переносится на его работы
+        shift = start - nominal
+        end = month((stage.get('start') or 0) + (stage.get('duration') or 0)) + shift
+
+        for work in stage.get('works') or []:
+            work_start = work.get('start_global')
+            if work_start is None:
+                work_start = (stage.get('start') or 0) + (work.get('start_month') or 0)
+            planned_start = month(work_start)
+            required = max(1, table.working_days(planned_start, month(work_start + (work.get('duration_months') or 1))))
+
+            kind = 'field' if work.get('is_field_work') else 'working'
+            begin = table.nth_on_or_after(planned_start + shift, kind=kind)
+            last = table.nth_on_or_after(planned_start + shift, required, kind=kind)
+            works[work['id']] = [table.date(begin).isoformat(), table.date(last).isoformat()]
+            end = max(end, last + 1)
+
+        first = last = start
+        if end > start:
+            first = min(table.nth_on_or_after(start), end - 1)
+            last = max(table.last_before(end), start)
+        stages[stage.get('id')] = [table.date(first).isoformat(), table.date(last).isoformat()]
+        finish[stage.get('id')] = previous_end = end
+
+    return {
+        'stages': stages,
+        'works': works,
+        'end_date': table.date(max(table.last_before(previous_end), table.index(anchor))).isoformat(),
+    }
+
+
+def chart_dates(chart, chart_data=None):
+    """
+    Календарные даты диаграммы; chart_data по умолчанию — сохраненное
+    """
+    chart_data = chart.chart_data if chart_data is None else chart_data
+    anchor = plan_start_date(chart)
+    calendar = chart_calendar(chart)
+    years = math.ceil(((chart_data or {}).get('total_duration') or 0) / 12) + 1 + CALENDAR_MARGIN_YEARS
+
+    while True:
+        try:
+            dates = schedule_dates(chart_data or {}, anchor, calendar_table(calendar, anchor.year, years))
+            break
+        except IndexError:
+            if years >= CALENDAR_MAX_YEARS:
+                raise ValueError('План не укладывается в рабочий календарь: проверьте полевой сезон и выходные')
+            years *= 2
+
+    return {
+        'anchor_date': anchor.isoformat(),
+        'calendar': calendar.name if calendar else None,
+        **dates,
+    }
+
+
+def export_dates(chart):
+    """
+    Даты для файлов экспорта (exporters); None, если план не укладывается
+    в календарь — тогда, как и на странице диаграммы, даты считаются по месяцам
+    """
+    try:
+        return chart_dates(chart)
+    except ValueError:
+        return None
+
+
+def changed_dates(before, after):
+    """
+    Даты этапов и работ, отличающиеся между двумя результатами chart_dates
+    """
+    return {
+        key: {item: value for item, value in after[key].items() if before[key].get(item) != value}
+        for key in ('stages', 'works')
+    } | {'end_date': after['end_date']}
@@ -0,0 +1,56 @@
+"""
+Сводные показатели диаграммы Ганта, вычисляемые из chart_data.
+
+Модуль не зависит от моделей, поэтому его можно использовать
+и в модели, и в миграциях данных.
+"""
+import json
+
+
+def critical_path_length(stages):
+    """
+    Длина самой длинной цепочки зависимостей между этапами (в месяцах).
+
+    Учитываются только зависимости от этапов, входящих в диаграмму.
+    Циклы не приводят к зацикливанию: повторно посещенный этап
+    в текущей цепочке считается нулевой длины.
+    """
+    durations = {stage.get('id'): int(stage.get('duration') or 0) for stage in stages}
+    dependencies = {
+        stage.get('id'): [dep for dep in stage.get('dependencies') or [] if dep in durations]
+        for stage in stages
+    }
+    longest = {}
+    in_progress = set()
+
+    def finish_time(stage_id):
+        if stage_id in longest:
+            return longest[stage_id]
+        if stage_id in in_progress:
+            return 0
+        in_progress.add(stage_id)
+        start = max((finish_time(dep) for dep in dependencies[stage_id]), default=0)
+        in_progress.discard(stage_id)
+        longest[stage_id] = start + durations[stage_id]
+        return longest[stage_id]
+
+    return max((finish_time(stage_id) for stage_id in durations), default=0)
+
+
+def summarize_chart_data(chart_data):
+    """
+    Возвращает сводку по диаграмме для денормализованных колонок UserGanttChart
+    """
+    if not isinstance(chart_data, dict):
+        chart_data = {}
+
+    stages = chart_data.get('stages') or []
+
+    return {
+        'total_duration': int(chart_data.get('total_duration') or 0),
+        'stage_count': len(stages),
+        'work_count': sum(len(stage.get('works') or []) for stage in stages),
+        'critical_path_length': critical_path_length(stages),
+        # Размер в том виде, в каком JSONField записывает значение в БД
+        'payload_bytes': len(json.dumps(chart_data).encode('utf-8')),
+    }
@@ -0,0 +1,50 @@
+"""
+Поиск диаграмм по содержимому chart_data.
+
+В PostgreSQL chart_data хранится как jsonb, и условие вложения
+(@>, lookup contains) использует GIN-индекс chart_data_gin_idx
+(миграция 0013). В SQLite lookup contains для JSON недоступен,
+поэтому то же условие строится через json_each — это полный
+просмотр таблицы диаграмм, допустимый для небольшой базы.
+"""
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import UserGanttChart
+
+# Тип записи справочника -> фрагмент chart_data, который ее содержит
+CHART_REFERENCES = {
+    'mineral_type': lambda object_id: {'mineral_type': {'id': object_id}},
+    'stage': lambda object_id: {'stages': [{'id': object_id}]},
+    'work': lambda object_id: {'stages': [{'works': [{'id': object_id}]}]},
+    'question': lambda object_id: {'question': {'id': object_id}},
+}
+
+# Те же условия для SQLite (JSON1)
+SQLITE_REFERENCES = {
+    'mineral_type': "json_extract({column}, '$.mineral_type.id') = %s",
+    'stage': "EXISTS (SELECT 1 FROM json_each({column}, '$.stages') AS stage "
+             "WHERE json_extract(stage.value, '$.id') = %s)",
+    'work': "EXISTS (SELECT 1 FROM json_each({column}, '$.stages') AS stage, "
+            "json_each(stage.value, '$.works') AS work "
+            "WHERE json_extract(work.value, '$.id') = %s)",
+    'question': "json_extract({column}, '$.question.id') = %s",
+}
+
+
+def charts_referencing(model_type, object_id, queryset=None):
+    """
+    Диаграммы, в данных которых есть запись справочника model_type с id object_id
+    """
+    if queryset is None:
+        queryset = UserGanttChart.objects.all()
+    if connection.vendor == 'postgresql':
+        return queryset.filter(chart_data__contains=CHART_REFERENCES[model_type](object_id))
+
+    column = '{}.{}'.format(
+        connection.ops.quote_name(UserGanttChart._meta.db_table),
+        connection.ops.quote_name(UserGanttChart._meta.get_field('chart_data').column),
+    )
+    condition = SQLITE_REFERENCES[model_type].format(column=column)
+    return queryset.filter(RawSQL(condition, [object_id], output_field=BooleanField()))
@@ -0,0 +1,580 @@
+"""
+Импорт и экспорт справочников в файлы (JSON, CSV, Excel).
+
+Модуль нужен только страницам модератора и импортируется ими внутри
+представлений, поэтому рабочие процессы не загружают его при старте.
+JSON и CSV читаются и пишутся стандартной библиотекой, XLSX — через
+openpyxl (импорт внутри функций); pandas требуется только для старого
+формата .xls.
+
+Таблица во всех форматах — список словарей «поле → значение». Пустые
+ячейки при чтении отбрасываются: при создании записи срабатывают
+значения по умолчанию, при обновлении поле остается прежним.
+"""
+import csv
+import json
+import math
+import os
+from datetime import datetime
+from io import BytesIO
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import FAQ, MineralType, Question, Stage, Work
+from .stage_graph import dependency_graph_errors, new_dependency_graph_errors
+from .versioning import batched_changes
+
+MODEL_MAP = {
+    'mineral_type': MineralType,
+    'stage': Stage,
+    'work': Work,
+    'question': Question,
+    'faq': FAQ,
+}
+CSV_DELIMITERS = ',;\t'
+CSV_SNIFF_BYTES = 64 * 1024
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _is_empty(value):
+    return value is None or value == '' or (isinstance(value, float) and math.isnan(value))
+
+
+def _clean_rows(columns, rows):
+    columns = [str(column).strip() for column in columns if not _is_empty(column)]
+    cleaned = [
+        {str(key).strip(): value for key, value in row.items() if not _is_empty(key) and not _is_empty(value)}
+        for row in rows
+    ]
+    return columns, [row for row in cleaned if row]
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError('JSON должен содержать список объектов')
+    columns = list(dict.fromkeys(key for row in data for key in row))
+    return columns, data
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(CSV_SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        rows = list(reader)
+        return reader.fieldnames or [], rows
+
+
+def read_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        values = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(values, None) or ()
+        rows = [dict(zip(header, row)) for row in values]
+    finally:
+        workbook.close()
+    return list(header), rows
+
+
+def read_xls(path):
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ValueError('Для файлов .xls нужен pandas; сохраните файл в формате .xlsx')
+
+    df = pd.read_excel(path)
+    return list(df.columns), df.to_dict('records')
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+    '.xlsx': read_xlsx,
+    '.xls': read_xls,
+}
+
+
+def read_rows(path):
+    """
+    Чтение файла импорта: (столбцы, строки без пустых ячеек)
+    """
+    file_ext = os.path.splitext(path)[1].lower()
+    reader = READERS.get(file_ext)
+    if reader is None:
+        raise ValueError(f'Неподдерживаемый формат файла: {file_ext}')
+    return _clean_rows(*reader(path))
+
+
+def process_import_file(import_log, import_mode, validate_data=True):
+    """
+    Обработка файла импорта
+    """
+    result = {
+        'success': False,
+        'imported_count': 0,
+        'error_count': 0,
+        'errors': []
+    }
+    
+    try:
+        columns, rows = read_rows(import_log.import_file.path)
+        
+        model = MODEL_MAP.get(import_log.model_type)
+        if not model:
+            raise ValueError(f'Неизвестный тип модели: {import_log.model_type}')
+        
+        # Валидация данных
+        if validate_data:
+            validation_errors = validate_import_data(columns, rows, import_log.model_type)
+            if validation_errors:
+                result['errors'] = validation_errors
+                result['error_count'] = len(validation_errors)
+                return result
+        
+        # Импорт данных
+        imported_count = 0
+        # Одна версия справочника на весь импорт, а не на каждую строку
+        with transaction.atomic(), batched_changes('import'):
+            known_errors = dependency_graph_errors() if model is Stage else []
+            for index, data_dict in enumerate(rows):
+                try:
+                    # Точка сохранения: ошибка строки не прерывает транзакцию импорта
+                    with transaction.atomic():
+                        if import_mode == 'create':
+                            # Создание новой записи
+                            instance = model(**data_dict)
+                            instance.save()
+                            imported_count += 1
+                            
+                        elif import_mode == 'update':
+                            # Обновление существующей записи
+                            # Предполагаем, что есть поле 'id' или 'code' для поиска
+                            if 'id' in data_dict and data_dict['id']:
+                                instance = model.objects.filter(id=data_dict['id']).first()
+                            elif 'code' in data_dict:
+                                instance = model.objects.filter(code=data_dict['code']).first()
+                            else:
+                                result['errors'].append(f'Нет идентификатора для обновления: {data_dict}')
+                                result['error_count'] += 1
+                                continue
+                            
+                            if instance:
+                                for key, value in data_dict.items():
+                                    if hasattr(instance, key):
+                                        setattr(instance, key, value)
+                                instance.save()
+                                imported_count += 1
+                            else:
+                                result['errors'].append(f'Запись не найдена: {data_dict}')
+                                result['error_count'] += 1
+                                
+                        elif import_mode == 'upsert':
+                            # Создание или обновление
+                            if 'id' in data_dict and data_dict['id']:
+                                instance, created = model.objects.update_or_create(
+                                    id=data_dict['id'],
+                                    defaults=data_dict
+                                )
+                            elif 'code' in data_dict:
+                                instance, created = model.objects.update_or_create(
+                                    code=data_dict['code'],
+                                    defaults=data_dict
+                                )
+                            else:
+                                result['errors'].append(f'Нет идентификатора для upsert: {data_dict}')
+                                result['error_count'] += 1
+                                continue
+                            
+                            imported_count += 1
+                        
+                except Exception as e:
+                    result['errors'].append(f'Ошибка обработки строки {index}: {str(e)}')
+                    result['error_count'] += 1
+            
+            # Смена типа ПИ у этапов может сделать их зависимости недопустимыми:
+            # такой импорт откатывается целиком
+            if model is Stage and imported_count:
+                graph_errors = new_dependency_graph_errors(known_errors)
+                if graph_errors:
+                    raise _Rollback(graph_errors)
+        
+        result['imported_count'] = imported_count
+        result['success'] = imported_count > 0
+        
+    except _Rollback as e:
+        result['errors'].extend(e.args[0])
+        result['error_count'] += len(e.args[0])
+    except Exception as e:
+        result['errors'].append(f'Ошибка обработки файла: {str(e)}')
+        result['error_count'] += 1
+    
+    return result
+
+
+def validate_import_data(columns, rows, model_type):
+    """
+    Валидация импортируемых данных
+    """
+    errors = []
+    
+    # Базовые проверки
+    if not rows:
+        errors.append('Файл пустой')
+        return errors
+    
+    # Проверки в зависимости от типа модели
+    if model_type == 'mineral_type':
+        required_fields = ['name', 'code']
+        for field in required_fields:
+            if field not in columns:
+                errors.append(f'Отсутствует обязательное поле: {field}')
+        
+        # Проверка уникальности кодов
+        if 'code' in columns:
+            seen = set()
+            duplicates = []
+            for row in rows:
+                if 'code' in row:
+                    if row['code'] in seen:
+                        duplicates.append(row['code'])
+                    seen.add(row['code'])
+            if duplicates:
+                errors.append(f'Найдены дублирующиеся коды: {duplicates}')
+    
+    elif model_type == 'stage':
+        required_fields = ['mineral_type', 'name', 'code', 'order']
+        for field in required_fields:
+            if field not in columns:
+                errors.append(f'Отсутствует обязательное поле: {field}')
+    
+    # ... дополнительные проверки для других моделей
+    
+    return errors
+
+
+def _columns(rows):
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+
+def _cell(value):
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    # Excel не хранит часовой пояс
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def write_json(rows, out):
+    json.dump(rows, out, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder)
+
+
+def write_csv(rows, out):
+    # BOM — чтобы Excel открывал файл в UTF-8
+    out.write('\ufeff')
+    writer = csv.DictWriter(out, fieldnames=_columns(rows))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_xlsx(sheets, out):
+    """
+    Книга Excel из листов [(название, строки)]
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, rows in sheets:
+        sheet = workbook.create_sheet(title)
+        columns = _columns(rows)
+        sheet.append(columns)
+        for row in rows:
+            sheet.append([_cell(row.get(column)) for column in columns])
+
+    with BytesIO() as bio:
+        workbook.save(bio)
+        out.write(bio.getvalue())
+
+
+def export_rows(model_type):
+    return list(MODEL_MAP[model_type].objects.all().values())
+
+
+def write_export(model_type, export_format, out):
+    """
+    Выгрузка всех записей справочника в out в формате json, csv или excel
+    """
+    rows = export_rows(model_type)
+    if export_format == 'json':
+        write_json(rows, out)
+    elif export_format == 'csv':
+        write_csv(rows, out)
+    elif export_format == 'excel':
+        write_xlsx([('Data', rows)], out)
+
+
+def write_template(model_type, out):
+    """
+    Шаблон импорта: пример данных, инструкции и справочник ID
+    """
+    sheets = [
+        ('Данные', template_rows(model_type)),
+        ('Инструкции', get_import_instructions(model_type)),
+    ]
+    if model_type in ['stage', 'work', 'question']:
+        id_ref_data = get_id_reference_data(model_type)
+        if id_ref_data:
+            sheets.append(('Справочник_ID', id_ref_data))
+    write_xlsx(sheets, out)
+
+
+def template_rows(model_type):
+    """Пример данных для шаблона импорта"""
+    template_data = []
+    
+    if model_type == 'mineral_type':
+        template_data = [
+            {
+                'name': 'Уголь',
+                'code': 'COAL',
+                'description': 'Каменный уголь'
+            },
+            {
+                'name': 'Золото',
+                'code': 'GOLD', 
+                'description': 'Россыпное золото'
+            },
+            {
+                'name': 'Нефть',
+                'code': 'OIL',
+                'description': 'Сырая нефть'
+            },
+            {
+                'name': 'Газ',
+                'code': 'GAS',
+                'description': 'Природный газ'
+            }
+        ]
+        
+    elif model_type == 'stage':
+        template_data = [
+            {
+                'mineral_type_id': 1,
+                'name': 'Геологическое изучение',
+                'code': 'GEOLOGY',
+                'order': 1,
+                'description': 'Предварительное геологическое изучение',
+                'duration_months': 6,
+                'start_month': 0,
+                'color': '#4285F4'
+            },
+            {
+                'mineral_type_id': 1,
+                'name': 'Лицензирование',
+                'code': 'LICENSING',
+                'order': 2,
+                'description': 'Получение лицензии на недропользование',
+                'duration_months': 12,
+                'start_month': 6,
+                'color': '#34A853'
+            },
+            {
+                'mineral_type_id': 1,
+                'name': 'Разведка',
+                'code': 'EXPLORATION',
+                'order': 3,
+                'description': 'Детальная разведка месторождения',
+                'duration_months': 18,
+                'start_month': 18,
+                'color': '#FBBC05'
+            }
+        ]
+        
+    elif model_type == 'work':
+        template_data = [
+            {
+                'stage_id': 1,
+                'number': '1.1',
+                'title': 'Сбор и анализ геологической информации',
+                'description': 'Сбор архивных материалов, анализ предыдущих исследований',
+                'executor': 'Геологическая служба',
+                'duration_months': 3,
+                'start_month': 0,
+                'order': 1
+            },
+            {
+                'stage_id': 1,
+                'number': '1.2',
+                'title': 'Полевые геологические работы',
+                'description': 'Маршрутные исследования, опробование',
+                'executor': 'Полевая геологическая партия',
+                'duration_months': 3,
+                'start_month': 3,
+                'order': 2
+            },
+            {
+                'stage_id': 2,
+                'number': '2.1',
+                'title': 'Подготовка документов для лицензии',
+                'description': 'Сбор необходимых документов и оформление заявки',
+                'executor': 'Юридический отдел',
+                'duration_months': 4,
+                'start_month': 0,
+                'order': 1
+            }
+        ]
+        
+    elif model_type == 'question':
+        template_data = [
+            {
+                'text': 'Какие документы нужны для получения лицензии?',
+                'code': 'LICENSE_DOCS',
+                'description': 'Вопрос о необходимых документах для лицензирования',
+                'mineral_types_ids': [1, 2],  # Можно указывать несколько ID через запятую
+                'target_stages_ids': [2]      # ID целевых этапов
+            },
+            {
+                'text': 'Сколько времени занимает геологическая разведка?',
+                'code': 'EXPLORATION_TIME',
+                'description': 'Вопрос о сроках проведения геологоразведочных работ',
+                'mineral_types_ids': [1, 2, 3, 4],
+                'target_stages_ids': [3, 4]
+            }
+        ]
+        
+    elif model_type == 'faq':
+        template_data = [
+            {
+                'question': 'Как создать диаграмму Ганта?',
+                'answer': 'Для создания диаграммы перейдите в раздел "Мои диаграммы" и нажмите "Создать новую". Затем выберите тип ПИ, стадию и целевой вопрос.',
+                'keywords': 'создание, диаграмма, гант, инструкция',
+                'order': 1,
+                'is_active': True
+            },
+            {
+                'question': 'Какой формат файлов поддерживается для импорта?',
+                'answer': 'Система поддерживает импорт данных из файлов JSON, CSV и Excel (.xlsx, .xls).',
+                'keywords': 'импорт, файлы, формат, json, csv, excel',
+                'order': 2,
+                'is_active': True
+            }
+        ]
+    
+    return template_data
+
+
+def get_import_instructions(model_type):
+    """Получение инструкций для импорта"""
+    instructions = []
+    
+    if model_type == 'mineral_type':
+        instructions = [
+            {'Поле': 'name', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название типа полезного ископаемого'},
+            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Уникальный код (латинскими буквами)'},
+            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Описание типа ПИ'}
+        ]
+    elif model_type == 'stage':
+        instructions = [
+            {'Поле': 'mineral_type_id', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'ID типа ПИ (см. справочник)'},
+            {'Поле': 'name', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название этапа'},
+            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Код этапа'},
+            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'Порядковый номер этапа'},
+            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Описание этапа'},
+            {'Поле': 'duration_months', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Длительность в месяцах (по умолчанию: 1)'},
+            {'Поле': 'start_month', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Старт от начала (по умолчанию: 0)'},
+            {'Поле': 'color', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Цвет в HEX формате (например: #4285F4)'}
+        ]
+    elif model_type == 'work':
+        instructions = [
+            {'Поле': 'stage_id', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'ID этапа (см. справочник)'},
+            {'Поле': 'number', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Номер работы (например: 1.1.1)'},
+            {'Поле': 'title', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название работы'},
+            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Подробное описание работы'},
+            {'Поле': 'executor', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Исполнитель работы'},
+            {'Поле': 'duration_months', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Длительность в месяцах (по умолчанию: 1)'},
+            {'Поле': 'start_month', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Старт от начала этапа (по умолчанию: 0)'},
+            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Порядок в рамках этапа'}
+        ]
+    elif model_type == 'question':
+        instructions = [
+            {'Поле': 'text', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Текст вопроса'},
+            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Уникальный код вопроса'},
+            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Подробное описание вопроса'},
+            {'Поле': 'mineral_types_ids', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'ID типов ПИ через запятую (например: 1,2,3)'},
+            {'Поле': 'target_stages_ids', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'ID целевых этапов через запятую'}
+        ]
+    elif model_type == 'faq':
+        instructions = [
+            {'Поле': 'question', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Текст вопроса'},
+            {'Поле': 'answer', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Ответ на вопрос'},
+            {'Поле': 'keywords', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Ключевые слова через запятую'},
+            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Порядок отображения'},
+            {'Поле': 'is_active', 'Тип': 'boolean', 'Обязательное': 'Нет', 'Описание': 'Активен (true/false)'}
+        ]
+    
+    return instructions
+
+
+def get_id_reference_data(model_type):
+    """Получение справочника ID для импорта"""
+    data = []
+    
+    if model_type == 'stage':
+        # Получаем список типов ПИ для справочника
+        mineral_types = MineralType.objects.all()
+        for mt in mineral_types:
+            data.append({
+                'ID': mt.id,
+                'Тип ПИ': mt.name,
+                'Код': mt.code
+            })
+    elif model_type == 'work':
+        # Получаем список этапов для справочника
+        stages = Stage.objects.select_related('mineral_type').all()
+        for stage in stages:
+            data.append({
+                'ID': stage.id,
+                'Этап': stage.name,
+                'Тип ПИ': stage.mineral_type.name,
+                'Код этапа': stage.code
+            })
+    elif model_type == 'question':
+        # Получаем списки типов ПИ и этапов
+        mineral_types = MineralType.objects.all()
+        stages = Stage.objects.all()
+        
+        data.append({'СПРАВОЧНИК ТИПОВ ПИ': ''})
+        for mt in mineral_types:
+            data.append({
+                'ID': mt.id,
+                'Название': mt.name,
+                'Код': mt.code
+            })
+        
+        data.append({})  # Пустая строка
+        
+        data.append({'СПРАВОЧНИК ЭТАПОВ': ''})
+        for stage in stages:
+            data.append({
+                'ID': stage.id,
+                'Этап': stage.name,
+                'Тип ПИ ID': stage.mineral_type.id,
+                'Код': stage.code
+            })
+    
+    return data
@@ -0,0 +1,218 @@
+"""
+Таблица записей справочника в разделе модератора (data_management).
+
+Страница выбирается keyset-пагинацией по ключу сортировки, для
+которого есть индекс, а строки — через values() только с колонками
+таблицы; названия связанных записей приходят тем же запросом (JOIN),
+а не отдельным запросом на строку.
+
+Поиск — по префиксу названия или кода. Условие записывается
+диапазоном «>= q AND < q + U+10FFFF»: в отличие от LIKE/icontains
+его SQLite выполняет по B-дереву индекса. Сравнение диапазоном
+чувствительно к регистру, поэтому проверяются варианты запроса
+с заглавной и строчной первой буквой.
+"""
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+from .models import FAQ, MineralType, Question, Stage, Work
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page, parse_limit
+
+PREFIX_UPPER_BOUND = '\U0010ffff'
+GRID_MAX_QUERY_LENGTH = 200
+
+# columns: (поле values(), заголовок, ключ сортировки или None)
+# sorts: ключ -> порядок по возрастанию; последним полем всегда идет id
+GRIDS = {
+    'mineral_type': {
+        'model': MineralType,
+        'columns': (
+            ('name', 'Название', 'name'),
+            ('code', 'Код', 'code'),
+            ('description', 'Описание', None),
+        ),
+        'sorts': {'name': ('name', 'id'), 'code': ('code', 'id'), 'id': ('id',)},
+        'default_sort': 'name',
+        'search': ('name', 'code'),
+        'filters': {},
+        'stat': 'mineral_types',
+    },
+    'stage': {
+        'model': Stage,
+        'columns': (
+            ('mineral_type__name', 'Тип ПИ', None),
+            ('order', '№', 'order'),
+            ('name', 'Название', 'name'),
+            ('code', 'Код', 'code'),
+            ('duration_months', 'Мес.', None),
+        ),
+        'sorts': {
+            'order': ('mineral_type_id', 'order', 'id'),
+            'name': ('name', 'id'),
+            'code': ('code', 'id'),
+            'id': ('id',),
+        },
+        'default_sort': 'order',
+        'search': ('name', 'code'),
+        'filters': {'mineral_type': 'mineral_type_id'},
+        'stat': 'stages',
+    },
+    'work': {
+        'model': Work,
+        'columns': (
+            ('stage__name', 'Этап', None),
+            ('number', '№', 'number'),
+            ('title', 'Название', 'title'),
+            ('executor', 'Исполнитель', None),
+            ('duration_months', 'Мес.', None),
+        ),
+        'sorts': {
+            'order': ('stage_id', 'order', 'id'),
+            'number': ('number', 'id'),
+            'title': ('title', 'id'),
+            'id': ('id',),
+        },
+        'default_sort': 'order',
+        'search': ('title', 'number'),
+        'filters': {'mineral_type': 'stage__mineral_type_id', 'stage': 'stage_id'},
+        'stat': 'works',
+    },
+    'question': {
+        'model': Question,
+        'columns': (
+            ('text', 'Вопрос', 'text'),
+            ('code', 'Код', 'code'),
+            ('description', 'Описание', None),
+        ),
+        'sorts': {'code': ('code', 'id'), 'text': ('text', 'id'), 'id': ('id',)},
+        'default_sort': 'code',
+        'search': ('text', 'code'),
+        'filters': {},
+        'stat': 'questions',
+    },
+    'faq': {
+        'model': FAQ,
+        'columns': (
+            ('order', '№', 'order'),
+            ('question', 'Вопрос', 'question'),
+            ('is_active', 'Активен', None),
+        ),
+        'sorts': {'order': ('order', 'id'), 'question': ('question', 'id'), 'id': ('id',)},
+        'default_sort': 'order',
+        'search': ('question',),
+        'filters': {},
+        'stat': 'faqs',
+    },
+}
+
+
+def _descending(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def parse_sort(grid, value):
+    """
+    Ключ сортировки из GET-параметра: 'name' или '-name'; ValueError — неизвестный ключ
+    """
+    value = value or grid['default_sort']
+    key = value.lstrip('-')
+    if key not in grid['sorts']:
+        raise ValueError(f'Неизвестная сортировка: {key}')
+    ordering = grid['sorts'][key]
+    return value, _descending(ordering) if value.startswith('-') else ordering
+
+
+def search_condition(fields, query):
+    """
+    Поиск по префиксу любого из полей; число ищется и как id
+    """
+    variants = {query, query[:1].upper() + query[1:], query[:1].lower() + query[1:]}
+    condition = Q()
+    for field in fields:
+        for variant in variants:
+            condition |= Q(**{f'{field}__gte': variant, f'{field}__lt': variant + PREFIX_UPPER_BOUND})
+    if query.isdigit():
+        condition |= Q(id=int(query))
+    return condition
+
+
+def grid_query(model_type, params):
+    """
+    Запрос таблицы по GET-параметрам sort, q, limit и фильтрам типа (без курсора).
+
+    Возвращает {'queryset', 'ordering', 'limit', 'fields', 'sort', 'q', 'filters'};
+    queryset — values() с колонками таблицы и полями сортировки.
+    Ошибки параметров — ValueError.
+    """
+    grid = GRIDS[model_type]
+    sort, ordering = parse_sort(grid, params.get('sort'))
+    limit = parse_limit(params.get('limit'), default=DEFAULT_PAGE_SIZE)
+    queryset = grid['model'].objects.all()
+
+    filters = {}
+    for name, lookup in grid['filters'].items():
+        value = params.get(name)
+        if value:
+            try:
+                filters[name] = int(value)
+            except ValueError:
+                raise ValueError(f'Некорректный параметр {name}')
+            queryset = queryset.filter(**{lookup: filters[name]})
+
+    query = (params.get('q') or '').strip()[:GRID_MAX_QUERY_LENGTH]
+    if query:
+        queryset = queryset.filter(search_condition(grid['search'], query))
+
+    # Поля ключа сортировки нужны для курсора, поэтому выбираются всегда
+    fields = ['id', *(column[0] for column in grid['columns'])]
+    selected = list(dict.fromkeys([*fields, *(field.lstrip('-') for field in ordering)]))
+
+    return {
+        'queryset': queryset.values(*selected),
+        'ordering': ordering,
+        'limit': limit,
+        'fields': fields,
+        'sort': sort,
+        'q': query,
+        'filters': filters,
+    }
+
+
+def grid_page(model_type, params):
+    """
+    Страница таблицы по GET-параметрам sort, q, after, limit и фильтрам типа.
+
+    Возвращает {'columns', 'rows', 'next_cursor', 'sort', 'q', 'filters'};
+    ошибки параметров — ValueError.
+    """
+    grid = GRIDS[model_type]
+    query = grid_query(model_type, params)
+    rows, next_cursor = keyset_page(
+        query['queryset'], query['ordering'], cursor=params.get('after'), limit=query['limit']
+    )
+
+    return {
+        'columns': [{'key': key, 'label': label, 'sort': sort_key} for key, label, sort_key in grid['columns']],
+        'rows': [{field: row[field] for field in query['fields']} for row in rows],
+        'next_cursor': next_cursor,
+        'sort': query['sort'],
+        'q': query['q'],
+        'filters': query['filters'],
+    }
+
+
+def sort_links(page):
+    """
+    Ссылки для заголовков колонок: повторный щелчок меняет направление
+    """
+    base = {'q': page['q'], **page['filters']}
+    for column in page['columns']:
+        column['direction'] = None
+        if column['sort'] is None:
+            continue
+        if page['sort'].lstrip('-') == column['sort']:
+            column['direction'] = 'desc' if page['sort'].startswith('-') else 'asc'
+        sort = f'-{column["sort"]}' if column['direction'] == 'asc' else column['sort']
+        column['url'] = '?' + urlencode({key: value for key, value in {**base, 'sort': sort}.items() if value})
+    return page['columns']
@@ -0,0 +1,101 @@
+"""
+Разделение чтения и записи между основной базой и репликой только для чтения.
+
+Почти весь трафик (просмотр диаграмм, личный кабинет, AJAX мастера,
+поиск по FAQ) только читает. PrimaryReplicaRouter отправляет чтение
+в соединение REPLICA_DB (для SQLite — тот же файл или его реплика,
+открытые в режиме mode=ro), а запись — в основную базу, поэтому
+читатели не ждут за транзакциями импорта.
+
+Чтение собственных записей: запросы внутри транзакции основной базы,
+небезопасные запросы (POST и т.п.), остаток запроса после первой записи
+и запросы сессии, которая недавно писала (REPLICA_STICKY_SECONDS),
+читают из основной базы — это отмечают маршрутизатор и
+ReplicaStickinessMiddleware. Без настроенной реплики маршрутизатор
+ни во что не вмешивается.
+"""
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_DB = DEFAULT_DB_ALIAS
+REPLICA_DB = 'replica'
+REPLICA_STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+STICKY_SESSION_KEY = 'roadmap_app:primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Текущий запрос читает из основной базы / уже обращался к ней на запись
+_use_primary = ContextVar('roadmap_app_use_primary', default=False)
+_wrote = ContextVar('roadmap_app_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+def read_only_uri(path):
+    """
+    URI файла SQLite, открываемого только для чтения
+    """
+    return f'{Path(path).resolve().as_uri()}?mode=ro'
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение — из реплики, запись и чтение после записи — из основной базы
+    """
+
+    def db_for_read(self, model, **hints):
+        if not replica_configured():
+            return None
+        if _use_primary.get() or connections[PRIMARY_DB].in_atomic_block:
+            return PRIMARY_DB
+        return REPLICA_DB
+
+    def db_for_write(self, model, **hints):
+        # После записи и GET-запрос до конца читает свои данные из основной базы
+        _wrote.set(True)
+        _use_primary.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, поэтому объекты из обеих баз связываются
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY_DB, REPLICA_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Закрепляет за сессией основную базу на REPLICA_STICKY_SECONDS после записи.
+    Стоит после SessionMiddleware
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writing = request.method not in SAFE_METHODS
+        session = getattr(request, 'session', None)
+        pinned = writing or (
+            session is not None and session.get(STICKY_SESSION_KEY, 0) > time.time()
+        )
+
+        primary_token = _use_primary.set(pinned)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if session is not None and (writing or _wrote.get()):
+                session[STICKY_SESSION_KEY] = time.time() + REPLICA_STICKY_SECONDS
+        finally:
+            _use_primary.reset(primary_token)
+            _wrote.reset(wrote_token)
+        return response
@@ -0,0 +1,82 @@
+"""
+Настройка соединений SQLite для рабочего режима.
+
+В режиме журнала по умолчанию (DELETE) читатели блокируют писателя,
+а писатель — всех, поэтому при параллельном создании диаграмм запросы
+получают «database is locked». PRAGMA из settings.SQLITE_PRAGMAS
+применяются к каждому новому соединению (сигнал connection_created):
+
+- journal_mode=WAL — чтение идет параллельно с записью;
+- synchronous=NORMAL — в WAL не теряет целостности и убирает fsync
+  на каждую транзакцию (только на контрольной точке);
+- busy_timeout — ждать освобождения блокировки, а не сразу падать;
+- mmap_size — чтение страниц через отображение файла в память;
+- cache_size, temp_store — кэш страниц и временные таблицы в памяти.
+
+busy_timeout помогает, только если транзакция берет блокировку
+записи сразу: поэтому в DATABASES задан transaction_mode IMMEDIATE
+(иначе повышение блокировки чтения до записи завершается ошибкой
+без ожидания).
+
+journal_mode сохраняется в самом файле базы: после первого соединения
+в режиме WAL файл остается в нем и для sqlite3 и других инструментов,
+а рядом появляются db.sqlite3-wal и db.sqlite3-shm (в .gitignore).
+Поэтому settings по умолчанию оставляют db.sqlite3 из репозитория
+в режиме DELETE, а WAL включается при развертывании переменной
+SQLITE_JOURNAL_MODE=WAL. DEFAULT_SQLITE_PRAGMAS — рекомендуемый набор
+для развертывания, с ним сравнивает benchmark_sqlite.
+"""
+from django.conf import settings
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_pragmas():
+    """
+    PRAGMA для новых соединений; пустой словарь — настройки SQLite по умолчанию
+    """
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+def is_read_only(connection):
+    """
+    Соединение открыто только для чтения (URI с mode=ro, реплика для db_routing)
+    """
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Обработчик connection_created: применяет PRAGMA к соединению SQLite
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+    if not pragmas:
+        return
+    if is_read_only(connection):
+        # Режим журнала хранится в файле и задается основным соединением
+        pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def current_pragmas(connection, names=None):
+    """
+    Действующие значения PRAGMA соединения: {имя: значение}
+    """
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names or DEFAULT_SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
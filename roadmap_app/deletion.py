@@ -0,0 +1,292 @@
+"""
+Удаление записей справочника и диаграмм без загрузки объектов в память.
+
+Стандартный delete() проходит каскад через Collector: загружает каждый
+зависимый объект и отправляет сигналы по одному, поэтому удаление типа
+ПИ со всеми этапами, работами и связями держит в памяти весь каскад
+и надолго блокирует SQLite. Здесь каскад строится по метаданным
+моделей (on_delete связей) как цепочка подзапросов: предпросмотр —
+запросы COUNT, а удаление — пакеты DELETE ... WHERE id IN (...) под
+лимит параметров запроса в одной транзакции; ссылки SET_NULL
+очищаются UPDATE.
+
+С корзиной (trash) перед удалением строки всех затронутых таблиц,
+связи многие-ко-многим и очищенные ссылки сохраняются в TrashEntry;
+restore_trash_entry возвращает их с прежними id.
+
+Сигналы post_delete не отправляются, поэтому версия справочника
+и статистика обновляются явно.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, models, transaction
+from django.utils import timezone
+
+from .bulk import id_chunks
+from .models import FAQ, MineralType, Question, Stage, TrashEntry, UserGanttChart, Work
+from .stage_graph import dependency_graph_errors, new_dependency_graph_errors
+from .stats import invalidate_admin_stats
+from .versioning import VERSIONED_TYPES, record_batch
+
+DELETABLE_MODELS = {
+    'mineral_type': MineralType,
+    'stage': Stage,
+    'work': Work,
+    'question': Question,
+    'faq': FAQ,
+    'chart': UserGanttChart,
+}
+TRASH_RETENTION_DAYS = getattr(settings, 'TRASH_RETENTION_DAYS', 30)
+CASCADE_MAX_DEPTH = 10
+
+
+def _relations(model):
+    """
+    Связи других моделей с model, включая скрытые таблицы связей многие-ко-многим
+    """
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one)
+    ]
+
+
+def _m2m_field(through):
+    owner = through._meta.auto_created
+    return owner, next(field for field in owner._meta.many_to_many if field.remote_field.through is through)
+
+
+def cascade_plan(model, object_id):
+    """
+    Шаги удаления в порядке выполнения: (вид, модель, queryset, поле).
+
+    Вид 'rows' — удаляемые строки (зависимые раньше родителя), 'links' —
+    строки таблиц связей, 'nulls' — строки, в которых очищается поле.
+    Querysets — подзапросы от корня, поэтому вычисляются в момент шага.
+    """
+    steps = []
+    links = {}
+
+    def walk(node, queryset, depth):
+        if depth > CASCADE_MAX_DEPTH:
+            raise ValueError('Слишком глубокий каскад удаления')
+        for relation in _relations(node):
+            child, field = relation.related_model, relation.field
+            related = child._base_manager.filter(**{f'{field.name}__in': queryset.values('pk')})
+            if child._meta.auto_created:
+                # Связь модели с собой: строки таблицы связей ищутся по обеим сторонам одним шагом
+                if child in links:
+                    step = steps[links[child]]
+                    steps[links[child]] = (step[0], step[1], step[2] | related, step[3])
+                else:
+                    links[child] = len(steps)
+                    steps.append(('links', child, related, field))
+            elif relation.on_delete is models.CASCADE:
+                walk(child, related, depth + 1)
+            elif relation.on_delete is models.SET_NULL:
+                steps.append(('nulls', child, related, field))
+            elif relation.on_delete is not models.DO_NOTHING:
+                raise ValueError(
+                    f'Удаление «{node._meta.verbose_name}» со связью «{child._meta.verbose_name}.{field.name}» не поддерживается'
+                )
+        steps.append(('rows', node, queryset, None))
+
+    walk(model, model._base_manager.filter(pk=object_id), 0)
+    return steps
+
+
+def _step_label(kind, model, field):
+    if kind == 'rows':
+        return str(model._meta.verbose_name_plural)
+    if kind == 'links':
+        owner, m2m = _m2m_field(model)
+        return f'Связи «{owner._meta.verbose_name}: {m2m.verbose_name}»'
+    return f'{model._meta.verbose_name_plural}: будет очищено поле «{field.verbose_name}»'
+
+
+def _count(impact, kind, model, field, count):
+    label = _step_label(kind, model, field)
+    impact.setdefault(label, {'kind': kind, 'label': label, 'count': 0})['count'] += count
+
+
+def deletion_impact(model_type, object_id):
+    """
+    Предпросмотр удаления: [{'kind', 'label', 'count'}] по запросу COUNT на шаг
+    """
+    impact = {}
+    for kind, model, queryset, field in cascade_plan(DELETABLE_MODELS[model_type], object_id):
+        _count(impact, kind, model, field, queryset.count())
+    return [entry for entry in impact.values() if entry['count']]
+
+
+def _delete_ids(model, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        for chunk in id_chunks(ids):
+            cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def _remember(changed, model, ids):
+    if model in VERSIONED_TYPES:
+        changed.setdefault(VERSIONED_TYPES[model], set()).update(ids)
+
+
+def delete_object(model_type, object_id, user=None, trash=False):
+    """
+    Удаляет запись с каскадом; с trash — сохраняет удаленное в корзину.
+    Возвращает (предпросмотр фактически затронутого, запись корзины или None)
+    """
+    model = DELETABLE_MODELS[model_type]
+    label = str(model._base_manager.get(pk=object_id))[:500]
+    payload = {'rows': [], 'links': [], 'nulls': []}
+    impact = {}
+    changed = {}
+
+    with transaction.atomic():
+        for kind, step_model, queryset, field in cascade_plan(model, object_id):
+            name = step_model._meta.label_lower
+            if kind == 'nulls':
+                pairs = list(queryset.values_list('pk', field.attname))
+                for chunk in id_chunks([pk for pk, _ in pairs]):
+                    step_model._base_manager.filter(pk__in=chunk).update(**{field.attname: None})
+                if trash:
+                    payload['nulls'].append([name, field.attname, pairs])
+                count = len(pairs)
+            elif kind == 'links':
+                rows = list(queryset.values())
+                owner, m2m = _m2m_field(step_model)
+                _remember(changed, owner, [row[f'{m2m.m2m_field_name()}_id'] for row in rows])
+                _delete_ids(step_model, [row['id'] for row in rows])
+                if trash:
+                    payload['links'].append([name, rows])
+                count = len(rows)
+            else:
+                if trash:
+                    rows = list(queryset.values())
+                    ids = [row['id'] for row in rows]
+                    payload['rows'].append([name, rows])
+                else:
+                    ids = list(queryset.values_list('pk', flat=True))
+                _delete_ids(step_model, ids)
+                _remember(changed, step_model, ids)
+                count = len(ids)
+            _count(impact, kind, step_model, field, count)
+        impact = [entry for entry in impact.values() if entry['count']]
+
+        record_batch(changed, 'delete')
+        entry = None
+        if trash:
+            entry = TrashEntry.objects.create(
+                user=user, model_type=model_type, object_id=object_id,
+                label=label, impact=impact, payload=payload,
+            )
+
+    invalidate_admin_stats()
+    return impact, entry
+
+
+def restore_rows(model, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Вставляет строки (словари .values()) с прежними id и временем создания/изменения
+    """
+    fields = model._meta.concrete_fields
+    objects = [
+        model(**{field.attname: field.to_python(row[field.attname]) for field in fields if field.attname in row})
+        for row in rows
+    ]
+    model._base_manager.using(using).bulk_create(objects)
+    # bulk_create проставляет auto_now/auto_now_add заново, bulk_update пишет значения как есть
+    auto = [field.name for field in fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    if auto:
+        for obj, row in zip(objects, rows):
+            for name in auto:
+                field = model._meta.get_field(name)
+                setattr(obj, field.attname, field.to_python(row[field.attname]))
+        model._base_manager.using(using).bulk_update(objects, auto)
+
+
+def _existing_links(through, rows):
+    """
+    Связи, у которых обе стороны существуют; id связи назначается заново
+    """
+    fks = [field for field in through._meta.concrete_fields if field.is_relation]
+    existing = {}
+    for field in fks:
+        ids = list({row[field.attname] for row in rows})
+        found = set()
+        for chunk in id_chunks(ids):
+            found.update(field.related_model._base_manager.filter(pk__in=chunk).values_list('pk', flat=True))
+        existing[field.attname] = found
+    return [
+        through(**{field.attname: row[field.attname] for field in fks})
+        for row in rows if all(row[field.attname] in existing[field.attname] for field in fks)
+    ]
+
+
+def _restores_stages(payload):
+    """
+    Затрагивает ли восстановление граф этапов: строки этапов или их связи
+    """
+    models = [apps.get_model(name) for name, _ in payload['rows']]
+    models += [_m2m_field(apps.get_model(name))[0] for name, _ in payload['links']]
+    return any(VERSIONED_TYPES.get(model) == 'stage' for model in models)
+
+
+def restore_trash_entry(entry):
+    """
+    Возвращает удаленное из корзины. Ошибки (id или уникальные значения
+    уже заняты, восстановление нарушает граф этапов) — ValueError
+    """
+    if entry.restored_at:
+        raise ValueError('Запись уже восстановлена')
+
+    changed = {}
+    try:
+        with transaction.atomic():
+            # Уже существующие ошибки графа не мешают восстановлению, новые — мешают
+            known_errors = dependency_graph_errors() if _restores_stages(entry.payload) else []
+            # Родители раньше зависимых: порядок, обратный удалению
+            for name, rows in reversed(entry.payload['rows']):
+                model = apps.get_model(name)
+                restore_rows(model, rows)
+                _remember(changed, model, [row['id'] for row in rows])
+            for name, rows in entry.payload['links']:
+                through = apps.get_model(name)
+                links = _existing_links(through, rows)
+                through._base_manager.bulk_create(links, ignore_conflicts=True)
+                owner, m2m = _m2m_field(through)
+                _remember(changed, owner, [getattr(link, f'{m2m.m2m_field_name()}_id') for link in links])
+            for name, attname, pairs in entry.payload['nulls']:
+                model = apps.get_model(name)
+                by_value = {}
+                for pk, value in pairs:
+                    by_value.setdefault(value, []).append(pk)
+                for value, ids in by_value.items():
+                    for chunk in id_chunks(ids):
+                        # Ссылки, которые с тех пор заполнили заново, не трогаются
+                        model._base_manager.filter(pk__in=chunk, **{attname: None}).update(**{attname: value})
+
+            if 'stage' in changed:
+                graph_errors = new_dependency_graph_errors(known_errors)
+                if graph_errors:
+                    raise ValueError('; '.join(graph_errors))
+            record_batch(changed, 'restore')
+            entry.restored_at = timezone.now()
+            entry.save(update_fields=['restored_at'])
+    except IntegrityError as e:
+        raise ValueError(f'Запись нельзя восстановить: id или уникальные значения уже заняты ({e})')
+
+    invalidate_admin_stats()
+
+
+def purge_trash(days=TRASH_RETENTION_DAYS):
+    """
+    Удаляет записи корзины старше days дней; возвращает их число
+    """
+    ids = list(TrashEntry.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=days)
+    ).values_list('id', flat=True))
+    _delete_ids(TrashEntry, ids)
+    return len(ids)
@@ -0,0 +1,441 @@
+"""
+Табличные и календарные форматы экспорта диаграммы Ганта: XLSX,
+MS Project XML (MSPDI) и iCalendar.
+
+Писатели проходят chart_data один раз и выводят данные по мере обхода:
+XLSX собирается в режиме write_only openpyxl, XML и ICS пишутся
+построчно в поток, поэтому память не растет с размером диаграммы.
+
+Даты этапов и работ берутся из dates — результата calendars.chart_dates
+(рабочий календарь диаграммы: выходные, праздники, полевой сезон), как
+на странице диаграммы. Без dates смещения в месяцах переводятся в даты
+от start_date — первого дня месяца, с которого отсчитывается план.
+"""
+import calendar
+import csv
+import io
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+MONTH_NAMES = ['янв', 'фев', 'мар', 'апр', 'май', 'июн', 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+
+XLSX_INFO_COLUMNS = [
+    ('Этап', 28),
+    ('№', 8),
+    ('Работа', 48),
+    ('Исполнитель', 24),
+    ('Начало в этапе, мес', 12),
+    ('Начало от старта, мес', 12),
+    ('Длительность, мес', 12),
+    ('Окончание, мес', 12),
+    ('Дата начала', 12),
+    ('Дата окончания', 12),
+]
+XLSX_MONTH_WIDTH = 4.5
+DEFAULT_STAGE_COLOR = '4e73df'
+
+MSP_NAMESPACE = 'http://schemas.microsoft.com/project'
+MSP_MINUTES_PER_DAY = 480
+MSP_DURATION_FORMAT_DAYS = 7
+MSP_DEPENDENCY_FINISH_TO_START = 1
+
+ICS_LINE_LIMIT = 75
+
+
+def add_months(day, months):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def default_start_date():
+    return date.today().replace(day=1)
+
+
+def plan_start_date(chart):
+    """
+    Дата отсчета плана диаграммы: заданная дата начала или первый день месяца ее создания
+    """
+    if chart.anchor_date:
+        return chart.anchor_date
+    return timezone.localdate(chart.created_at).replace(day=1)
+
+
+def item_dates(dates, kind, item_id, start_date, start, duration):
+    """
+    Первый и последний (включительно) день этапа или работы: kind — 'stages'
+    или 'works'; по рабочему календарю из dates, иначе по месяцам плана
+    """
+    if dates and item_id in dates[kind]:
+        first, last = dates[kind][item_id]
+        return date.fromisoformat(first), date.fromisoformat(last)
+    return add_months(start_date, start), add_months(start_date, start + duration) - timedelta(days=1)
+
+
+def month_label(start_date, month):
+    if start_date is None:
+        return f'М{month + 1}'
+    day = add_months(start_date, month)
+    return f'{MONTH_NAMES[day.month - 1]} {day.year}'
+
+
+def work_span(stage, work):
+    """
+    Начало (от старта плана) и длительность работы в месяцах
+    """
+    start = work.get('start_global')
+    if start is None:
+        start = (stage.get('start') or 0) + (work.get('start_month') or 0)
+    return start, work.get('duration_months') or 1
+
+
+def iter_works(chart_data):
+    for stage in chart_data.get('stages') or []:
+        for work in stage.get('works') or []:
+            yield stage, work
+
+
+def working_days(start, end):
+    """
+    Число рабочих дней (пн-пт) в полуинтервале [start, end)
+    """
+    days = (end - start).days
+    if days <= 0:
+        return 0
+    weeks, rest = divmod(days, 7)
+    extra = sum(1 for offset in range(rest) if (start.weekday() + offset) % 7 < 5)
+    return weeks * 5 + extra
+
+
+# --- CSV --------------------------------------------------------------------
+
+def write_csv(chart_data, out, title='', start_date=None, stamp=None, dates=None):
+    """
+    Записывает работы диаграммы в CSV (UTF-8 с BOM, разделитель «;» —
+    так файл без настройки открывается в Excel)
+    """
+    text = io.TextIOWrapper(out, encoding='utf-8-sig', newline='', write_through=True)
+    try:
+        writer = csv.writer(text, delimiter=';')
+        writer.writerow([name for name, _ in XLSX_INFO_COLUMNS])
+        for stage, work in iter_works(chart_data):
+            start, duration = work_span(stage, work)
+            if start_date is None:
+                span = ['', '']
+            else:
+                span = [day.isoformat() for day in item_dates(dates, 'works', work.get('id'), start_date, start, duration)]
+            writer.writerow([
+                stage.get('name'), work.get('number'), work.get('title'), work.get('executor'),
+                work.get('start_month') or 0, start, duration, start + duration, *span,
+            ])
+    finally:
+        # Поток out принадлежит вызывающему коду и не должен закрываться вместе с оберткой
+        text.detach()
+
+
+# --- XLSX -------------------------------------------------------------------
+
+def _hex_color(color):
+    color = (color or '').lstrip('#')
+    return color.upper() if len(color) == 6 else DEFAULT_STAGE_COLOR.upper()
+
+
+def _lighten(color, amount=0.55):
+    channels = [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+    return ''.join(f'{round(c + (255 - c) * amount):02X}' for c in channels)
+
+
+def write_xlsx(chart_data, out, title='', start_date=None, stamp=None, dates=None):
+    """
+    Записывает книгу с листом «График» (строка на каждую работу и сетка
+    по месяцам) и листом «Этапы»
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    from .rendering import total_months
+
+    months = total_months(chart_data)
+    info_count = len(XLSX_INFO_COLUMNS)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('График')
+
+    for index, (_, width) in enumerate(XLSX_INFO_COLUMNS, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    for month in range(months):
+        sheet.column_dimensions[get_column_letter(info_count + month + 1)].width = XLSX_MONTH_WIDTH
+    sheet.freeze_panes = f'{get_column_letter(info_count + 1)}{3 if title else 2}'
+
+    bold = Font(bold=True)
+    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    fills = {}
+
+    def fill(color):
+        if color not in fills:
+            fills[color] = PatternFill(fill_type='solid', start_color=color, end_color=color)
+        return fills[color]
+
+    def styled(value, font=None, background=None, alignment=None, target=None):
+        cell = WriteOnlyCell(target or sheet, value=value)
+        if font is not None:
+            cell.font = font
+        if background is not None:
+            cell.fill = fill(background)
+        if alignment is not None:
+            cell.alignment = alignment
+        return cell
+
+    def timeline(start, duration, color):
+        cells = [None] * months
+        for month in range(max(start, 0), min(start + duration, months)):
+            cells[month] = styled(None, background=color)
+        return cells
+
+    def span(kind, item_id, start, duration):
+        if start_date is None:
+            return [None, None]
+        return list(item_dates(dates, kind, item_id, start_date, start, duration))
+
+    if title:
+        sheet.append([styled(title, font=Font(bold=True, size=14))])
+    sheet.append(
+        [styled(name, font=bold, alignment=header_alignment) for name, _ in XLSX_INFO_COLUMNS]
+        + [styled(month_label(start_date, month), font=bold, alignment=header_alignment) for month in range(months)]
+    )
+
+    for stage in chart_data.get('stages') or []:
+        color = _hex_color(stage.get('color'))
+        stage_start, stage_duration = stage.get('start') or 0, stage.get('duration') or 0
+        sheet.append(
+            [styled(stage.get('name'), font=bold), None, None, None, None,
+             stage_start, stage_duration, stage_start + stage_duration]
+            + span('stages', stage.get('id'), stage_start, stage_duration)
+            + timeline(stage_start, stage_duration, _lighten(color))
+        )
+        for work in stage.get('works') or []:
+            start, duration = work_span(stage, work)
+            sheet.append(
+                [stage.get('name'), work.get('number'), work.get('title'), work.get('executor'),
+                 work.get('start_month') or 0, start, duration, start + duration]
+                + span('works', work.get('id'), start, duration)
+                + timeline(start, duration, color)
+            )
+
+    stages_sheet = workbook.create_sheet('Этапы')
+    for index, width in enumerate((28, 12, 12, 12, 40), start=1):
+        stages_sheet.column_dimensions[get_column_letter(index)].width = width
+    stages_sheet.append([
+        styled(name, font=bold, alignment=header_alignment, target=stages_sheet)
+        for name in ('Этап', 'Начало, мес', 'Длительность, мес', 'Работ', 'Зависит от')
+    ])
+    names = {stage.get('id'): stage.get('name') for stage in chart_data.get('stages') or []}
+    for stage in chart_data.get('stages') or []:
+        stages_sheet.append([
+            stage.get('name'), stage.get('start') or 0, stage.get('duration') or 0,
+            len(stage.get('works') or []),
+            ', '.join(str(names.get(dep, dep)) for dep in stage.get('dependencies') or []),
+        ])
+
+    workbook.save(out)
+
+
+# --- MS Project XML ---------------------------------------------------------
+
+def _msp_datetime(day, end_of_day=False):
+    return datetime.combine(day, time(17, 0) if end_of_day else time(8, 0)).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _msp_duration(start, end):
+    hours = working_days(start, end) * MSP_MINUTES_PER_DAY // 60
+    return f'PT{hours}H0M0S'
+
+
+def _msp_element(tag, value):
+    return f'<{tag}>{escape(str(value))}</{tag}>'
+
+
+def _msp_task(uid, outline, level, name, span, summary, notes='', predecessors=()):
+    begin, last = span
+    end = last + timedelta(days=1)
+    parts = [
+        _msp_element('UID', uid), _msp_element('ID', uid), _msp_element('Name', name or ''),
+        _msp_element('Type', 1), _msp_element('IsNull', 0),
+        _msp_element('WBS', outline), _msp_element('OutlineNumber', outline),
+        _msp_element('OutlineLevel', level),
+        _msp_element('Start', _msp_datetime(begin)),
+        _msp_element('Finish', _msp_datetime(last, end_of_day=True)),
+        _msp_element('Duration', _msp_duration(begin, end)),
+        _msp_element('DurationFormat', MSP_DURATION_FORMAT_DAYS),
+        _msp_element('Summary', int(summary)), _msp_element('Milestone', 0),
+    ]
+    if notes:
+        parts.append(_msp_element('Notes', notes))
+    for predecessor in predecessors:
+        parts.append(
+            '<PredecessorLink>' + _msp_element('PredecessorUID', predecessor)
+            + _msp_element('Type', MSP_DEPENDENCY_FINISH_TO_START) + '</PredecessorLink>'
+        )
+    return '<Task>' + ''.join(parts) + '</Task>\n'
+
+
+def write_msproject(chart_data, out, title='', start_date=None, stamp=None, dates=None):
+    """
+    Записывает план в формате MS Project XML: этапы — суммарные задачи,
+    работы — подзадачи, исполнители — ресурсы с назначениями
+    """
+    from .rendering import total_months
+
+    start_date = start_date or default_start_date()
+    stages = chart_data.get('stages') or []
+    write = lambda text: out.write(text.encode('utf-8'))
+    if dates:
+        finish_date = date.fromisoformat(dates['end_date'])
+    else:
+        finish_date = add_months(start_date, total_months(chart_data))
+
+    # UID задач выдаются по порядку обхода; для ссылок между этапами
+    # их нужно знать заранее
+    stage_uids = {}
+    uid = 1
+    for stage in stages:
+        stage_uids[stage.get('id')] = uid
+        uid += 1 + len(stage.get('works') or [])
+
+    write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+    write(f'<Project xmlns="{MSP_NAMESPACE}">\n')
+    write(''.join([
+        _msp_element('SaveVersion', 14), _msp_element('Name', f'{title or "gantt"}.xml'),
+        _msp_element('Title', title), _msp_element('ScheduleFromStart', 1),
+        _msp_element('StartDate', _msp_datetime(start_date)),
+        _msp_element('FinishDate', _msp_datetime(finish_date, True)),
+        _msp_element('CalendarUID', 1), _msp_element('MinutesPerDay', MSP_MINUTES_PER_DAY),
+        _msp_element('MinutesPerWeek', MSP_MINUTES_PER_DAY * 5), _msp_element('DaysPerMonth', 20),
+    ]) + '\n')
+    write('<Calendars><Calendar><UID>1</UID><Name>Стандартный</Name>'
+          '<IsBaseCalendar>1</IsBaseCalendar></Calendar></Calendars>\n')
+
+    write('<Tasks>\n')
+    executors = {}
+    assignments = []
+    for stage_number, stage in enumerate(stages, start=1):
+        stage_uid = stage_uids[stage.get('id')]
+        predecessors = [stage_uids[dep] for dep in stage.get('dependencies') or [] if dep in stage_uids]
+        span = item_dates(dates, 'stages', stage.get('id'), start_date, stage.get('start') or 0, stage.get('duration') or 1)
+        write(_msp_task(
+            stage_uid, str(stage_number), 1, stage.get('name'), span, summary=True,
+            notes=stage.get('description') or '', predecessors=predecessors,
+        ))
+        for work_number, work in enumerate(stage.get('works') or [], start=1):
+            work_uid = stage_uid + work_number
+            start, duration = work_span(stage, work)
+            name = ' '.join(str(part) for part in (work.get('number'), work.get('title')) if part)
+            write(_msp_task(
+                work_uid, f'{stage_number}.{work_number}', 2, name,
+                item_dates(dates, 'works', work.get('id'), start_date, start, duration),
+                summary=False, notes=work.get('description') or '',
+            ))
+            executor = (work.get('executor') or '').strip()
+            if executor:
+                resource_uid = executors.setdefault(executor, len(executors) + 1)
+                assignments.append((work_uid, resource_uid))
+    write('</Tasks>\n')
+
+    write('<Resources>\n')
+    for name, resource_uid in executors.items():
+        write('<Resource>' + _msp_element('UID', resource_uid) + _msp_element('ID', resource_uid)
+              + _msp_element('Name', name) + _msp_element('Type', 1) + '</Resource>\n')
+    write('</Resources>\n')
+
+    write('<Assignments>\n')
+    for assignment_uid, (task_uid, resource_uid) in enumerate(assignments, start=1):
+        write('<Assignment>' + _msp_element('UID', assignment_uid) + _msp_element('TaskUID', task_uid)
+              + _msp_element('ResourceUID', resource_uid) + _msp_element('Units', 1) + '</Assignment>\n')
+    write('</Assignments>\n')
+    write('</Project>\n')
+
+
+# --- iCalendar --------------------------------------------------------------
+
+def _ics_text(value):
+    return (
+        str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ics_line(line):
+    """
+    Строка с переносом по 75 октетов (RFC 5545, 3.1) и CRLF
+    """
+    data = line.encode('utf-8')
+    if len(data) <= ICS_LINE_LIMIT:
+        return data + b'\r\n'
+
+    chunks = []
+    current = b''
+    limit = ICS_LINE_LIMIT
+    for char in line:
+        encoded = char.encode('utf-8')
+        if len(current) + len(encoded) > limit:
+            chunks.append(current)
+            current = b''
+            # Продолжение начинается с пробела, который тоже занимает октет
+            limit = ICS_LINE_LIMIT - 1
+        current += encoded
+    chunks.append(current)
+    return b'\r\n '.join(chunks) + b'\r\n'
+
+
+def write_ics(chart_data, out, title='', start_date=None, stamp=None, dates=None):
+    """
+    Записывает календарь, в котором каждая работа — событие на весь период выполнения
+    """
+    start_date = start_date or default_start_date()
+    stamp = stamp or datetime.combine(start_date, time())
+    if stamp.tzinfo is not None:
+        stamp = stamp.astimezone(dt_timezone.utc)
+    dtstamp = stamp.strftime('%Y%m%dT%H%M%SZ')
+    write = lambda line: out.write(_ics_line(line))
+
+    write('BEGIN:VCALENDAR')
+    write('VERSION:2.0')
+    write('PRODID:-//SGP//Gantt export//RU')
+    write('CALSCALE:GREGORIAN')
+    if title:
+        write(f'X-WR-CALNAME:{_ics_text(title)}')
+
+    for stage, work in iter_works(chart_data):
+        start, duration = work_span(stage, work)
+        first, last = item_dates(dates, 'works', work.get('id'), start_date, start, duration)
+        details = [f'Этап: {stage.get("name")}']
+        if work.get('executor'):
+            details.append(f'Исполнитель: {work.get("executor")}')
+        if work.get('description'):
+            details.append(work.get('description'))
+
+        write('BEGIN:VEVENT')
+        write(f'UID:work-{stage.get("id")}-{work.get("id")}-{start}@sgp')
+        write(f'DTSTAMP:{dtstamp}')
+        write(f'DTSTART;VALUE=DATE:{first:%Y%m%d}')
+        # DTEND для событий на весь день не включается в период
+        write(f'DTEND;VALUE=DATE:{last + timedelta(days=1):%Y%m%d}')
+        name = ' '.join(str(part) for part in (work.get('number'), work.get('title')) if part)
+        write(f'SUMMARY:{_ics_text(name)}')
+        write(f'DESCRIPTION:{_ics_text(chr(10).join(details))}')
+        write(f'CATEGORIES:{_ics_text(stage.get("name"))}')
+        write('TRANSP:TRANSPARENT')
+        write('END:VEVENT')
+
+    write('END:VCALENDAR')
+
+
+EXPORTERS = {
+    'csv': (write_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (write_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'xml': (write_msproject, 'application/xml'),
+    'ics': (write_ics, 'text/calendar; charset=utf-8'),
+}
@@ -1,5 +1,6 @@
 from django import forms
-from .models import UserGanttChart, MineralType, Stage, Question
+from .models import UserGanttChart, MineralType, Stage, Question, WorkingCalendar
+from .scheduling import DEFAULT_EXECUTOR_CAPACITY
 
 class GanttChartCreationForm(forms.Form):
     title = forms.CharField(
@@ -16,6 +17,44 @@ class GanttChartCreationForm(forms.Form):
     start_stage_id = forms.IntegerField(widget=forms.HiddenInput(), required=True)
     question_id = forms.IntegerField(widget=forms.HiddenInput(), required=False)
     
+    # Привязка к датам
+    anchor_date = forms.DateField(
+        required=False,
+        label='Дата начала плана',
+        help_text='Если не указана — первое число текущего месяца',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}, format='%Y-%m-%d')
+    )
+    calendar = forms.ModelChoiceField(
+        queryset=WorkingCalendar.objects.all(),
+        required=False,
+        empty_label='По умолчанию',
+        label='Рабочий календарь',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    # Выравнивание загрузки исполнителей
+    level_resources = forms.BooleanField(
+        required=False,
+        label='Учитывать загрузку исполнителей',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    executor_capacity = forms.IntegerField(
+        required=False,
+        min_value=1,
+        initial=DEFAULT_EXECUTOR_CAPACITY,
+        label='Одновременных работ у исполнителя',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 1})
+    )
+    capacity_overrides = forms.CharField(
+        required=False,
+        label='Особые ограничения',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'Буровая партия: 2\nЦентральная лаборатория: 3'
+        })
+    )
+    
     def clean_mineral_type_id(self):
         mineral_id = self.cleaned_data['mineral_type_id']
         try:
@@ -44,6 +83,39 @@ class GanttChartCreationForm(forms.Form):
                 raise forms.ValidationError('Выберите корректный вопрос')
         return None
     
+    def clean_capacity_overrides(self):
+        """
+        Строки вида «Исполнитель: число» (допускается и «=»)
+        """
+        capacities = {}
+        text = self.cleaned_data.get('capacity_overrides') or ''
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            name, separator, value = line.replace('=', ':').rpartition(':')
+            try:
+                capacity = int(value)
+            except ValueError:
+                capacity = 0
+            if not separator or not name.strip() or capacity < 1:
+                raise forms.ValidationError(
+                    f'Строка {line_number}: ожидается «Исполнитель: число» с числом не меньше 1'
+                )
+            capacities[name.strip()] = capacity
+        return capacities
+    
+    def leveling_options(self):
+        """
+        Параметры для prepare_chart_data(leveling=...) или None, если выравнивание не включено
+        """
+        if not self.cleaned_data.get('level_resources'):
+            return None
+        return {
+            'default_capacity': self.cleaned_data.get('executor_capacity') or DEFAULT_EXECUTOR_CAPACITY,
+            'capacities': self.cleaned_data.get('capacity_overrides') or {},
+        }
+    
     def save(self, user):
         mineral_type = self.cleaned_data['mineral_type_id']
         start_stage = self.cleaned_data['start_stage_id']
@@ -55,6 +127,8 @@ class GanttChartCreationForm(forms.Form):
             mineral_type=mineral_type,
             start_stage=start_stage,
             question=question,
+            anchor_date=self.cleaned_data.get('anchor_date'),
+            calendar=self.cleaned_data.get('calendar'),
             chart_data={} 
         )
         
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from roadmap_app.models import UserGanttChart
+from roadmap_app.chart_metrics import summarize_chart_data
+
+
+class Command(BaseCommand):
+    help = 'Пересчет сводных колонок диаграмм Ганта по chart_data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Количество диаграмм, обновляемых одним запросом'
+        )
+        parser.add_argument(
+            '--only-empty', action='store_true',
+            help='Обновлять только диаграммы с незаполненным размером данных'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(UserGanttChart.SUMMARY_FIELDS)
+
+        charts = UserGanttChart.objects.only('id', 'chart_data', *fields).order_by('id')
+        if options['only_empty']:
+            charts = charts.filter(payload_bytes=0)
+
+        self.stdout.write('📥 Пересчет показателей диаграмм...')
+        updated = 0
+        batch = []
+
+        for chart in charts.iterator(chunk_size=batch_size):
+            summary = summarize_chart_data(chart.chart_data)
+            if all(getattr(chart, field) == value for field, value in summary.items()):
+                continue
+            for field, value in summary.items():
+                setattr(chart, field, value)
+            # JSON больше не нужен, освобождаем память до записи пакета
+            chart.chart_data = None
+            batch.append(chart)
+
+            if len(batch) >= batch_size:
+                updated += self._flush(batch, fields)
+                batch = []
+
+        if batch:
+            updated += self._flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Обновлено диаграмм: {updated}'))
+
+    def _flush(self, batch, fields):
+        # bulk_update пишет только сводные колонки; updated_at не меняется
+        with transaction.atomic():
+            UserGanttChart.objects.bulk_update(batch, fields)
+        return len(batch)
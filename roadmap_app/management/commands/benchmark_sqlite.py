@@ -0,0 +1,219 @@
+import csv
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from roadmap_app.db_routing import REPLICA_DB, read_only_uri
+from roadmap_app.db_tuning import DEFAULT_SQLITE_PRAGMAS, current_pragmas
+from roadmap_app.models import Stage, UserGanttChart, Work
+from users_app.backends import clear_user_cache
+
+BENCHMARK_USERNAME = 'sqlite_benchmark'
+
+
+def _copy_database(source, target, journal_mode):
+    """
+    Копия базы через backup API (корректна и для базы в режиме WAL)
+    """
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+    finally:
+        src.close()
+        dst.close()
+
+
+@contextmanager
+def _database(path, options):
+    """
+    Временно направляет соединения 'default' и реплики (в том числе новых потоков) на копию базы
+    """
+    db = connections.settings['default']
+    replica = connections.settings.get(REPLICA_DB)
+    saved = db['NAME'], db.get('OPTIONS', {}), replica and replica['NAME']
+    connections.close_all()
+    db['NAME'], db['OPTIONS'] = path, options
+    if replica:
+        replica['NAME'] = read_only_uri(path)
+    clear_user_cache()
+    try:
+        yield
+    finally:
+        connections.close_all()
+        clear_user_cache()
+        db['NAME'], db['OPTIONS'], replica_name = saved
+        if replica:
+            replica['NAME'] = replica_name
+
+
+def _percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное сравнение SQLite по умолчанию и с рекомендуемыми PRAGMA (DEFAULT_SQLITE_PRAGMAS) '
+        'на путях create_gantt и import_data (параллельные писатели и читатели)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Параллельных писателей')
+        parser.add_argument('--iterations', type=int, default=10, help='Запросов на писателя')
+        parser.add_argument('--readers', type=int, default=2, help='Параллельных читателей (личный кабинет)')
+        parser.add_argument('--rows', type=int, default=20, help='Строк в файле импорта')
+
+    def handle(self, *args, **options):
+        db = connections.settings['default']
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Сравнение выполняется только для SQLite')
+
+        tuned_options = db.get('OPTIONS', {})
+        default_options = {key: value for key, value in tuned_options.items() if key != 'transaction_mode'}
+        configs = [
+            ('SQLite по умолчанию', 'DELETE', {}, default_options),
+            ('DEFAULT_SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS['journal_mode'], DEFAULT_SQLITE_PRAGMAS, tuned_options),
+        ]
+
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            MEDIA_ROOT=tmp, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            for index, (label, journal_mode, pragmas, db_options) in enumerate(configs):
+                path = os.path.join(tmp, f'benchmark-{index}.sqlite3')
+                _copy_database(str(db['NAME']), path, journal_mode)
+                with _database(path, db_options), override_settings(SQLITE_PRAGMAS=pragmas):
+                    self.stdout.write(f'⚙️  {label}: {current_pragmas(connections["default"])}')
+                    results[label] = self._run_config(options)
+
+        self._report(results)
+
+    def _run_config(self, options):
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCHMARK_USERNAME, defaults={'role': 'admin', 'is_staff': True}
+        )
+        stage = Stage.objects.filter(works__isnull=False).select_related('mineral_type').order_by('mineral_type_id', 'order').first()
+        if stage is None:
+            raise CommandError('В базе нет этапов с работами для сравнения')
+
+        def create_gantt(client, thread, iteration):
+            response = client.post(reverse('create_gantt'), {
+                'title': f'benchmark {thread}-{iteration}',
+                'mineral_type_id': stage.mineral_type_id,
+                'start_stage_id': stage.id,
+            }, secure=True)
+            return response.status_code == 302
+
+        def import_data(client, thread, iteration):
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(['stage_id', 'number', 'title', 'executor', 'duration_months', 'start_month', 'order'])
+            for row in range(options['rows']):
+                writer.writerow([stage.id, f'B{thread}.{iteration}.{row}', 'Нагрузочная работа', 'Тест', 1, 0, 1000 + row])
+            upload = SimpleUploadedFile('benchmark.csv', out.getvalue().encode('utf-8'), content_type='text/csv')
+            before = Work.objects.filter(number__startswith=f'B{thread}.{iteration}.').count()
+            client.post(reverse('import_data'), {
+                'model_type': 'work', 'import_mode': 'create', 'validate_data': 'on', 'import_file': upload,
+            }, secure=True)
+            imported = Work.objects.filter(number__startswith=f'B{thread}.{iteration}.').count() - before
+            return imported == options['rows']
+
+        return {
+            'create_gantt': self._run_path(create_gantt, user, options),
+            'import_data': self._run_path(import_data, user, options),
+        }
+
+    def _run_path(self, work, user, options):
+        threads, iterations = options['threads'], options['iterations']
+        latencies, failures, reads = [], [], []
+        barrier = threading.Barrier(threads + options['readers'] + 1)
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def writer(thread):
+            client = Client()
+            client.force_login(user)
+            barrier.wait()
+            try:
+                for iteration in range(iterations):
+                    started = time.perf_counter()
+                    try:
+                        ok = work(client, thread, iteration)
+                    except Exception:
+                        ok = False
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                        if not ok:
+                            failures.append(thread)
+            finally:
+                connections.close_all()
+
+        def reader():
+            client = Client()
+            client.force_login(user)
+            barrier.wait()
+            try:
+                while not done.is_set():
+                    try:
+                        ok = client.get(reverse('dashboard'), secure=True).status_code == 200
+                    except Exception:
+                        ok = False
+                    with lock:
+                        reads.append(ok)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=writer, args=(thread,)) for thread in range(threads)]
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in workers + readers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        UserGanttChart.objects.filter(user=user).delete()
+        total = threads * iterations
+        return {
+            'total': total,
+            'failed': len(failures),
+            'throughput': (total - len(failures)) / elapsed if elapsed else 0,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'reads': len(reads),
+            'read_errors': reads.count(False),
+        }
+
+    def _report(self, results):
+        (base_label, base), (tuned_label, tuned) = results.items()
+        for path in ('create_gantt', 'import_data'):
+            self.stdout.write(f'\n📊 {path}')
+            for label, row in ((base_label, base[path]), (tuned_label, tuned[path])):
+                self.stdout.write(
+                    f'  {label:<22} {row["throughput"]:8.1f} усп. запросов/с  '
+                    f'ошибок {row["failed"]}/{row["total"]}  '
+                    f'p50 {row["p50"] * 1000:7.1f} мс  p95 {row["p95"] * 1000:7.1f} мс  '
+                    f'чтений {row["reads"]} (ошибок {row["read_errors"]})'
+                )
+            before, after = base[path]['throughput'], tuned[path]['throughput']
+            if before:
+                self.stdout.write(self.style.SUCCESS(f'  ✅ Прирост пропускной способности: ×{after / before:.2f}'))
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Загрузка рабочего процесса: WSGI-приложение и все модули URLconf (а с ними и представления)
+BOOT_SCRIPT = (
+    'from django.core.wsgi import get_wsgi_application; '
+    'get_wsgi_application(); '
+    'from django.urls import get_resolver; '
+    'get_resolver().url_patterns'
+)
+# Тяжелые библиотеки, которые должны импортироваться только внутри функций
+FORBIDDEN_MODULES = ('pandas', 'openpyxl', 'PIL', 'matplotlib', 'numpy')
+
+
+def parse_importtime(stderr):
+    """
+    Разбор вывода python -X importtime: список (модуль, собственное, суммарное время в мкс, вложенность)
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def measure_boot(settings_module):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+        env=env, capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    if process.returncode:
+        raise CommandError(f'Рабочий процесс не запустился:\n{process.stderr[-2000:]}')
+    return parse_importtime(process.stderr)
+
+
+class Command(BaseCommand):
+    help = 'Время импорта модулей при старте рабочего процесса (python -X importtime)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='Число запусков; берется самый быстрый'
+        )
+        parser.add_argument(
+            '--budget-ms', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+            help='Допустимое суммарное время импорта, мс'
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько самых медленных модулей верхнего уровня показать'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой при превышении бюджета или импорте тяжелых библиотек'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'🚀 Старт рабочего процесса ({settings.SETTINGS_MODULE}), запусков: {options["runs"]}')
+
+        # Первый запуск прогревает кэш байт-кода и файловой системы и в замер не входит
+        measure_boot(settings.SETTINGS_MODULE)
+        runs = [measure_boot(settings.SETTINGS_MODULE) for _ in range(max(1, options['runs']))]
+        modules = min(runs, key=lambda run: sum(module[1] for module in run))
+        total_ms = sum(module[1] for module in modules) / 1000
+
+        self.stdout.write(f'  ⏱  Импорт модулей: {total_ms:.0f} мс ({len(modules)} модулей), бюджет {options["budget_ms"]:.0f} мс')
+        if resource is not None:
+            # ru_maxrss в Linux — в килобайтах
+            rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            self.stdout.write(f'  💾 Пиковая память процесса: {rss_mb:.0f} МБ')
+
+        top_level = sorted((module for module in modules if module[3] == 0), key=lambda module: -module[2])
+        for name, _, cumulative_us, _ in top_level[:options['top']]:
+            self.stdout.write(f'       {cumulative_us / 1000:8.1f} мс  {name}')
+
+        problems = []
+        loaded = {module[0].split('.')[0] for module in modules}
+        for name in FORBIDDEN_MODULES:
+            if name in loaded:
+                problems.append(f'при старте импортируется {name}')
+                self.stdout.write(self.style.WARNING(f'  ❌ {name} импортируется при старте'))
+        if total_ms > options['budget_ms']:
+            problems.append(f'импорт занимает {total_ms:.0f} мс при бюджете {options["budget_ms"]:.0f} мс')
+            self.stdout.write(self.style.WARNING('  ❌ Бюджет времени старта превышен'))
+
+        if problems:
+            message = 'Старт рабочего процесса замедлился: ' + '; '.join(problems)
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Старт укладывается в бюджет'))
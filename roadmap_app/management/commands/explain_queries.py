@@ -0,0 +1,120 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from roadmap_app.chart_queries import charts_referencing
+from roadmap_app.data_grid import grid_query
+from roadmap_app.models import Question, Stage
+from roadmap_app.pagination import DEFAULT_PAGE_SIZE, keyset_queryset
+from roadmap_app.scheduling import chart_stages, chart_works, target_stage_ids
+from roadmap_app.versioning import row_values
+from roadmap_app.view_queries import (
+    DASHBOARD_PAGE_SIZE, DASHBOARD_SORTS, RECENT_IMPORT_COUNT,
+    WORK_LIST_DEFAULT_FIELDS, WORK_LIST_ORDERING,
+    dashboard_charts, home_faqs, mineral_type_questions, mineral_type_stages, search_faqs,
+    selection_works, user_charts, user_import_logs,
+)
+
+# Полный просмотр таблицы: SCAN без индекса в SQLite, Seq Scan в PostgreSQL
+FULL_SCAN_PATTERNS = [
+    re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)'),
+    re.compile(r'\bSeq Scan\b'),
+]
+
+
+def grid_queryset(model_type, **params):
+    query = grid_query(model_type, params)
+    return keyset_queryset(query['queryset'], query['ordering'], limit=query['limit'])
+
+
+def view_querysets(sample_id=1):
+    """
+    Запросы, которые выполняют представления roadmap_app; строятся теми же
+    функциями, что и в представлениях.
+
+    Возвращает список (представление, описание, queryset, допускается_скан).
+    """
+    works_fields = list(dict.fromkeys([*WORK_LIST_DEFAULT_FIELDS, *WORK_LIST_ORDERING]))
+    return [
+        ('HomeView', 'активные FAQ', home_faqs(), False),
+        ('dashboard', 'диаграммы пользователя',
+         keyset_queryset(dashboard_charts(sample_id), DASHBOARD_SORTS['created'], limit=DASHBOARD_PAGE_SIZE), False),
+        ('view_gantt', 'диаграмма пользователя',
+         user_charts(sample_id).filter(id=sample_id), False),
+        ('prepare_chart_data', 'этапы типа ПИ',
+         row_values(Stage, chart_stages(sample_id)), False),
+        ('prepare_chart_data', 'работы этапов', chart_works([sample_id]), False),
+        ('prepare_chart_data', 'целевые этапы вопроса',
+         target_stage_ids(Question(id=sample_id), sample_id), False),
+        ('get_filtered_stages', 'этапы типа ПИ', mineral_type_stages(sample_id), False),
+        ('get_filtered_questions', 'вопросы типа ПИ', mineral_type_questions(sample_id), False),
+        ('get_works_for_selection', 'работы этапа',
+         keyset_queryset(
+             selection_works(sample_id, stage_id=sample_id, question_id=sample_id).values(*works_fields),
+             WORK_LIST_ORDERING, limit=DEFAULT_PAGE_SIZE
+         ), False),
+        ('faq_search', 'поиск по FAQ', search_faqs('x'), False),
+        ('admin_dashboard', 'последние импорты',
+         user_import_logs(sample_id)[:RECENT_IMPORT_COUNT], False),
+        ('import_logs', 'логи импорта пользователя', user_import_logs(sample_id), False),
+        ('data_management', 'страница типов ПИ', grid_queryset('mineral_type'), False),
+        ('data_management', 'страница этапов', grid_queryset('stage'), False),
+        ('data_management', 'страница работ', grid_queryset('work'), False),
+        ('data_management', 'поиск работ', grid_queryset('work', q='Гео', sort='title'), False),
+        # В SQLite поиск по chart_data — просмотр json_each, индекс GIN есть только в PostgreSQL
+        ('delete_data', 'диаграммы с этапом',
+         charts_referencing('stage', sample_id), connection.vendor != 'postgresql'),
+    ]
+
+
+def is_full_scan(plan):
+    return any(pattern.search(line)
+               for line in plan.splitlines()
+               for pattern in FULL_SCAN_PATTERNS)
+
+
+class Command(BaseCommand):
+    help = 'Анализ планов запросов представлений (EXPLAIN QUERY PLAN) и поиск полных сканирований'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample-id', type=int, default=1,
+            help='ID, подставляемый в фильтры запросов'
+        )
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help='Завершиться с ошибкой, если найдены недопустимые полные сканирования'
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать план каждого запроса'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'🔍 Анализ планов запросов ({connection.vendor})')
+        problems = []
+
+        for view_name, description, queryset, scan_allowed in view_querysets(options['sample_id']):
+            plan = queryset.explain()
+            label = f'{view_name}: {description}'
+
+            if is_full_scan(plan):
+                if scan_allowed:
+                    self.stdout.write(f'  ⚪ {label} — полное сканирование (допустимо)')
+                else:
+                    problems.append(label)
+                    self.stdout.write(self.style.WARNING(f'  ❌ {label} — полное сканирование'))
+            else:
+                self.stdout.write(f'  ✅ {label}')
+
+            if options['verbose_plans'] or (is_full_scan(plan) and not scan_allowed):
+                for line in plan.splitlines():
+                    self.stdout.write(f'       {line}')
+
+        if problems:
+            message = f'Найдено полных сканирований: {len(problems)}'
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Все запросы используют индексы'))
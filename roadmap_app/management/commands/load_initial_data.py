@@ -3,6 +3,7 @@ import json
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from roadmap_app.models import MineralType, Stage, Question, Work, FAQ
+from roadmap_app.stage_graph import dependency_graph_errors
 
 class Command(BaseCommand):
     help = 'Загрузка начальных данных из JSON файлов'
@@ -71,6 +72,10 @@ class Command(BaseCommand):
                             
                     except MineralType.DoesNotExist:
                         self.stdout.write(f'  ❌ Ошибка: минеральный тип не найден для этапа {item["pk"]}')
+            
+            # Зависимости проверяются один раз для всего загруженного графа
+            for error in dependency_graph_errors():
+                self.stdout.write(f'  ❌ {error}')
         
         # Загружаем вопросы
         self.stdout.write('📥 Загрузка вопросов...')
@@ -0,0 +1,119 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+
+from roadmap_app.db_routing import read_only_uri
+from roadmap_app.deletion import restore_rows
+
+SOURCE_DB = 'sqlite_source'
+COPY_BATCH_SIZE = 500
+# Заполняются migrate в целевой базе и заменяются строками источника (id совпадут с источником)
+REPLACED_MODELS = (ContentType, Permission)
+
+
+def copied_models():
+    """
+    Все таблицы проекта, включая таблицы связей многие-ко-многим
+    """
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос данных из файла SQLite в текущую базу (DB_ENGINE=postgresql) '
+        'с сохранением id; целевая база должна быть пустой и полностью мигрированной'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=str(settings.BASE_DIR / 'db.sqlite3'),
+            help='Файл SQLite (открывается только для чтения)'
+        )
+        parser.add_argument('--batch-size', type=int, default=COPY_BATCH_SIZE, help='Строк в пакете вставки')
+
+    def handle(self, *args, **options):
+        target = connections[DEFAULT_DB_ALIAS]
+        if target.vendor == 'sqlite' and str(target.settings_dict['NAME']) == options['source']:
+            raise CommandError('Источник совпадает с текущей базой: задайте DB_ENGINE=postgresql')
+
+        connections.settings[SOURCE_DB] = connections.configure_settings({
+            **connections.settings,
+            SOURCE_DB: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': read_only_uri(options['source'])},
+        })[SOURCE_DB]
+        try:
+            self._check_schemas(target)
+            models = copied_models()
+            self._check_empty(models)
+            self.stdout.write(f'🚚 Перенос {options["source"]} → {target.vendor} ({target.settings_dict["NAME"]})')
+            copied = self._copy(models, options['batch_size'])
+        finally:
+            connections[SOURCE_DB].close()
+            del connections[SOURCE_DB]
+            del connections.settings[SOURCE_DB]
+        ContentType.objects.clear_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Перенесено строк: {sum(copied.values())} в {len(copied)} таблицах'
+        ))
+
+    def _check_schemas(self, target):
+        executor = MigrationExecutor(target)
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            raise CommandError('Целевая база мигрирована не полностью: выполните migrate')
+        source_applied = set(MigrationRecorder(connections[SOURCE_DB]).applied_migrations())
+        target_applied = set(MigrationRecorder(target).applied_migrations())
+        if source_applied != target_applied:
+            missing = sorted(f'{app}.{name}' for app, name in target_applied - source_applied)
+            raise CommandError(
+                'Схема источника отличается от целевой: выполните migrate для файла SQLite'
+                + (f' (не применены: {", ".join(missing[:5])})' if missing else '')
+            )
+
+    def _check_empty(self, models):
+        filled = [
+            model._meta.label for model in models
+            if model not in REPLACED_MODELS and model._base_manager.using(DEFAULT_DB_ALIAS).exists()
+        ]
+        if filled:
+            raise CommandError(f'Целевая база не пуста: {", ".join(filled[:5])}')
+
+    def _copy(self, models, batch_size):
+        copied = {}
+        # Внешние ключи проверяются при фиксации (DEFERRABLE INITIALLY DEFERRED),
+        # поэтому таблицы копируются в любом порядке одной транзакцией
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            ContentType.objects.using(DEFAULT_DB_ALIAS).all().delete()
+            for model in models:
+                rows = model._base_manager.using(SOURCE_DB).order_by('pk').values()
+                batch, count = [], 0
+                for row in rows.iterator(chunk_size=batch_size):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        restore_rows(model, batch, using=DEFAULT_DB_ALIAS)
+                        count += len(batch)
+                        batch = []
+                if batch:
+                    restore_rows(model, batch, using=DEFAULT_DB_ALIAS)
+                    count += len(batch)
+
+                if count != model._base_manager.using(DEFAULT_DB_ALIAS).count():
+                    raise CommandError(f'{model._meta.label}: число строк после переноса не совпадает')
+                if count:
+                    copied[model._meta.label] = count
+                    self.stdout.write(f'  {model._meta.label}: {count}')
+
+            # Счетчики id продолжаются после перенесенных значений
+            target = connections[DEFAULT_DB_ALIAS]
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        return copied
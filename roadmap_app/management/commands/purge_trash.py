@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from roadmap_app.deletion import TRASH_RETENTION_DAYS, purge_trash
+
+
+class Command(BaseCommand):
+    help = 'Очистка корзины от записей старше срока хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=TRASH_RETENTION_DAYS,
+            help='Удалить записи корзины старше указанного числа дней'
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_trash(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Удалено записей корзины: {purged}'))
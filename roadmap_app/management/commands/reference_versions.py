@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from roadmap_app.models import DataVersion, UserGanttChart
+from roadmap_app.scenarios import diff_schedules
+from roadmap_app.scheduling import prepare_chart_data_as_of
+from roadmap_app.versioning import current_version, record_baseline, version_at
+
+
+class Command(BaseCommand):
+    help = 'Версии справочника: последние изменения, исходное состояние и воспроизведение диаграммы по снимку'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--baseline', action='store_true',
+            help='Записать версию с текущим состоянием всего справочника '
+                 '(после правок в обход приложения)'
+        )
+        parser.add_argument('--last', type=int, default=10, help='Сколько последних версий показать')
+        parser.add_argument('--chart', type=int, help='Пересобрать диаграмму по снимку справочника')
+        parser.add_argument(
+            '--reference-version', type=int,
+            help='Версия справочника для --chart (по умолчанию — версия, на которой диаграмма построена)'
+        )
+        parser.add_argument('--at', help='Момент времени (ISO 8601) вместо номера версии для --chart')
+
+    def handle(self, *args, **options):
+        if options['baseline']:
+            version = record_baseline()
+            self.stdout.write(self.style.SUCCESS(f'✅ Записана версия {version.id}: {version.change_count} записей'))
+
+        if options['chart']:
+            self._rebuild_chart(options)
+            return
+
+        self.stdout.write(f'📌 Текущая версия справочника: {current_version()}')
+        for version in DataVersion.objects.all()[:options['last']]:
+            self.stdout.write(
+                f'  v{version.id}  {timezone.localtime(version.created_at):%d.%m.%Y %H:%M:%S}  '
+                f'{version.get_source_display()}: {version.change_count}'
+            )
+
+    def _rebuild_chart(self, options):
+        chart = UserGanttChart.objects.filter(id=options['chart']).first()
+        if chart is None:
+            raise CommandError(f'Диаграмма {options["chart"]} не найдена')
+        chart_data = chart.chart_data or {}
+
+        version = options['reference_version'] or chart_data.get('reference_version')
+        leveling = chart_data.get('leveling')
+        try:
+            if options['at']:
+                moment = parse_datetime(options['at'])
+                if moment is None:
+                    raise ValueError(f'Некорректный момент времени: {options["at"]}')
+                if timezone.is_naive(moment):
+                    moment = timezone.make_aware(moment)
+                version = version_at(moment)
+            if not version:
+                raise ValueError('Диаграмма построена до включения версий: укажите --reference-version или --at')
+            rebuilt = prepare_chart_data_as_of(
+                version,
+                (chart_data.get('mineral_type') or {}).get('id'),
+                (chart_data.get('start_stage') or {}).get('id'),
+                (chart_data.get('question') or {}).get('id'),
+                leveling={
+                    'default_capacity': leveling['default_capacity'],
+                    'capacities': leveling['capacities'],
+                } if leveling else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        diff = diff_schedules(chart_data, rebuilt)
+        self.stdout.write(
+            f'📊 Диаграмма {chart.id} по версии {version}: '
+            f'{diff["total_duration"]["b"]} мес. (сохранено {diff["total_duration"]["a"]})'
+        )
+        if not diff['stages'] and not diff['works'] and not diff['total_duration']['delta']:
+            self.stdout.write(self.style.SUCCESS('✅ Совпадает с сохраненной диаграммой'))
+            return
+        for stage in diff['stages']:
+            self.stdout.write(f'  этап «{stage["name"]}»: {stage["status"]}')
+        for work in diff['works']:
+            self.stdout.write(f'  работа «{work["title"]}»: {work["status"]}')
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dataimportlog',
+            index=models.Index(fields=['user', '-created_at'], name='importlog_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faq',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='faq_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stage',
+            index=models.Index(fields=['mineral_type', 'order'], name='stage_mineral_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userganttchart',
+            index=models.Index(fields=['user', '-created_at'], name='chart_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='work',
+            index=models.Index(fields=['stage', 'order'], name='work_stage_order_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:26
+
+from django.db import migrations, models
+
+from roadmap_app.chart_metrics import summarize_chart_data
+
+
+def fill_chart_summary(apps, schema_editor):
+    UserGanttChart = apps.get_model('roadmap_app', 'UserGanttChart')
+    charts = UserGanttChart.objects.only('id', 'chart_data').iterator(chunk_size=200)
+    batch = []
+    for chart in charts:
+        for field, value in summarize_chart_data(chart.chart_data).items():
+            setattr(chart, field, value)
+        batch.append(chart)
+        if len(batch) >= 200:
+            UserGanttChart.objects.bulk_update(batch, ['total_duration', 'stage_count', 'work_count'])
+            batch = []
+    if batch:
+        UserGanttChart.objects.bulk_update(batch, ['total_duration', 'stage_count', 'work_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userganttchart',
+            name='stage_count',
+            field=models.IntegerField(default=0, verbose_name='Количество этапов'),
+        ),
+        migrations.AddField(
+            model_name='userganttchart',
+            name='total_duration',
+            field=models.IntegerField(default=0, verbose_name='Общая длительность (месяцев)'),
+        ),
+        migrations.AddField(
+            model_name='userganttchart',
+            name='work_count',
+            field=models.IntegerField(default=0, verbose_name='Количество работ'),
+        ),
+        migrations.RunPython(fill_chart_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0004_chart_summary_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userganttchart',
+            name='critical_path_length',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Критический путь (месяцев)'),
+        ),
+        migrations.AddField(
+            model_name='userganttchart',
+            name='payload_bytes',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Размер данных (байт)'),
+        ),
+        migrations.AlterField(
+            model_name='userganttchart',
+            name='stage_count',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Количество этапов'),
+        ),
+        migrations.AlterField(
+            model_name='userganttchart',
+            name='total_duration',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Общая длительность (месяцев)'),
+        ),
+        migrations.AlterField(
+            model_name='userganttchart',
+            name='work_count',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Количество работ'),
+        ),
+    ]
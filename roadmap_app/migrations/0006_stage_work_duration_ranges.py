@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0005_chart_metric_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stage',
+            name='duration_max_months',
+            field=models.IntegerField(blank=True, help_text='Пессимистичная оценка; если не задана, берется доля от длительности', null=True, verbose_name='Максимальная длительность (месяцев)'),
+        ),
+        migrations.AddField(
+            model_name='stage',
+            name='duration_min_months',
+            field=models.IntegerField(blank=True, help_text='Оптимистичная оценка; если не задана, берется доля от длительности', null=True, verbose_name='Минимальная длительность (месяцев)'),
+        ),
+        migrations.AddField(
+            model_name='work',
+            name='duration_max_months',
+            field=models.IntegerField(blank=True, help_text='Пессимистичная оценка; если не задана, берется доля от длительности', null=True, verbose_name='Максимальная длительность (месяцев)'),
+        ),
+        migrations.AddField(
+            model_name='work',
+            name='duration_min_months',
+            field=models.IntegerField(blank=True, help_text='Оптимистичная оценка; если не задана, берется доля от длительности', null=True, verbose_name='Минимальная длительность (месяцев)'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0006_stage_work_duration_ranges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartScenario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название варианта')),
+                ('delta', models.JSONField(default=dict, verbose_name='Отличия от базовой диаграммы')),
+                ('total_duration', models.IntegerField(default=0, verbose_name='Общая длительность (месяцев)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('chart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scenarios', to='roadmap_app.userganttchart', verbose_name='Базовая диаграмма')),
+            ],
+            options={
+                'verbose_name': 'Вариант диаграммы',
+                'verbose_name_plural': 'Варианты диаграмм',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
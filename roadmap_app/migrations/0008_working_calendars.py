@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:53
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0007_chart_scenarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название')),
+                ('code', models.CharField(max_length=50, unique=True, verbose_name='Код')),
+                ('weekend_days', models.CharField(blank=True, default='5,6', help_text='Номера дней через запятую: 0 — понедельник, 6 — воскресенье', max_length=20, verbose_name='Выходные дни недели')),
+                ('field_season_start', models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)], verbose_name='Начало полевого сезона (месяц)')),
+                ('field_season_end', models.PositiveSmallIntegerField(blank=True, help_text='Включительно; сезон может переходить через новый год', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)], verbose_name='Окончание полевого сезона (месяц)')),
+                ('is_default', models.BooleanField(default=False, verbose_name='Календарь по умолчанию')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Рабочий календарь',
+                'verbose_name_plural': 'Рабочие календари',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='userganttchart',
+            name='anchor_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата начала плана'),
+        ),
+        migrations.AddField(
+            model_name='work',
+            name='is_field_work',
+            field=models.BooleanField(default=False, help_text='Выполняется только в полевой сезон рабочего календаря диаграммы', verbose_name='Полевая работа'),
+        ),
+        migrations.AddField(
+            model_name='userganttchart',
+            name='calendar',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='charts', to='roadmap_app.workingcalendar', verbose_name='Рабочий календарь'),
+        ),
+        migrations.CreateModel(
+            name='CalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('is_working', models.BooleanField(default=False, help_text='Отметьте для перенесенного рабочего выходного', verbose_name='Рабочий день')),
+                ('name', models.CharField(blank=True, max_length=200, verbose_name='Название')),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='roadmap_app.workingcalendar', verbose_name='Календарь')),
+            ],
+            options={
+                'verbose_name': 'День календаря',
+                'verbose_name_plural': 'Праздники и переносы',
+                'ordering': ['date'],
+                'unique_together': {('calendar', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0008_working_calendars'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='faq',
+            index=models.Index(fields=['question'], name='faq_question_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mineraltype',
+            index=models.Index(fields=['name'], name='mineraltype_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['text'], name='question_text_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stage',
+            index=models.Index(fields=['name'], name='stage_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stage',
+            index=models.Index(fields=['code'], name='stage_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='work',
+            index=models.Index(fields=['title'], name='work_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='work',
+            index=models.Index(fields=['number'], name='work_number_idx'),
+        ),
+    ]
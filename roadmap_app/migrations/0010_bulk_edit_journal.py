@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:05
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0009_grid_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkEditJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('mineral_type', 'Тип полезного ископаемого'), ('stage', 'Этап'), ('work', 'Работа'), ('question', 'Вопрос'), ('faq', 'FAQ')], max_length=50, verbose_name='Тип данных')),
+                ('field_name', models.CharField(max_length=100, verbose_name='Поле')),
+                ('new_value', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Новое значение')),
+                ('old_values', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Прежние значения')),
+                ('row_count', models.IntegerField(default=0, verbose_name='Изменено записей')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('undone_at', models.DateTimeField(blank=True, null=True, verbose_name='Отменено')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_edits', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Массовая правка',
+                'verbose_name_plural': 'Журнал массовых правок',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='bulkedit_user_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:10
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0010_bulk_edit_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('baseline', 'Исходное состояние'), ('save', 'Сохранение записи'), ('delete', 'Удаление записи'), ('links', 'Изменение связей'), ('bulk', 'Пакетное изменение')], max_length=20, verbose_name='Источник')),
+                ('change_count', models.IntegerField(default=0, verbose_name='Изменено записей')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочника',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('mineral_type', 'Тип полезного ископаемого'), ('stage', 'Этап'), ('work', 'Работа'), ('question', 'Вопрос')], max_length=20, verbose_name='Тип данных')),
+                ('object_id', models.IntegerField(verbose_name='ID записи')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Состояние записи')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='roadmap_app.dataversion', verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Изменение справочника',
+                'verbose_name_plural': 'Изменения справочника',
+                'indexes': [models.Index(fields=['model_type', 'object_id', 'version'], name='change_row_version_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0011_reference_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dataversion',
+            name='source',
+            field=models.CharField(choices=[('baseline', 'Исходное состояние'), ('save', 'Сохранение записи'), ('delete', 'Удаление записи'), ('links', 'Изменение связей'), ('bulk', 'Пакетное изменение'), ('restore', 'Восстановление из корзины')], max_length=20, verbose_name='Источник'),
+        ),
+        migrations.CreateModel(
+            name='TrashEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('mineral_type', 'Тип полезного ископаемого'), ('stage', 'Этап'), ('work', 'Работа'), ('question', 'Вопрос'), ('faq', 'FAQ'), ('chart', 'Диаграмма')], max_length=20, verbose_name='Тип данных')),
+                ('object_id', models.IntegerField(verbose_name='ID записи')),
+                ('label', models.CharField(max_length=500, verbose_name='Запись')),
+                ('impact', models.JSONField(default=list, verbose_name='Затронуто')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Удаленные данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('restored_at', models.DateTimeField(blank=True, null=True, verbose_name='Восстановлено')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trash_entries', to=settings.AUTH_USER_MODEL, verbose_name='Кто удалил')),
+            ],
+            options={
+                'verbose_name': 'Запись корзины',
+                'verbose_name_plural': 'Корзина',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'model_type', '-created_at'], name='trash_user_type_created_idx'), models.Index(fields=['-created_at'], name='trash_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:05
+
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# Индексы только для PostgreSQL: GIN по chart_data (jsonb) для поиска диаграмм
+# по id этапов и работ (roadmap_app.chart_queries) и триграммные индексы pg_trgm
+# для поиска по FAQ (icontains -> UPPER(col::text) LIKE). В SQLite миграция ничего не делает.
+
+CHART_DATA_INDEX = (
+    'chart_data_gin_idx',
+    'CREATE INDEX IF NOT EXISTS chart_data_gin_idx ON roadmap_app_userganttchart '
+    'USING gin (chart_data jsonb_path_ops)',
+)
+FAQ_TRIGRAM_INDEXES = [
+    (
+        f'faq_{column}_trgm_idx',
+        f'CREATE INDEX IF NOT EXISTS faq_{column}_trgm_idx ON roadmap_app_faq '
+        f'USING gin ((UPPER({column}::text)) gin_trgm_ops)',
+    )
+    for column in ('question', 'answer', 'keywords')
+]
+
+
+def pg_trgm_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CHART_DATA_INDEX[1])
+
+    if not pg_trgm_available(schema_editor.connection):
+        logger.warning('Расширение pg_trgm недоступно: триграммные индексы FAQ не созданы')
+        return
+    try:
+        # Точка сохранения: без прав на CREATE EXTENSION миграция продолжается
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError as e:
+        logger.warning('Расширение pg_trgm не установлено (%s): триграммные индексы FAQ не созданы', e)
+        return
+    for _, sql in FAQ_TRIGRAM_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in [CHART_DATA_INDEX, *FAQ_TRIGRAM_INDEXES]:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0012_trash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
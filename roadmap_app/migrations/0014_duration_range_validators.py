@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0013_postgresql_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stage',
+            name='duration_max_months',
+            field=models.IntegerField(blank=True, help_text='Пессимистичная оценка; если не задана, берется доля от длительности', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Максимальная длительность (месяцев)'),
+        ),
+        migrations.AlterField(
+            model_name='stage',
+            name='duration_min_months',
+            field=models.IntegerField(blank=True, help_text='Оптимистичная оценка; если не задана, берется доля от длительности', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Минимальная длительность (месяцев)'),
+        ),
+        migrations.AlterField(
+            model_name='work',
+            name='duration_max_months',
+            field=models.IntegerField(blank=True, help_text='Пессимистичная оценка; если не задана, берется доля от длительности', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Максимальная длительность (месяцев)'),
+        ),
+        migrations.AlterField(
+            model_name='work',
+            name='duration_min_months',
+            field=models.IntegerField(blank=True, help_text='Оптимистичная оценка; если не задана, берется доля от длительности', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Минимальная длительность (месяцев)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap_app', '0014_duration_range_validators'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dataversion',
+            name='source',
+            field=models.CharField(choices=[('baseline', 'Исходное состояние'), ('save', 'Сохранение записи'), ('delete', 'Удаление записи'), ('links', 'Изменение связей'), ('bulk', 'Пакетное изменение'), ('restore', 'Восстановление из корзины'), ('import', 'Импорт из файла')], max_length=20, verbose_name='Источник'),
+        ),
+    ]
@@ -1,5 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+
+from .chart_metrics import summarize_chart_data
 
 class MineralType(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название')
@@ -14,6 +20,23 @@ class MineralType(models.Model):
     class Meta:
         verbose_name = 'Тип полезного ископаемого'
         verbose_name_plural = 'Типы полезных ископаемых'
+        indexes = [
+            # Сортировка и поиск по префиксу в таблице модератора (data_grid)
+            models.Index(fields=['name'], name='mineraltype_name_idx'),
+        ]
+
+def validate_duration_range(instance):
+    """
+    Минимальная длительность <= наиболее вероятная <= максимальная
+    """
+    low, likely, high = instance.duration_min_months, instance.duration_months, instance.duration_max_months
+    errors = {}
+    if low is not None and likely is not None and low > likely:
+        errors['duration_min_months'] = 'Не может превышать длительность'
+    if high is not None and likely is not None and high < likely:
+        errors['duration_max_months'] = 'Не может быть меньше длительности'
+    if errors:
+        raise ValidationError(errors)
 
 class Stage(models.Model):
     """
@@ -33,6 +56,15 @@ class Stage(models.Model):
     # Временные параметры
     duration_months = models.IntegerField(default=1, verbose_name='Длительность этапа (месяцев)')
     start_month = models.IntegerField(default=0, verbose_name='Старт этапа (месяц от начала)')
+    # Диапазон длительности для анализа рисков (duration_months — наиболее вероятная)
+    duration_min_months = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(0)], verbose_name='Минимальная длительность (месяцев)',
+        help_text='Оптимистичная оценка; если не задана, берется доля от длительности'
+    )
+    duration_max_months = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(0)], verbose_name='Максимальная длительность (месяцев)',
+        help_text='Пессимистичная оценка; если не задана, берется доля от длительности'
+    )
     
     # Цвет для отображения
     color = models.CharField(max_length=7, default='#0070C0', verbose_name='Цвет')
@@ -50,11 +82,19 @@ class Stage(models.Model):
     def __str__(self):
         return f"{self.mineral_type.name} - {self.name}"
     
+    def clean(self):
+        validate_duration_range(self)
+    
     class Meta:
         verbose_name = 'Этап'
         verbose_name_plural = 'Этапы'
         ordering = ['order']
         unique_together = ['mineral_type', 'code']
+        indexes = [
+            models.Index(fields=['mineral_type', 'order'], name='stage_mineral_order_idx'),
+            models.Index(fields=['name'], name='stage_name_idx'),
+            models.Index(fields=['code'], name='stage_code_idx'),
+        ]
 
 class Work(models.Model):
     """
@@ -75,17 +115,37 @@ class Work(models.Model):
     # Временные параметры конкретной работы
     duration_months = models.IntegerField(default=1, verbose_name='Длительность (месяцев)')
     start_month = models.IntegerField(default=0, verbose_name='Старт (месяц от начала этапа)')
+    duration_min_months = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(0)], verbose_name='Минимальная длительность (месяцев)',
+        help_text='Оптимистичная оценка; если не задана, берется доля от длительности'
+    )
+    duration_max_months = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(0)], verbose_name='Максимальная длительность (месяцев)',
+        help_text='Пессимистичная оценка; если не задана, берется доля от длительности'
+    )
     
     order = models.IntegerField(default=0, verbose_name='Порядок в этапе')
+    is_field_work = models.BooleanField(
+        default=False, verbose_name='Полевая работа',
+        help_text='Выполняется только в полевой сезон рабочего календаря диаграммы'
+    )
     
     def __str__(self):
         return f"{self.number} - {self.title}"
     
+    def clean(self):
+        validate_duration_range(self)
+    
     class Meta:
         verbose_name = 'Работа'
         verbose_name_plural = 'Работы'
         ordering = ['order']
         unique_together = ['stage', 'number']
+        indexes = [
+            models.Index(fields=['stage', 'order'], name='work_stage_order_idx'),
+            models.Index(fields=['title'], name='work_title_idx'),
+            models.Index(fields=['number'], name='work_number_idx'),
+        ]
 
 class Question(models.Model):
     """
@@ -117,6 +177,93 @@ class Question(models.Model):
     class Meta:
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
+        indexes = [
+            models.Index(fields=['text'], name='question_text_idx'),
+        ]
+
+class WorkingCalendar(models.Model):
+    """
+    Рабочий календарь: выходные дни недели, праздники и переносы,
+    полевой сезон для полевых работ
+    """
+    name = models.CharField(max_length=200, verbose_name='Название')
+    code = models.CharField(max_length=50, unique=True, verbose_name='Код')
+    weekend_days = models.CharField(
+        max_length=20, default='5,6', blank=True, verbose_name='Выходные дни недели',
+        help_text='Номера дней через запятую: 0 — понедельник, 6 — воскресенье'
+    )
+    field_season_start = models.PositiveSmallIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(12)],
+        verbose_name='Начало полевого сезона (месяц)'
+    )
+    field_season_end = models.PositiveSmallIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(12)],
+        verbose_name='Окончание полевого сезона (месяц)',
+        help_text='Включительно; сезон может переходить через новый год'
+    )
+    is_default = models.BooleanField(default=False, verbose_name='Календарь по умолчанию')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.name
+    
+    def weekend_numbers(self):
+        return sorted({int(day) for day in self.weekend_days.replace(' ', '').split(',') if day})
+    
+    def clean(self):
+        try:
+            weekend = self.weekend_numbers()
+        except ValueError:
+            raise ValidationError({'weekend_days': 'Укажите номера дней через запятую'})
+        if any(day not in range(7) for day in weekend):
+            raise ValidationError({'weekend_days': 'Номер дня недели — от 0 до 6'})
+        if (self.field_season_start is None) != (self.field_season_end is None):
+            raise ValidationError('Укажите и начало, и окончание полевого сезона')
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Календарь по умолчанию может быть только один
+        if self.is_default:
+            WorkingCalendar.objects.filter(is_default=True).exclude(pk=self.pk).update(is_default=False)
+    
+    class Meta:
+        verbose_name = 'Рабочий календарь'
+        verbose_name_plural = 'Рабочие календари'
+        ordering = ['name']
+
+class CalendarDay(models.Model):
+    """
+    Исключение из недельного графика: праздник или рабочий выходной (перенос)
+    """
+    calendar = models.ForeignKey(
+        WorkingCalendar,
+        on_delete=models.CASCADE,
+        related_name='days',
+        verbose_name='Календарь'
+    )
+    date = models.DateField(verbose_name='Дата')
+    is_working = models.BooleanField(default=False, verbose_name='Рабочий день',
+                                     help_text='Отметьте для перенесенного рабочего выходного')
+    name = models.CharField(max_length=200, blank=True, verbose_name='Название')
+    
+    def __str__(self):
+        return f"{self.date:%d.%m.%Y} {self.name}".strip()
+    
+    # Таблицы рабочих дней кэшируются по updated_at календаря
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        WorkingCalendar.objects.filter(pk=self.calendar_id).update(updated_at=timezone.now())
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        WorkingCalendar.objects.filter(pk=self.calendar_id).update(updated_at=timezone.now())
+        return result
+    
+    class Meta:
+        verbose_name = 'День календаря'
+        verbose_name_plural = 'Праздники и переносы'
+        ordering = ['date']
+        unique_together = ['calendar', 'date']
 
 class UserGanttChart(models.Model):
     user = models.ForeignKey(
@@ -151,19 +298,91 @@ class UserGanttChart(models.Model):
         verbose_name='Целевой вопрос'
     )
     
+    # Привязка к датам: без anchor_date план отсчитывается от месяца создания
+    anchor_date = models.DateField(null=True, blank=True, verbose_name='Дата начала плана')
+    calendar = models.ForeignKey(
+        WorkingCalendar,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='charts',
+        verbose_name='Рабочий календарь'
+    )
+    
     # Содержимое диаграммы
     chart_data = models.JSONField(default=dict, verbose_name='Данные диаграммы')
     
+    # Сводка по chart_data, пересчитывается при сохранении,
+    # чтобы списки диаграмм не загружали JSON целиком
+    total_duration = models.IntegerField(default=0, db_index=True, verbose_name='Общая длительность (месяцев)')
+    stage_count = models.IntegerField(default=0, db_index=True, verbose_name='Количество этапов')
+    work_count = models.IntegerField(default=0, db_index=True, verbose_name='Количество работ')
+    critical_path_length = models.IntegerField(default=0, db_index=True, verbose_name='Критический путь (месяцев)')
+    payload_bytes = models.IntegerField(default=0, db_index=True, verbose_name='Размер данных (байт)')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    SUMMARY_FIELDS = (
+        'total_duration', 'stage_count', 'work_count',
+        'critical_path_length', 'payload_bytes',
+    )
+    
+    def refresh_summary(self):
+        """
+        Пересчитывает сводные колонки по chart_data
+        """
+        for field, value in summarize_chart_data(self.chart_data).items():
+            setattr(self, field, value)
+    
+    def save(self, *args, **kwargs):
+        # Если chart_data отложено (.defer/.only), оно не менялось — не загружаем его
+        if 'chart_data' not in self.get_deferred_fields():
+            self.refresh_summary()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'chart_data' in update_fields:
+                kwargs['update_fields'] = {*update_fields, *self.SUMMARY_FIELDS}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
-        return f"{self.title} - {self.user.username}"
+        return self.title
     
     class Meta:
         verbose_name = 'Диаграмма Ганта'
         verbose_name_plural = 'Диаграммы Ганта'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='chart_user_created_idx'),
+        ]
+
+class ChartScenario(models.Model):
+    """
+    Вариант диаграммы «что если»: хранит только отличия (delta) от базовой
+    диаграммы — другой вопрос, переопределенные длительности, исключенные
+    работы. Расписание варианта строится из chart_data базовой диаграммы.
+    """
+    chart = models.ForeignKey(
+        UserGanttChart,
+        on_delete=models.CASCADE,
+        related_name='scenarios',
+        verbose_name='Базовая диаграмма'
+    )
+    name = models.CharField(max_length=200, verbose_name='Название варианта')
+    delta = models.JSONField(default=dict, verbose_name='Отличия от базовой диаграммы')
+    
+    # Длительность по последнему расчету, чтобы сравнивать варианты в списке без пересчета
+    total_duration = models.IntegerField(default=0, verbose_name='Общая длительность (месяцев)')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.chart.title} — {self.name}"
+    
+    class Meta:
+        verbose_name = 'Вариант диаграммы'
+        verbose_name_plural = 'Варианты диаграмм'
+        ordering = ['created_at']
 
 class FAQ(models.Model):
     """
@@ -189,6 +408,16 @@ class FAQ(models.Model):
         verbose_name = 'FAQ'
         verbose_name_plural = 'FAQ'
         ordering = ['order']
+        indexes = [
+            # Частичный индекс: SQLite сравнивает булево поле без "= 1",
+            # поэтому составной индекс (is_active, order) не использовался бы
+            models.Index(
+                fields=['order'],
+                condition=models.Q(is_active=True),
+                name='faq_active_order_idx'
+            ),
+            models.Index(fields=['question'], name='faq_question_idx'),
+        ]
 
 class DataImportTemplate(models.Model):
     """
@@ -272,6 +501,9 @@ class DataImportLog(models.Model):
         verbose_name = 'Лог импорта'
         verbose_name_plural = 'Логи импорта'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='importlog_user_created_idx'),
+        ]
 
 class DataValidationRule(models.Model):
     """
@@ -308,4 +540,162 @@ class DataValidationRule(models.Model):
     
     class Meta:
         verbose_name = 'Правило валидации'
-        verbose_name_plural = 'Правила валидации'
\ No newline at end of file
+        verbose_name_plural = 'Правила валидации'
+
+
+class BulkEditJournal(models.Model):
+    """
+    Журнал массовых правок для их отмены.
+    
+    Прежние значения хранятся сгруппированными по значению:
+    [[значение, [id, ...]], ...], поэтому правка тысяч записей, у которых
+    было несколько различных значений, занимает несколько элементов JSON.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='bulk_edits',
+        verbose_name='Пользователь'
+    )
+    model_type = models.CharField(
+        max_length=50,
+        choices=[
+            ('mineral_type', 'Тип полезного ископаемого'),
+            ('stage', 'Этап'),
+            ('work', 'Работа'),
+            ('question', 'Вопрос'),
+            ('faq', 'FAQ'),
+        ],
+        verbose_name='Тип данных'
+    )
+    field_name = models.CharField(max_length=100, verbose_name='Поле')
+    new_value = models.JSONField(null=True, encoder=DjangoJSONEncoder, verbose_name='Новое значение')
+    old_values = models.JSONField(default=list, encoder=DjangoJSONEncoder, verbose_name='Прежние значения')
+    row_count = models.IntegerField(default=0, verbose_name='Изменено записей')
+    created_at = models.DateTimeField(auto_now_add=True)
+    undone_at = models.DateTimeField(null=True, blank=True, verbose_name='Отменено')
+    
+    def __str__(self):
+        return f"{self.get_model_type_display()}.{self.field_name} - {self.row_count} - {self.created_at}"
+    
+    class Meta:
+        verbose_name = 'Массовая правка'
+        verbose_name_plural = 'Журнал массовых правок'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='bulkedit_user_created_idx'),
+        ]
+
+class DataVersion(models.Model):
+    """
+    Версия справочника (типы ПИ, этапы, работы, вопросы).
+    
+    Номер версии — id: счетчик растет монотонно, записи только
+    добавляются. Изменения строк хранятся в ChangeRecord.
+    """
+    source = models.CharField(
+        max_length=20,
+        choices=[
+            ('baseline', 'Исходное состояние'),
+            ('save', 'Сохранение записи'),
+            ('delete', 'Удаление записи'),
+            ('links', 'Изменение связей'),
+            ('bulk', 'Пакетное изменение'),
+            ('restore', 'Восстановление из корзины'),
+            ('import', 'Импорт из файла'),
+        ],
+        verbose_name='Источник'
+    )
+    change_count = models.IntegerField(default=0, verbose_name='Изменено записей')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"v{self.id} - {self.get_source_display()} - {self.created_at}"
+    
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочника'
+        ordering = ['-id']
+
+class ChangeRecord(models.Model):
+    """
+    Состояние строки справочника после изменения в версии.
+    
+    data — значения полей строки (связи многие-ко-многим — списками id)
+    или None, если строка удалена.
+    """
+    version = models.ForeignKey(
+        DataVersion,
+        on_delete=models.CASCADE,
+        related_name='changes',
+        verbose_name='Версия'
+    )
+    model_type = models.CharField(
+        max_length=20,
+        choices=[
+            ('mineral_type', 'Тип полезного ископаемого'),
+            ('stage', 'Этап'),
+            ('work', 'Работа'),
+            ('question', 'Вопрос'),
+        ],
+        verbose_name='Тип данных'
+    )
+    object_id = models.IntegerField(verbose_name='ID записи')
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder, verbose_name='Состояние записи')
+    
+    def __str__(self):
+        return f"v{self.version_id} - {self.get_model_type_display()} #{self.object_id}"
+    
+    class Meta:
+        verbose_name = 'Изменение справочника'
+        verbose_name_plural = 'Изменения справочника'
+        indexes = [
+            models.Index(fields=['model_type', 'object_id', 'version'], name='change_row_version_idx'),
+        ]
+
+class TrashEntry(models.Model):
+    """
+    Корзина: удаленная запись вместе с каскадом.
+    
+    payload — строки всех удаленных таблиц, удаленные связи
+    многие-ко-многим и очищенные ссылки SET_NULL (см. deletion),
+    по которым запись восстанавливается с прежними id.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='trash_entries',
+        verbose_name='Кто удалил'
+    )
+    model_type = models.CharField(
+        max_length=20,
+        choices=[
+            ('mineral_type', 'Тип полезного ископаемого'),
+            ('stage', 'Этап'),
+            ('work', 'Работа'),
+            ('question', 'Вопрос'),
+            ('faq', 'FAQ'),
+            ('chart', 'Диаграмма'),
+        ],
+        verbose_name='Тип данных'
+    )
+    object_id = models.IntegerField(verbose_name='ID записи')
+    label = models.CharField(max_length=500, verbose_name='Запись')
+    impact = models.JSONField(default=list, verbose_name='Затронуто')
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Удаленные данные')
+    created_at = models.DateTimeField(auto_now_add=True)
+    restored_at = models.DateTimeField(null=True, blank=True, verbose_name='Восстановлено')
+    
+    def __str__(self):
+        return f"{self.get_model_type_display()}: {self.label} - {self.created_at}"
+    
+    class Meta:
+        verbose_name = 'Запись корзины'
+        verbose_name_plural = 'Корзина'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'model_type', '-created_at'], name='trash_user_type_created_idx'),
+            models.Index(fields=['-created_at'], name='trash_created_idx'),
+        ]
@@ -0,0 +1,122 @@
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder округляет время до миллисекунд, и строки из той же
+    # миллисекунды, что и граница страницы, пропускались бы: время — с микросекундами
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        parsed = parse_datetime(value.get('datetime') or '') if set(value) == {'datetime'} else None
+        if parsed is None:
+            raise ValueError('Некорректный курсор')
+        return parsed
+    return value
+
+
+def encode_cursor(values):
+    """
+    Кодирует значения ключа последней строки в непрозрачный курсор
+    """
+    raw = json.dumps([_encode_value(value) for value in values], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Декодирует курсор; при некорректном значении выбрасывает ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Некорректный курсор')
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Некорректный курсор')
+    return [_decode_value(value) for value in values]
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Разбирает размер страницы из GET-параметра, ограничивая его сверху
+    """
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('Размер страницы должен быть положительным')
+    return min(limit, maximum)
+
+
+def keyset_condition(ordering, values):
+    """
+    Строит условие «строго после» для составного ключа сортировки.
+
+    Для ключа (a, b, c) условие раскрывается в
+    a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+    что позволяет SQLite идти по составному индексу без OFFSET.
+    """
+    condition = Q()
+    equal_prefix = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+        equal_prefix &= Q(**{name: value})
+
+    return condition
+
+
+def _row_value(row, field):
+    name = field.lstrip('-')
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+def keyset_queryset(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Запрос страницы keyset-пагинации: limit + 1 строк после курсора
+    """
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        values = decode_cursor(cursor, len(ordering))
+        queryset = queryset.filter(keyset_condition(ordering, values))
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    return queryset[:limit + 1]
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Возвращает страницу (rows, next_cursor) для keyset-пагинации.
+
+    ordering должен однозначно упорядочивать строки, поэтому последним
+    полем в нем всегда идет первичный ключ. Для выборок через values()
+    поля сортировки должны входить в список выбираемых полей.
+    """
+    rows = list(keyset_queryset(queryset, ordering, cursor=cursor, limit=limit))
+    next_cursor = None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(_row_value(rows[-1], field) for field in ordering)
+
+    return rows, next_cursor
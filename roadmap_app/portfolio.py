@@ -0,0 +1,164 @@
+"""
+Портфель диаграмм: все проекты пользователя на общей временной шкале
+и загрузка исполнителей по месяцам.
+
+Диаграммы читаются одним запросом. Работы раскладываются в массивы
+NumPy, а загрузка считается без цикла по месяцам: в разностный массив
+через bincount заносятся +1 в месяц начала работы и -1 в месяц
+окончания, после чего cumsum по строкам дает число одновременных работ
+каждого исполнителя в каждом месяце. Ряды прореживаются до
+max_points точек (с сохранением пиков) и кэшируются до изменения
+диаграмм.
+"""
+import hashlib
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .exporters import add_months, iter_works, month_label, plan_start_date, work_span
+from .models import UserGanttChart
+
+PORTFOLIO_CACHE_TTL = getattr(settings, 'PORTFOLIO_CACHE_TTL', 300)
+PORTFOLIO_EXECUTOR_CAPACITY = getattr(settings, 'PORTFOLIO_EXECUTOR_CAPACITY', 2)
+PORTFOLIO_MAX_POINTS = 120
+PORTFOLIO_CHART_FIELDS = ('id', 'title', 'anchor_date', 'created_at', 'updated_at', 'chart_data')
+UNKNOWN_EXECUTOR = 'Не указан'
+
+
+def _month_number(day):
+    return day.year * 12 + day.month - 1
+
+
+def _downsample(series, step):
+    """
+    Максимум по окнам из step месяцев вдоль последней оси
+    """
+    if step == 1:
+        return series
+    width = series.shape[-1]
+    padded = math.ceil(width / step) * step
+    if padded != width:
+        pad = [(0, 0)] * (series.ndim - 1) + [(0, padded - width)]
+        series = np.pad(series, pad)
+    return series.reshape(*series.shape[:-1], padded // step, step).max(axis=-1)
+
+
+def executor_load(executors, starts, durations):
+    """
+    Загрузка по исполнителям: (имена, матрица исполнитель × месяц)
+    """
+    names, codes = np.unique(np.asarray(executors, dtype=object).astype(str), return_inverse=True)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = starts + np.asarray(durations, dtype=np.int64)
+    horizon = int(ends.max())
+    width = horizon + 1
+    size = len(names) * width
+
+    delta = (
+        np.bincount(codes * width + starts, minlength=size)
+        - np.bincount(codes * width + ends, minlength=size)
+    )
+    return names, delta.reshape(len(names), width).cumsum(axis=1)[:, :horizon]
+
+
+def build_portfolio(charts, capacity=PORTFOLIO_EXECUTOR_CAPACITY, max_points=PORTFOLIO_MAX_POINTS):
+    """
+    Сводка портфеля по списку диаграмм с загруженным chart_data
+    """
+    charts = list(charts)
+    if not charts:
+        return {'start': None, 'step_months': 1, 'labels': [], 'charts': [], 'executors': [], 'total': []}
+
+    anchors = [_month_number(plan_start_date(chart)) for chart in charts]
+    base = min(anchors)
+    base_date = plan_start_date(charts[anchors.index(base)])
+
+    timeline = []
+    executors, starts, durations = [], [], []
+    for chart, anchor in zip(charts, anchors):
+        offset = anchor - base
+        chart_data = chart.chart_data or {}
+        timeline.append({
+            'id': chart.id,
+            'title': chart.title,
+            'start': offset,
+            'duration': int(chart_data.get('total_duration') or 0),
+            'stages': [
+                {
+                    'name': stage.get('name'),
+                    'start': offset + (stage.get('start') or 0),
+                    'duration': stage.get('duration') or 0,
+                    'color': stage.get('color'),
+                }
+                for stage in chart_data.get('stages') or []
+            ],
+        })
+        for stage, work in iter_works(chart_data):
+            start, duration = work_span(stage, work)
+            executors.append((work.get('executor') or '').strip() or UNKNOWN_EXECUTOR)
+            starts.append(offset + max(start, 0))
+            durations.append(max(duration, 1))
+
+    horizon = max([item['start'] + item['duration'] for item in timeline] + [1])
+    if not executors:
+        names, load = np.array([], dtype=str), np.zeros((0, horizon), dtype=np.int64)
+    else:
+        names, load = executor_load(executors, starts, durations)
+        if load.shape[1] < horizon:
+            load = np.pad(load, [(0, 0), (0, horizon - load.shape[1])])
+        horizon = load.shape[1]
+
+    step = max(1, math.ceil(horizon / max_points))
+    sampled = _downsample(load, step)
+    peaks = load.max(axis=1)
+    overloaded = (load > capacity).sum(axis=1)
+
+    executor_rows = [
+        {
+            'name': str(name),
+            'peak': int(peak),
+            'overloaded_months': int(months),
+            'series': row.tolist(),
+        }
+        for name, peak, months, row in zip(names, peaks, overloaded, sampled)
+    ]
+    executor_rows.sort(key=lambda row: (-row['peak'], -row['overloaded_months'], row['name']))
+
+    return {
+        'start': base_date.isoformat(),
+        'end': add_months(base_date, horizon).isoformat(),
+        'step_months': step,
+        'capacity': capacity,
+        'labels': [month_label(base_date, index * step) for index in range(sampled.shape[1])],
+        'charts': timeline,
+        'executors': executor_rows,
+        'total': _downsample(load.sum(axis=0), step).tolist(),
+    }
+
+
+def get_portfolio(user, chart_ids=None, capacity=PORTFOLIO_EXECUTOR_CAPACITY, max_points=PORTFOLIO_MAX_POINTS):
+    """
+    Портфель пользователя из кэша. Ключ включает число диаграмм и время
+    последнего изменения, поэтому правка или удаление диаграммы сразу
+    дает новую сводку без явной инвалидации.
+    """
+    charts = UserGanttChart.objects.filter(user=user)
+    if chart_ids:
+        charts = charts.filter(id__in=chart_ids)
+
+    version = charts.aggregate(count=Count('id'), changed=Max('updated_at'))
+    selection = hashlib.md5(','.join(map(str, sorted(chart_ids or []))).encode()).hexdigest()
+    changed = version['changed'].timestamp() if version['changed'] else 0
+    key = f"roadmap_app:portfolio:{user.pk}:{version['count']}:{changed}:{selection}:{capacity}:{max_points}"
+
+    portfolio = cache.get(key)
+    if portfolio is None:
+        portfolio = build_portfolio(
+            charts.only(*PORTFOLIO_CHART_FIELDS).order_by('created_at', 'id'),
+            capacity=capacity, max_points=max_points,
+        )
+        cache.set(key, portfolio, PORTFOLIO_CACHE_TTL)
+    return portfolio
@@ -0,0 +1,555 @@
+"""
+Серверная отрисовка диаграммы Ганта в SVG, PDF и PNG.
+
+Разметка строится один раз в виде списка примитивов (прямоугольники,
+линии, подписи) и затем выводится одним из трех способов. Отрисовка
+детерминирована: одинаковые chart_data дают побайтно одинаковые файлы.
+
+Единица разметки — CSS-пиксель (1/96 дюйма), как в D3-представлении.
+"""
+import math
+import os
+import zlib
+from collections import namedtuple
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+
+# Цветовая схема этапов — та же, что в gantt_chart.html
+STAGE_COLORS = [
+    '#4285F4', '#34A853', '#FBBC05', '#EA4335', '#8B5CF6',
+    '#10B981', '#F59E0B', '#EF4444', '#6366F1', '#EC4899',
+]
+
+MARGIN_LEFT = 250
+MARGIN_RIGHT = 20
+MARGIN_TOP = 50
+MARGIN_BOTTOM = 60
+MIN_PLOT_WIDTH = 800
+MONTH_WIDTH = 16
+STAGE_HEADER_HEIGHT = 50
+ROW_HEIGHT = 35
+STAGE_GAP = 10
+
+TEXT_COLOR = '#212529'
+MUTED_COLOR = '#6c757d'
+BACKGROUND = '#ffffff'
+
+# Высота области строк на одной странице PDF
+PDF_PAGE_CONTENT_HEIGHT = 1800
+# Ограничение на размер PNG, чтобы большие диаграммы не съедали память
+MAX_PNG_PIXELS = 40_000_000
+
+# Шрифты с кириллицей, которые ищутся, если GANTT_EXPORT_FONT не задан
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/Library/Fonts/Arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+
+Rect = namedtuple('Rect', 'x y width height fill rx')
+Line = namedtuple('Line', 'x1 y1 x2 y2 stroke width')
+Text = namedtuple('Text', 'x y text size fill anchor bold')
+Frame = namedtuple('Frame', 'width height primitives')
+Row = namedtuple('Row', 'kind stage_index stage work')
+
+
+def find_font_path():
+    """
+    Путь к TrueType-шрифту для PDF/PNG или None
+    """
+    configured = getattr(settings, 'GANTT_EXPORT_FONT', None)
+    if configured:
+        return str(configured)
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _blend(color, opacity):
+    """
+    Смешивает цвет с белым фоном: экспорт не зависит от поддержки прозрачности
+    """
+    color = color.lstrip('#')
+    channels = [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+    blended = [round(255 - (255 - c) * opacity) for c in channels]
+    return '#' + ''.join(f'{c:02x}' for c in blended)
+
+
+def _truncate(text, max_width, size):
+    # Ширина символа оценивается как 0.55 кегля — этого хватает для обрезки подписей
+    max_chars = max(int(max_width / (size * 0.55)), 1)
+    return text if len(text) <= max_chars else text[:max_chars - 1] + '…'
+
+
+def _month_label(month):
+    if month == 0:
+        return 'Начало'
+    years, months = divmod(month, 12)
+    if years and not months:
+        return f'{years} год'
+    if years:
+        return f'{years}г {months}м'
+    return f'{months} мес'
+
+
+def total_months(chart_data):
+    """
+    Горизонт диаграммы: конец последней работы, округленный до квартала, минимум 12 месяцев
+    """
+    max_month = 0
+    for stage in chart_data.get('stages') or []:
+        max_month = max(max_month, (stage.get('start') or 0) + (stage.get('duration') or 0))
+        for work in stage.get('works') or []:
+            start = work.get('start_global') or 0
+            max_month = max(max_month, start + (work.get('duration_months') or 1))
+    return max(12, math.ceil(max_month / 3) * 3)
+
+
+def build_rows(chart_data):
+    rows = []
+    for stage_index, stage in enumerate(chart_data.get('stages') or []):
+        rows.append(Row('stage', stage_index, stage, None))
+        for work in stage.get('works') or []:
+            rows.append(Row('work', stage_index, stage, work))
+    return rows
+
+
+def _row_height(row, next_row):
+    if row.kind == 'stage':
+        return STAGE_HEADER_HEIGHT
+    # После последней работы этапа — отступ, как в D3-представлении
+    gap = STAGE_GAP if next_row is None or next_row.kind == 'stage' else 0
+    return ROW_HEIGHT + gap
+
+
+def paginate_rows(rows, max_height):
+    """
+    Делит строки на страницы; заголовок этапа не остается последним на странице
+    """
+    pages, current, height = [], [], 0
+    for index, row in enumerate(rows):
+        next_row = rows[index + 1] if index + 1 < len(rows) else None
+        row_height = _row_height(row, next_row)
+        if current and height + row_height > max_height:
+            if current[-1].kind == 'stage':
+                carried = current.pop()
+                pages.append(current)
+                current, height = [carried], STAGE_HEADER_HEIGHT
+            else:
+                pages.append(current)
+                current, height = [], 0
+        current.append(row)
+        height += row_height
+    if current or not pages:
+        pages.append(current)
+    return pages
+
+
+def layout_frame(chart_data, rows, title='', months=None):
+    """
+    Раскладывает строки диаграммы в кадр из примитивов
+    """
+    months = months or total_months(chart_data)
+    plot_width = max(MIN_PLOT_WIDTH, months * MONTH_WIDTH)
+    month_width = plot_width / months
+
+    rows_height = sum(
+        _row_height(row, rows[i + 1] if i + 1 < len(rows) else None)
+        for i, row in enumerate(rows)
+    )
+    plot_height = max(rows_height, 200)
+    width = MARGIN_LEFT + plot_width + MARGIN_RIGHT
+    height = MARGIN_TOP + plot_height + MARGIN_BOTTOM
+
+    def x(month):
+        return MARGIN_LEFT + month * month_width
+
+    primitives = [Rect(0, 0, width, height, BACKGROUND, 0)]
+
+    if title:
+        primitives.append(Text(10, 28, _truncate(title, width - 20, 16), 16, TEXT_COLOR, 'start', True))
+
+    # Сетка: годы, кварталы, месяцы
+    for month in range(months + 1):
+        if month % 12 == 0:
+            stroke, line_width = _blend('#000000', 0.18), 2
+        elif month % 3 == 0:
+            stroke, line_width = _blend('#000000', 0.10), 1.5
+        else:
+            stroke, line_width = _blend('#000000', 0.05), 1
+        primitives.append(Line(x(month), MARGIN_TOP, x(month), MARGIN_TOP + plot_height, stroke, line_width))
+
+    y = MARGIN_TOP
+    for index, row in enumerate(rows):
+        next_row = rows[index + 1] if index + 1 < len(rows) else None
+        stage = row.stage
+        color = STAGE_COLORS[row.stage_index % len(STAGE_COLORS)]
+
+        if row.kind == 'stage':
+            start = stage.get('start') or 0
+            duration = stage.get('duration') or 0
+            label = f"{stage.get('order', '')}. {stage.get('name', '')}"
+            if duration:
+                stage_x, stage_width = x(start), duration * month_width
+                primitives.append(Rect(stage_x, y, stage_width, STAGE_HEADER_HEIGHT, _blend(color, 0.12), 4))
+                primitives.append(Text(stage_x + stage_width - 8, y + 30, f'{duration} мес', 12, color, 'end', True))
+            primitives.append(Text(10, y + 30, _truncate(label, MARGIN_LEFT - 20, 12), 12, color, 'start', True))
+        else:
+            work = row.work
+            start = work.get('start_global') or 0
+            duration = work.get('duration_months') or 1
+            bar_x, bar_width = x(start), max(duration * month_width, 5)
+            bar_height = ROW_HEIGHT - 8
+            center = y + bar_height / 2 + 4
+
+            primitives.append(Rect(bar_x, y, bar_width, bar_height, color, 3))
+            if bar_width > 50:
+                primitives.append(Text(bar_x + bar_width / 2, center, f'{duration}м', 10, '#ffffff', 'middle', True))
+
+            label = f"{work.get('number', '')} {work.get('title', '')}".strip()
+            primitives.append(Text(10, center, _truncate(label, MARGIN_LEFT - 20, 10), 10, TEXT_COLOR, 'start', False))
+
+        y += _row_height(row, next_row)
+
+    # Ось времени
+    axis_y = MARGIN_TOP + plot_height
+    axis_color = _blend('#000000', 0.35)
+    primitives.append(Line(x(0), axis_y, x(months), axis_y, axis_color, 2))
+    for month in range(months + 1):
+        tick = 10 if month % 3 == 0 else 5
+        primitives.append(Line(x(month), axis_y, x(month), axis_y + tick, axis_color, 1))
+        if month % 3 == 0:
+            primitives.append(Text(x(month), axis_y + 25, _month_label(month), 9, MUTED_COLOR, 'middle', False))
+            primitives.append(Text(x(month), axis_y + 40, str(month), 9, MUTED_COLOR, 'middle', False))
+
+    return Frame(width, height, primitives)
+
+
+def layout_chart(chart_data, title=''):
+    return layout_frame(chart_data, build_rows(chart_data), title)
+
+
+# ---------------------------------------------------------------------------
+# SVG
+# ---------------------------------------------------------------------------
+
+def _num(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def _svg_elements(frame):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_num(frame.width)}" '
+        f'height="{_num(frame.height)}" viewBox="0 0 {_num(frame.width)} {_num(frame.height)}" '
+        'font-family="DejaVu Sans, Arial, sans-serif">\n'
+    )
+    for item in frame.primitives:
+        if isinstance(item, Rect):
+            rx = f' rx="{_num(item.rx)}"' if item.rx else ''
+            yield (f'<rect x="{_num(item.x)}" y="{_num(item.y)}" width="{_num(item.width)}" '
+                   f'height="{_num(item.height)}" fill="{item.fill}"{rx}/>\n')
+        elif isinstance(item, Line):
+            yield (f'<line x1="{_num(item.x1)}" y1="{_num(item.y1)}" x2="{_num(item.x2)}" '
+                   f'y2="{_num(item.y2)}" stroke="{item.stroke}" stroke-width="{_num(item.width)}"/>\n')
+        else:
+            weight = ' font-weight="bold"' if item.bold else ''
+            yield (f'<text x="{_num(item.x)}" y="{_num(item.y)}" font-size="{_num(item.size)}" '
+                   f'fill="{item.fill}" text-anchor={quoteattr(item.anchor)}{weight}>'
+                   f'{escape(item.text)}</text>\n')
+    yield '</svg>\n'
+
+
+def write_svg(chart_data, out, title=''):
+    """
+    Записывает диаграмму в SVG в бинарный поток out
+    """
+    for chunk in _svg_elements(layout_chart(chart_data, title)):
+        out.write(chunk.encode('utf-8'))
+
+
+# ---------------------------------------------------------------------------
+# PDF
+# ---------------------------------------------------------------------------
+
+PX_TO_PT = 0.75
+# Однобайтная кодировка дает 224 печатных кода на один экземпляр шрифта
+_CODES_PER_FONT = 224
+
+
+class _PdfFonts:
+    """
+    Кодирует текст для PDF.
+
+    Со встроенным TrueType-шрифтом символы получают однобайтные коды
+    по мере появления (имена глифов uniXXXX в /Differences); когда коды
+    заканчиваются, заводится следующий экземпляр того же шрифта.
+    Без шрифта используется стандартный Helvetica (только WinAnsi).
+    """
+
+    def __init__(self, font_path):
+        self.font_path = font_path
+        self.codes = {}
+        self._metrics = None
+        if font_path:
+            from PIL import ImageFont
+            self._metrics = ImageFont.truetype(font_path, 1000)
+
+    @property
+    def count(self):
+        if not self.font_path:
+            return 1
+        return max(1, math.ceil(len(self.codes) / _CODES_PER_FONT))
+
+    def width(self, text, size):
+        if self._metrics is None:
+            return len(text) * size * 0.5
+        return self._metrics.getlength(text) * size / 1000
+
+    def runs(self, text):
+        """
+        Делит текст на (номер_шрифта, байты) для операторов Tj
+        """
+        if not self.font_path:
+            return [(0, text.encode('cp1252', errors='replace'))]
+
+        runs = []
+        for char in text:
+            if char not in self.codes:
+                self.codes[char] = len(self.codes)
+            index = self.codes[char]
+            font, code = divmod(index, _CODES_PER_FONT)
+            byte = bytes([32 + code])
+            if runs and runs[-1][0] == font:
+                runs[-1] = (font, runs[-1][1] + byte)
+            else:
+                runs.append((font, byte))
+        return runs
+
+    def font_chars(self, font):
+        chars = sorted(self.codes, key=self.codes.get)
+        return chars[font * _CODES_PER_FONT:(font + 1) * _CODES_PER_FONT]
+
+
+class _PdfWriter:
+    def __init__(self, out):
+        self.out = out
+        self.position = 0
+        self.offsets = {}
+        self.next_number = 1
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def write(self, data):
+        self.out.write(data)
+        self.position += len(data)
+
+    def object(self, number, body):
+        self.offsets[number] = self.position
+        self.write(f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n')
+
+    def stream(self, number, data, extra=b''):
+        compressed = zlib.compress(data, 6)
+        header = b'<< /Length %d /Filter /FlateDecode %s>>\nstream\n' % (len(compressed), extra)
+        self.object(number, header + compressed + b'\nendstream')
+
+    def finish(self, root):
+        xref_position = self.position
+        count = self.next_number
+        lines = [f'xref\n0 {count}\n0000000000 65535 f \n']
+        for number in range(1, count):
+            lines.append(f'{self.offsets[number]:010d} 00000 n \n')
+        lines.append(f'trailer\n<< /Size {count} /Root {root} 0 R >>\nstartxref\n{xref_position}\n%%EOF\n')
+        self.write(''.join(lines).encode('ascii'))
+
+
+def _pdf_color(color):
+    color = color.lstrip('#')
+    return ' '.join(_num(int(color[i:i + 2], 16) / 255) for i in (0, 2, 4))
+
+
+def _pdf_content(frame, fonts):
+    ops = [f'{PX_TO_PT} 0 0 -{PX_TO_PT} 0 {_num(frame.height * PX_TO_PT)} cm']
+    for item in frame.primitives:
+        if isinstance(item, Rect):
+            ops.append(f'{_pdf_color(item.fill)} rg {_num(item.x)} {_num(item.y)} '
+                       f'{_num(item.width)} {_num(item.height)} re f')
+        elif isinstance(item, Line):
+            ops.append(f'{_pdf_color(item.stroke)} RG {_num(item.width)} w {_num(item.x1)} {_num(item.y1)} m '
+                       f'{_num(item.x2)} {_num(item.y2)} l S')
+        else:
+            x = item.x
+            if item.anchor != 'start':
+                text_width = fonts.width(item.text, item.size)
+                x -= text_width / 2 if item.anchor == 'middle' else text_width
+            ops.append(f'BT {_pdf_color(item.fill)} rg 1 0 0 -1 {_num(x)} {_num(item.y)} Tm')
+            for font, data in fonts.runs(item.text):
+                ops.append(f'/F{font} {_num(item.size)} Tf <{data.hex()}> Tj')
+            ops.append('ET')
+    return '\n'.join(ops).encode('ascii')
+
+
+def _to_unicode_cmap(chars):
+    mappings = ''.join(f'<{32 + code:02x}> <{ord(char):04x}>\n' for code, char in enumerate(chars))
+    return (
+        '/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n'
+        '/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n'
+        '1 begincodespacerange <00> <ff> endcodespacerange\n'
+        f'{len(chars)} beginbfchar\n{mappings}endbfchar\n'
+        'endcmap CMapName currentdict /CMap defineresource pop end end\n'
+    ).encode('ascii')
+
+
+def _write_pdf_fonts(writer, fonts):
+    """
+    Записывает объекты шрифтов и возвращает их номера
+    """
+    if not fonts.font_path:
+        number = writer.reserve()
+        writer.object(number, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                              b'/Encoding /WinAnsiEncoding >>')
+        return [number]
+
+    with open(fonts.font_path, 'rb') as f:
+        font_file = f.read()
+    file_number = writer.reserve()
+    writer.stream(file_number, font_file, b'/Length1 %d ' % len(font_file))
+
+    ascent, descent = fonts._metrics.getmetrics()
+    descriptor_number = writer.reserve()
+    writer.object(descriptor_number, (
+        f'<< /Type /FontDescriptor /FontName /GanttSans /Flags 32 '
+        f'/FontBBox [-1000 -{descent} 2000 {ascent}] /ItalicAngle 0 '
+        f'/Ascent {ascent} /Descent -{descent} /CapHeight {ascent} /StemV 80 '
+        f'/FontFile2 {file_number} 0 R >>'
+    ).encode('ascii'))
+
+    numbers = []
+    for font in range(fonts.count):
+        chars = fonts.font_chars(font) or [' ']
+        names = ' '.join(f'/uni{ord(char):04X}' for char in chars)
+        widths = ' '.join(_num(fonts._metrics.getlength(char)) for char in chars)
+
+        cmap_number = writer.reserve()
+        writer.stream(cmap_number, _to_unicode_cmap(chars))
+
+        number = writer.reserve()
+        writer.object(number, (
+            f'<< /Type /Font /Subtype /TrueType /BaseFont /GanttSans '
+            f'/FirstChar 32 /LastChar {31 + len(chars)} /Widths [{widths}] '
+            f'/Encoding << /Type /Encoding /Differences [32 {names}] >> '
+            f'/FontDescriptor {descriptor_number} 0 R /ToUnicode {cmap_number} 0 R >>'
+        ).encode('ascii'))
+        numbers.append(number)
+    return numbers
+
+
+def write_pdf(chart_data, out, title=''):
+    """
+    Записывает диаграмму в векторный PDF; длинные диаграммы делятся на страницы
+    """
+    fonts = _PdfFonts(find_font_path())
+    writer = _PdfWriter(out)
+    catalog, pages_number, resources = writer.reserve(), writer.reserve(), writer.reserve()
+
+    writer.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    months = total_months(chart_data)
+    pages = paginate_rows(build_rows(chart_data), PDF_PAGE_CONTENT_HEIGHT)
+    page_numbers = []
+
+    for index, rows in enumerate(pages, start=1):
+        page_title = title if len(pages) == 1 else f'{title} ({index}/{len(pages)})'
+        frame = layout_frame(chart_data, rows, page_title, months)
+
+        content_number = writer.reserve()
+        writer.stream(content_number, _pdf_content(frame, fonts))
+
+        page_number = writer.reserve()
+        writer.object(page_number, (
+            f'<< /Type /Page /Parent {pages_number} 0 R '
+            f'/MediaBox [0 0 {_num(frame.width * PX_TO_PT)} {_num(frame.height * PX_TO_PT)}] '
+            f'/Resources {resources} 0 R /Contents {content_number} 0 R >>'
+        ).encode('ascii'))
+        page_numbers.append(page_number)
+
+    font_numbers = _write_pdf_fonts(writer, fonts)
+    font_refs = ' '.join(f'/F{i} {number} 0 R' for i, number in enumerate(font_numbers))
+    writer.object(resources, f'<< /Font << {font_refs} >> >>'.encode('ascii'))
+
+    kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+    writer.object(pages_number, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode('ascii'))
+    writer.object(catalog, f'<< /Type /Catalog /Pages {pages_number} 0 R >>'.encode('ascii'))
+    writer.finish(catalog)
+
+
+# ---------------------------------------------------------------------------
+# PNG
+# ---------------------------------------------------------------------------
+
+def write_png(chart_data, out, title='', dpi=150):
+    """
+    Растеризует диаграмму в PNG с заданным разрешением.
+
+    Если при таком разрешении изображение превышает MAX_PNG_PIXELS,
+    масштаб уменьшается, а в файл записывается фактическое разрешение.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    frame = layout_chart(chart_data, title)
+    scale = dpi / 96
+    pixels = frame.width * frame.height * scale * scale
+    if pixels > MAX_PNG_PIXELS:
+        scale *= math.sqrt(MAX_PNG_PIXELS / pixels)
+        dpi = round(scale * 96)
+
+    font_path = find_font_path()
+    font_cache = {}
+
+    def font(size):
+        pixel_size = max(int(round(size * scale)), 1)
+        if pixel_size not in font_cache:
+            if font_path:
+                font_cache[pixel_size] = ImageFont.truetype(
+                    font_path, pixel_size, layout_engine=ImageFont.Layout.BASIC
+                )
+            else:
+                font_cache[pixel_size] = ImageFont.load_default(pixel_size)
+        return font_cache[pixel_size]
+
+    image = Image.new('RGB', (max(int(frame.width * scale), 1), max(int(frame.height * scale), 1)), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    anchors = {'start': 'ls', 'middle': 'ms', 'end': 'rs'}
+
+    for item in frame.primitives:
+        if isinstance(item, Rect):
+            box = [item.x * scale, item.y * scale,
+                   (item.x + item.width) * scale, (item.y + item.height) * scale]
+            if item.rx:
+                draw.rounded_rectangle(box, radius=item.rx * scale, fill=item.fill)
+            else:
+                draw.rectangle(box, fill=item.fill)
+        elif isinstance(item, Line):
+            draw.line([item.x1 * scale, item.y1 * scale, item.x2 * scale, item.y2 * scale],
+                      fill=item.stroke, width=max(int(round(item.width * scale)), 1))
+        else:
+            draw.text((item.x * scale, item.y * scale), item.text, fill=item.fill,
+                      font=font(item.size), anchor=anchors[item.anchor])
+
+    image.save(out, 'PNG', dpi=(dpi, dpi))
+
+
+RENDERERS = {
+    'svg': (write_svg, 'image/svg+xml'),
+    'pdf': (write_pdf, 'application/pdf'),
+    'png': (write_png, 'image/png'),
+}
@@ -0,0 +1,297 @@
+"""
+Анализ рисков сроков диаграммы методом Монте-Карло.
+
+Длительности этапов и работ задаются тройкой «минимум / наиболее
+вероятная / максимум» и разыгрываются по PERT (бета-распределение)
+или треугольному распределению. Все итерации пакета считаются разом:
+длительности — матрица итерации × узлы, окончание каждого этапа —
+векторная операция над столбцами, поэтому цикл Python идет только по
+этапам, а не по итерациям.
+
+Структура сети как в prepare_chart_data: этап начинается после
+окончания предыдущего этапа и своих зависимостей, длительность этапа —
+максимум из собственной длительности и окончаний его работ.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .artifacts import chart_version
+from .exporters import add_months, plan_start_date
+from .models import Stage, Work
+from .versioning import current_version
+
+RISK_DEFAULT_ITERATIONS = 10_000
+RISK_MAX_ITERATIONS = 200_000
+RISK_PERCENTILES = (50, 80, 95)
+RISK_HISTOGRAM_BINS = 30
+RISK_CACHE_TTL = getattr(settings, 'RISK_CACHE_TTL', 3600)
+RISK_SIMULATION_WORKERS = getattr(settings, 'RISK_SIMULATION_WORKERS', 1)
+# Диапазон по умолчанию, если у этапа или работы не заданы min/max: доли от наиболее вероятной
+RISK_DEFAULT_RANGE = getattr(settings, 'RISK_DEFAULT_RANGE', (0.9, 1.3))
+# Ограничение размера матрицы длительностей одного пакета (элементов)
+BATCH_CELLS = 4_000_000
+DISTRIBUTIONS = ('pert', 'triangular')
+BETA_GRID = np.linspace(0.0, 1.0, 8193)
+BETA_TABLE_SIZE = 4097
+
+
+def _triple(likely, reference=None):
+    """
+    Оценка (минимум, наиболее вероятная, максимум) вокруг likely из chart_data:
+    диапазон справочника (reference) переносится пропорционально, без него —
+    доли RISK_DEFAULT_RANGE
+    """
+    likely = float(likely or 0)
+    low_share, high_share = RISK_DEFAULT_RANGE
+    if reference and reference['duration_months']:
+        base = float(reference['duration_months'])
+        if reference['duration_min_months'] is not None:
+            low_share = reference['duration_min_months'] / base
+        if reference['duration_max_months'] is not None:
+            high_share = reference['duration_max_months'] / base
+    return min(likely * low_share, likely), likely, max(likely * high_share, likely)
+
+
+def build_model(chart_data):
+    """
+    Сеть для симуляции: массивы оценок длительностей и индексы предшественников.
+
+    Наиболее вероятные длительности — из chart_data (с правками пользователя,
+    вариантов и выравнивания); минимум и максимум справочника (двумя запросами
+    по id этапов и работ) масштабируются вокруг них пропорционально.
+    """
+    stages = chart_data.get('stages') or []
+    stage_ids = [stage.get('id') for stage in stages]
+    work_ids = [work.get('id') for stage in stages for work in stage.get('works') or []]
+
+    stage_ranges = {
+        row['id']: row for row in Stage.objects.filter(id__in=stage_ids).values(
+            'id', 'duration_months', 'duration_min_months', 'duration_max_months'
+        )
+    }
+    work_ranges = {
+        row['id']: row for row in Work.objects.filter(id__in=work_ids).values(
+            'id', 'duration_months', 'duration_min_months', 'duration_max_months'
+        )
+    }
+
+    position = {stage_id: index for index, stage_id in enumerate(stage_ids)}
+    stage_estimates, predecessors = [], []
+    work_estimates, work_offsets, work_stage = [], [], []
+
+    for index, stage in enumerate(stages):
+        row = stage_ranges.get(stage.get('id'))
+        if 'base_duration' in stage:
+            likely = stage['base_duration']
+        elif row:
+            likely = row['duration_months']
+        else:
+            likely = 0 if stage.get('works') else stage.get('duration')
+        stage_estimates.append(_triple(likely, row))
+
+        previous = [index - 1] if index else []
+        dependencies = [position[dep] for dep in stage.get('dependencies') or [] if position.get(dep, index) < index]
+        predecessors.append(sorted(set(previous + dependencies)))
+
+        for work in stage.get('works') or []:
+            work_estimates.append(_triple(work.get('duration_months') or 1, work_ranges.get(work.get('id'))))
+            work_offsets.append(work.get('start_month') or 0)
+            work_stage.append(index)
+
+    return {
+        'stage_estimates': np.array(stage_estimates, dtype=float).reshape(-1, 3),
+        'work_estimates': np.array(work_estimates, dtype=float).reshape(-1, 3),
+        'work_offsets': np.array(work_offsets, dtype=float),
+        'work_stage': np.array(work_stage, dtype=np.int64),
+        'predecessors': predecessors,
+    }
+
+
+def _beta_fraction(rng, alpha, beta, size):
+    """
+    Выборка Beta(alpha, beta) методом обратной функции распределения.
+
+    Квантильная функция табулируется на равномерной сетке один раз для
+    каждой различной пары параметров (у оценок по умолчанию она общая),
+    после чего выборка — равномерные числа и линейная интерполяция по
+    прямому индексу: в разы быстрее rng.beta, а точность таблицы заведомо
+    выше точности самих оценок.
+    """
+    params, inverse = np.unique(np.column_stack([alpha, beta]).round(6), axis=0, return_inverse=True)
+    tables = np.stack([_beta_quantiles(a, b) for a, b in params])[inverse.ravel()]
+
+    position = rng.random((len(alpha), size)) * (BETA_TABLE_SIZE - 1)
+    index = position.astype(np.intp)
+    weight = position - index
+    lower = np.take_along_axis(tables, index, axis=1)
+    upper = np.take_along_axis(tables, index + 1, axis=1)
+    return lower + (upper - lower) * weight
+
+
+def _beta_quantiles(a, b):
+    # В PERT оба параметра не меньше 1, поэтому плотность на сетке конечна
+    density = BETA_GRID ** (a - 1) * (1 - BETA_GRID) ** (b - 1)
+    cdf = np.concatenate([[0.0], np.cumsum((density[1:] + density[:-1]) / 2)])
+    return np.interp(np.linspace(0.0, 1.0, BETA_TABLE_SIZE), cdf / cdf[-1], BETA_GRID)
+
+
+def sample_durations(rng, estimates, size, distribution='pert'):
+    """
+    Матрица len(estimates) × size длительностей по оценкам (min, likely, max):
+    строка — узел, столбец — итерация
+    """
+    low, likely, high = (estimates[:, k:k + 1] for k in range(3))
+    spread = high - low
+    fixed = spread <= 0
+    safe_spread = np.where(fixed, 1.0, spread)
+
+    if distribution == 'triangular':
+        # Обратная функция распределения треугольного закона
+        mode = np.where(fixed, 0.5, (likely - low) / safe_spread)
+        u = rng.random((len(estimates), size))
+        fraction = np.where(u < mode, np.sqrt(u * mode), 1 - np.sqrt((1 - u) * (1 - mode)))
+    else:
+        alpha = np.where(fixed, 1.0, 1 + 4 * (likely - low) / safe_spread)
+        beta = np.where(fixed, 1.0, 1 + 4 * (high - likely) / safe_spread)
+        fraction = _beta_fraction(rng, alpha[:, 0], beta[:, 0], size)
+
+    return np.where(fixed, likely, low + fraction * spread)
+
+
+def simulate_batch(model, iterations, seed, distribution='pert'):
+    """
+    Одна серия итераций: окончания проекта и число итераций,
+    в которых каждый этап лежал на критическом пути
+    """
+    rng = np.random.default_rng(seed)
+    stage_count = len(model['predecessors'])
+    totals = []
+    critical_counts = np.zeros(stage_count, dtype=np.int64)
+    per_batch = max(1, BATCH_CELLS // max(1, stage_count + len(model['work_offsets'])))
+
+    # Работы идут в chart_data подряд по этапам: начало каждой группы и ее этап
+    work_stage = model['work_stage']
+    groups = np.flatnonzero(np.diff(work_stage, prepend=-1)) if len(work_stage) else np.empty(0, dtype=np.int64)
+    group_stage = work_stage[groups]
+    work_offsets = model['work_offsets'][:, None]
+    predecessors = [np.asarray(preds, dtype=np.int64) for preds in model['predecessors']]
+
+    for offset in range(0, iterations, per_batch):
+        size = min(per_batch, iterations - offset)
+        columns = np.arange(size)
+        length = sample_durations(rng, model['stage_estimates'], size, distribution)
+
+        # Длительность этапа — не меньше окончания любой его работы
+        if len(groups):
+            work_end = work_offsets + sample_durations(rng, model['work_estimates'], size, distribution)
+            length[group_stage] = np.maximum(length[group_stage], np.maximum.reduceat(work_end, groups, axis=0))
+
+        finish = np.empty((stage_count, size))
+        driver = np.full((stage_count, size), -1, dtype=np.int64)
+        for row, preds in enumerate(predecessors):
+            if len(preds) == 1:
+                driver[row] = preds[0]
+                finish[row] = finish[preds[0]] + length[row]
+            elif len(preds):
+                pred_finish = finish[preds]
+                choice = pred_finish.argmax(axis=0)
+                driver[row] = preds[choice]
+                finish[row] = pred_finish[choice, columns] + length[row]
+            else:
+                finish[row] = length[row]
+
+        if not stage_count:
+            totals.append(np.zeros(size))
+            continue
+
+        # Критический путь — цепочка определяющих предшественников от этапа, закончившегося последним
+        on_path = np.zeros((stage_count, size), dtype=bool)
+        on_path[finish.argmax(axis=0), columns] = True
+        for row in range(stage_count - 1, -1, -1):
+            active = np.flatnonzero(on_path[row] & (driver[row] >= 0))
+            on_path[driver[row, active], active] = True
+        critical_counts += on_path.sum(axis=1)
+        totals.append(finish.max(axis=0))
+
+    return (np.concatenate(totals) if totals else np.empty(0)), critical_counts
+
+
+def _months_to_date(start_date, months):
+    whole = int(math.floor(months))
+    month_start = add_months(start_date, whole)
+    days = (add_months(start_date, whole + 1) - month_start).days
+    return month_start + timedelta(days=round((months - whole) * days))
+
+
+def run_simulation(chart_data, iterations=RISK_DEFAULT_ITERATIONS, seed=0,
+                   distribution='pert', workers=RISK_SIMULATION_WORKERS, start_date=None):
+    """
+    Симуляция сроков: перцентили окончания, гистограмма и индексы критичности этапов.
+
+    При workers > 1 итерации делятся между процессами; каждый процесс
+    получает свой независимый поток случайных чисел от общего seed,
+    поэтому результат воспроизводим при одинаковом числе процессов.
+    """
+    model = build_model(chart_data)
+    stages = chart_data.get('stages') or []
+
+    if workers > 1 and iterations >= workers * 1000:
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        shares = [iterations // workers + (index < iterations % workers) for index in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_batch, [model] * workers, shares, seeds, [distribution] * workers))
+        totals = np.concatenate([result[0] for result in results])
+        critical_counts = sum(result[1] for result in results)
+    else:
+        totals, critical_counts = simulate_batch(model, iterations, np.random.SeedSequence(seed), distribution)
+
+    percentiles = np.percentile(totals, RISK_PERCENTILES) if len(totals) else np.zeros(len(RISK_PERCENTILES))
+    counts, edges = np.histogram(totals, bins=RISK_HISTOGRAM_BINS)
+
+    result = {
+        'iterations': iterations,
+        'distribution': distribution,
+        'deterministic_months': chart_data.get('total_duration') or 0,
+        'mean_months': round(float(totals.mean()), 2) if len(totals) else 0,
+        'percentiles': {
+            f'p{level}': {'months': round(float(value), 2)}
+            for level, value in zip(RISK_PERCENTILES, percentiles)
+        },
+        'histogram': {'counts': counts.tolist(), 'edges': [round(float(edge), 2) for edge in edges]},
+        'stages': [
+            {
+                'id': stage.get('id'),
+                'name': stage.get('name'),
+                'criticality': round(float(count) / iterations, 4) if iterations else 0,
+            }
+            for stage, count in zip(stages, critical_counts)
+        ],
+    }
+    if start_date is not None:
+        for entry in result['percentiles'].values():
+            entry['date'] = _months_to_date(start_date, entry['months']).isoformat()
+    return result
+
+
+def get_chart_risk(chart, iterations=RISK_DEFAULT_ITERATIONS, distribution='pert', seed=0):
+    """
+    Результат симуляции из кэша; ключ включает версии диаграммы и справочника
+    (оценки длительностей берутся из справочника)
+    """
+    key = (
+        f'roadmap_app:risk:{chart.id}:{chart_version(chart)}:{current_version()}:'
+        f'{iterations}:{distribution}:{seed}'
+    )
+    result = cache.get(key)
+    if result is None:
+        result = run_simulation(
+            chart.chart_data or {}, iterations=iterations, seed=seed,
+            distribution=distribution, start_date=plan_start_date(chart),
+        )
+        cache.set(key, result, RISK_CACHE_TTL)
+    return result
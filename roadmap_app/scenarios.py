@@ -0,0 +1,231 @@
+"""
+Варианты диаграмм «что если».
+
+Вариант хранит только отличия от базовой диаграммы:
+
+    {
+        'question': 12,                         # другой целевой вопрос (None — без вопроса)
+        'durations': {'stages': {'3': 8}, 'works': {'41': 2}},
+        'removed_works': [17, 18],
+    }
+
+Расписание варианта строится из chart_data базовой диаграммы копированием
+при записи: этапы до первого измененного остаются общими с базой,
+копируются и пересчитываются только этапы начиная с него. Полная
+перестройка через prepare_chart_data нужна лишь при смене вопроса.
+"""
+from django.core.cache import cache
+
+from .artifacts import chart_version
+from .models import Question
+from .scheduling import level_resources, missing_base_durations, prepare_chart_data, schedule_stages
+from .versioning import current_version
+
+SCENARIO_CACHE_TTL = 3600
+DELTA_KEYS = ('question', 'durations', 'removed_works')
+
+
+def _positive_ids(values, label):
+    try:
+        ids = sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        raise ValueError(f'{label}: ожидается список идентификаторов')
+    if any(value < 1 for value in ids):
+        raise ValueError(f'{label}: идентификаторы должны быть положительными')
+    return ids
+
+
+def _duration_map(values, label, minimum):
+    if not isinstance(values, dict):
+        raise ValueError(f'{label}: ожидается объект {{id: длительность}}')
+    result = {}
+    for key, value in values.items():
+        try:
+            key, value = int(key), int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{label}: некорректная пара {key}: {value}')
+        if value < minimum:
+            raise ValueError(f'{label}: длительность должна быть не меньше {minimum}')
+        result[str(key)] = value
+    return result
+
+
+def normalize_delta(delta):
+    """
+    Проверяет и приводит отличия варианта к каноническому виду; ошибки — ValueError
+    """
+    if not isinstance(delta, dict):
+        raise ValueError('Отличия варианта должны быть объектом')
+    unknown = set(delta) - set(DELTA_KEYS)
+    if unknown:
+        raise ValueError(f'Неизвестные ключи: {", ".join(sorted(unknown))}')
+
+    normalized = {}
+    if 'question' in delta:
+        question = delta['question']
+        normalized['question'] = _positive_ids([question], 'question')[0] if question is not None else None
+
+    durations = delta.get('durations') or {}
+    if not isinstance(durations, dict) or set(durations) - {'stages', 'works'}:
+        raise ValueError('durations: ожидаются ключи stages и works')
+    stage_durations = _duration_map(durations.get('stages') or {}, 'durations.stages', 0)
+    work_durations = _duration_map(durations.get('works') or {}, 'durations.works', 1)
+    if stage_durations or work_durations:
+        normalized['durations'] = {'stages': stage_durations, 'works': work_durations}
+
+    removed = _positive_ids(delta.get('removed_works') or [], 'removed_works')
+    if removed:
+        normalized['removed_works'] = removed
+    return normalized
+
+
+def apply_delta(base, delta):
+    """
+    Возвращает chart_data варианта; base не изменяется
+    """
+    durations = delta.get('durations') or {}
+    stage_durations = {int(key): value for key, value in (durations.get('stages') or {}).items()}
+    work_durations = {int(key): value for key, value in (durations.get('works') or {}).items()}
+    removed = set(delta.get('removed_works') or [])
+    leveling = base.get('leveling')
+
+    stages = list(base.get('stages') or [])
+    touched = [
+        index for index, stage in enumerate(stages)
+        if stage['id'] in stage_durations
+        or any(work['id'] in work_durations or work['id'] in removed for work in stage.get('works') or [])
+    ]
+    # Выравнивание загрузки пересчитывает всю диаграмму, поэтому копируется все
+    first = 0 if leveling else min(touched, default=len(stages))
+
+    result = dict(base)
+    result['stages'] = stages
+    if first == len(stages) and not leveling:
+        return result
+
+    own_durations = missing_base_durations(stages[first:])
+    for index in range(first, len(stages)):
+        stage = dict(stages[index])
+        stage['works'] = [dict(work) for work in stage.get('works') or [] if work['id'] not in removed]
+        for work in stage['works']:
+            if work['id'] in work_durations:
+                work['duration_months'] = work_durations[work['id']]
+        if 'base_duration' not in stage:
+            stage['base_duration'] = own_durations.get(stage['id'], stage.get('duration') or 0)
+        if stage['id'] in stage_durations:
+            stage['base_duration'] = stage_durations[stage['id']]
+        stages[index] = stage
+
+    result['total_duration'] = schedule_stages(stages, first)
+    if leveling:
+        level_resources(result, default_capacity=leveling['default_capacity'], capacities=leveling['capacities'])
+    return result
+
+
+def scenario_chart_data(chart, delta):
+    """
+    Расписание варианта: база — chart_data диаграммы или, при смене вопроса,
+    заново построенная диаграмма с тем же типом ПИ и начальным этапом
+    """
+    base = chart.chart_data or {}
+    base_question = (base.get('question') or {}).get('id')
+
+    if 'question' in delta and delta['question'] != base_question:
+        if chart.mineral_type_id is None or chart.start_stage_id is None:
+            raise ValueError('У базовой диаграммы не задан тип ПИ или начальный этап')
+        question = None
+        if delta['question'] is not None:
+            question = Question.objects.filter(id=delta['question']).first()
+            if question is None:
+                raise ValueError('Вопрос не найден')
+        leveling = base.get('leveling')
+        base = prepare_chart_data(
+            chart.mineral_type, chart.start_stage, question,
+            leveling={
+                'default_capacity': leveling['default_capacity'],
+                'capacities': leveling['capacities'],
+            } if leveling else None
+        )
+
+    return apply_delta(base, delta)
+
+
+def get_scenario_chart_data(scenario):
+    """
+    Расписание варианта из кэша; ключ включает версии варианта, базовой
+    диаграммы и справочника (при смене вопроса диаграмма строится заново)
+    """
+    chart = scenario.chart
+    key = (
+        f'roadmap_app:scenario:{scenario.id}:{scenario.updated_at.timestamp()}:'
+        f'{chart_version(chart)}:{current_version()}'
+    )
+    chart_data = cache.get(key)
+    if chart_data is None:
+        chart_data = scenario_chart_data(chart, scenario.delta)
+        cache.set(key, chart_data, SCENARIO_CACHE_TTL)
+    return chart_data
+
+
+def diff_schedules(first, second):
+    """
+    Сравнение двух расписаний: сдвиги этапов и измененные, добавленные и исключенные работы
+    """
+    def index(chart_data):
+        stages = {stage['id']: stage for stage in chart_data.get('stages') or []}
+        works = {
+            work['id']: (stage['id'], work)
+            for stage in chart_data.get('stages') or [] for work in stage.get('works') or []
+        }
+        return stages, works
+
+    stages_a, works_a = index(first)
+    stages_b, works_b = index(second)
+    order = list(stages_b) + [stage_id for stage_id in stages_a if stage_id not in stages_b]
+
+    stages = []
+    for stage_id in order:
+        a, b = stages_a.get(stage_id), stages_b.get(stage_id)
+        entry = {'id': stage_id, 'name': (b or a).get('name')}
+        if a is None or b is None:
+            entry['status'] = 'added' if a is None else 'removed'
+            entry.update({
+                'start': [a and a['start'], b and b['start']],
+                'duration': [a and a['duration'], b and b['duration']],
+            })
+        elif a['start'] != b['start'] or a['duration'] != b['duration']:
+            entry.update({
+                'status': 'changed',
+                'start': [a['start'], b['start']],
+                'duration': [a['duration'], b['duration']],
+                'shift': b['start'] - a['start'],
+            })
+        else:
+            continue
+        stages.append(entry)
+
+    works = []
+    for work_id in list(works_b) + [work_id for work_id in works_a if work_id not in works_b]:
+        a, b = works_a.get(work_id, (None, None))[1], works_b.get(work_id, (None, None))[1]
+        stage_id = (works_b.get(work_id) or works_a.get(work_id))[0]
+        if a is not None and b is not None:
+            if a.get('start_global') == b.get('start_global') and a.get('duration_months') == b.get('duration_months'):
+                continue
+            status = 'changed'
+        else:
+            status = 'added' if a is None else 'removed'
+        works.append({
+            'id': work_id,
+            'stage_id': stage_id,
+            'title': (b or a).get('title'),
+            'status': status,
+            'start': [a and a.get('start_global'), b and b.get('start_global')],
+            'duration': [a and a.get('duration_months'), b and b.get('duration_months')],
+        })
+
+    total_a, total_b = first.get('total_duration') or 0, second.get('total_duration') or 0
+    return {
+        'total_duration': {'a': total_a, 'b': total_b, 'delta': total_b - total_a},
+        'stages': stages,
+        'works': works,
+    }
@@ -0,0 +1,623 @@
+"""
+Построение расписания диаграммы Ганта.
+
+prepare_chart_data собирает этапы и работы из справочника в chart_data,
+prepare_chart_data_as_of — из снимка справочника на прошлую версию.
+level_resources дополнительно выравнивает загрузку исполнителей:
+работы одного исполнителя, превышающие его допустимую загрузку,
+сдвигаются на ближайшие месяцы со свободной мощностью, не нарушая
+порядка этапов и их зависимостей.
+apply_schedule_changes правит сроки готовой диаграммы, пересчитывая
+только этапы ниже по графу, на которые правка действительно повлияла.
+"""
+import heapq
+
+from .models import Stage, Work
+from .versioning import current_version, load_rows, row_fields, snapshot
+
+DEFAULT_EXECUTOR_CAPACITY = 1
+
+
+def chart_stages(mineral_type):
+    return Stage.objects.filter(mineral_type=mineral_type)
+
+
+def chart_works(stage_ids):
+    return Work.objects.filter(stage_id__in=stage_ids).values(*row_fields(Work))
+
+
+def target_stage_ids(question, mineral_type):
+    """
+    Целевые этапы вопроса среди этапов типа ПИ
+    """
+    return question.target_stages.filter(mineral_type=mineral_type).values_list('id', flat=True)
+
+
+def prepare_chart_data(mineral_type, start_stage, question, leveling=None):
+    """
+    Подготавливает данные для диаграммы Ганта с правильными зависимостями
+
+    leveling — параметры выравнивания загрузки исполнителей
+    (см. level_resources): {'default_capacity': ..., 'capacities': {...}}.
+    Без него работы стоят в сроки из справочника.
+    """
+    # Версия справочника, по снимку которой диаграмму можно воспроизвести (prepare_chart_data_as_of)
+    version = current_version()
+    # Для зависимостей нужны только id: граф проверяется при сохранении этапов (stage_graph)
+    stages = load_rows('stage', chart_stages(mineral_type))
+    works = chart_works(list(stages))
+    
+    question_row = None
+    if question:
+        question_row = {
+            'id': question.id,
+            'text': question.text,
+            'code': question.code,
+            'target_stages': list(target_stage_ids(question, mineral_type)),
+        }
+    
+    chart_data = build_chart_data(
+        {'id': mineral_type.id, 'name': mineral_type.name, 'code': mineral_type.code},
+        stages, works, start_stage.id, question_row, leveling=leveling
+    )
+    chart_data['reference_version'] = version
+    return chart_data
+
+
+def prepare_chart_data_as_of(version, mineral_type_id, start_stage_id, question_id=None, leveling=None):
+    """
+    Диаграмма по снимку справочника на версию version (см. versioning.snapshot);
+    ValueError — версии нет или в ней нет типа ПИ, начального этапа или вопроса
+    """
+    reference = snapshot(version)
+    mineral_type = reference['mineral_type'].get(mineral_type_id)
+    stages = {
+        stage_id: stage for stage_id, stage in reference['stage'].items()
+        if stage['mineral_type_id'] == mineral_type_id
+    }
+    question = reference['question'].get(question_id) if question_id else None
+    if mineral_type is None or start_stage_id not in stages or (question_id and question is None):
+        raise ValueError(f'В версии справочника {version} нет типа ПИ, начального этапа или вопроса диаграммы')
+    works = [work for work in reference['work'].values() if work['stage_id'] in stages]
+    
+    chart_data = build_chart_data(mineral_type, stages, works, start_stage_id, question, leveling=leveling)
+    chart_data['reference_version'] = version
+    return chart_data
+
+
+def build_chart_data(mineral_type, stages, works, start_stage_id, question, leveling=None):
+    """
+    Собирает chart_data из строк справочника в формате снимка версии:
+    stages — {id: этап} одного типа ПИ со списками depends_on, works —
+    работы этих этапов, question — вопрос со списком target_stages или None
+    """
+    # Создаем словарь для быстрого доступа, упорядоченный по порядку этапов
+    stage_dict = {stage['id']: stage for stage in sorted(stages.values(), key=lambda x: (x['order'], x['id']))}
+    start_stage = stage_dict[start_stage_id]
+    
+    # Определяем, до каких этапов нужно идти
+    target_stage_ids = set()
+    
+    if question:
+        # Берем целевые этапы из вопроса
+        target_stage_ids = set(question['target_stages']) & set(stage_dict)
+    else:
+        # Если вопроса нет, идем до конца всех этапов
+        start_order = start_stage['order']
+        target_stage_ids = set(
+            stage['id'] for stage in stage_dict.values()
+            if stage['order'] >= start_order
+        )
+    
+    # Функция для топологической сортировки этапов с учетом зависимостей
+    def topological_sort(stage_ids):
+        visited = set()
+        stack = []
+        
+        def dfs(stage_id):
+            if stage_id in visited:
+                return
+            visited.add(stage_id)
+            
+            stage = stage_dict.get(stage_id)
+            if stage:
+                # Сначала посещаем зависимости
+                for dep_id in stage['depends_on']:
+                    dfs(dep_id)
+                
+                # Затем добавляем текущий этап
+                if stage_id in stage_ids:
+                    stack.append(stage_id)
+        
+        for stage_id in sorted(stage_ids, key=lambda x: stage_dict[x]['order']):
+            dfs(stage_id)
+        
+        return stack
+    
+    # Получаем этапы в правильном порядке с учетом зависимостей
+    included_stage_ids = topological_sort(target_stage_ids)
+    
+    # Добавляем начальный этап, если его еще нет
+    if start_stage_id not in included_stage_ids:
+        # Находим его место с учетом зависимостей
+        included_stage_ids.insert(0, start_stage_id)
+    
+    # Фильтруем этапы, которые идут после начального
+    included_stages = [
+        stage_dict[stage_id] for stage_id in included_stage_ids
+        if stage_dict[stage_id]['order'] >= start_stage['order']
+    ]
+    
+    # Сортируем по порядку
+    included_stages.sort(key=lambda x: x['order'])
+    
+    # Работы по этапам в порядке внутри этапа
+    stage_works = {}
+    for work in sorted(works, key=lambda x: (x['order'], x['id'])):
+        stage_works.setdefault(work['stage_id'], []).append(work)
+    
+    # Подготавливаем данные для каждого этапа; сроки считает schedule_stages
+    stages_data = []
+    
+    for stage in included_stages:
+        works_data = []
+        
+        for work in stage_works.get(stage['id'], []):
+            works_data.append({
+                'id': work['id'],
+                'number': work['number'],
+                'title': work['title'],
+                'description': work['description'],
+                'executor': work['executor'],
+                'duration_months': work['duration_months'], 
+                'start_month': work['start_month'],  # Используем start_month вместо start_in_stage
+                'order': work['order'],
+                'is_field_work': work['is_field_work']
+            })
+        
+        stages_data.append({
+            'id': stage['id'],
+            'name': stage['name'],
+            'order': stage['order'],
+            'description': stage['description'],
+            'color': stage['color'],
+            'start': 0,
+            'duration': stage['duration_months'],
+            # Собственная длительность этапа из справочника, без учета работ
+            'base_duration': stage['duration_months'],
+            'works': works_data,
+            # Зависимости для отрисовки стрелок
+            'dependencies': list(stage['depends_on']),
+            'total_duration': stage['duration_months']
+        })
+    
+    # Общая длительность
+    total_duration = schedule_stages(stages_data)
+    
+    chart_data = {
+        'mineral_type': {
+            'id': mineral_type['id'],
+            'name': mineral_type['name'],
+            'code': mineral_type['code']
+        },
+        'start_stage': {
+            'id': start_stage['id'],
+            'name': start_stage['name']
+        },
+        'question': {
+            'id': question['id'],
+            'text': question['text'],
+            'code': question['code']
+        } if question else None,
+        'stages': stages_data,
+        'total_duration': total_duration
+    }
+    
+    if leveling:
+        level_resources(chart_data, **leveling)
+    
+    return chart_data
+
+
+def schedule_stages(stages, first=0):
+    """
+    Рассчитывает сроки этапов и работ на месте, начиная с этапа с индексом first.
+
+    Этап начинается после окончания предыдущего этапа и своих
+    зависимостей, его длительность — не меньше собственной (base_duration)
+    и окончания любой работы. Этапы до first не меняются, поэтому после
+    правки одного этапа пересчитывается только хвост расписания.
+    Возвращает общую длительность.
+    """
+    finish = {stage['id']: stage['start'] + stage['duration'] for stage in stages[:first]}
+    current = stages[first - 1]['start'] + stages[first - 1]['duration'] if first else 0
+    
+    for stage in stages[first:]:
+        stage_start = max(
+            [current] + [finish[dep] for dep in stage.get('dependencies') or [] if dep in finish]
+        )
+        
+        stage_duration = stage.get('base_duration', stage.get('duration') or 0)
+        for work in stage.get('works') or []:
+            start_month = work.get('start_month', 0)
+            stage_duration = max(stage_duration, start_month + work.get('duration_months', 1))
+            work['start_global'] = stage_start + start_month
+            # Добавляем совместимость со старым ключом
+            work['start_in_stage'] = start_month
+        
+        stage['start'] = stage_start
+        stage['duration'] = stage['total_duration'] = stage_duration
+        finish[stage['id']] = current = stage_start + stage_duration
+    
+    return current
+
+
+def missing_base_durations(stages):
+    """
+    Собственные длительности этапов, у которых в chart_data нет base_duration
+    (диаграммы, построенные до его появления), — одним запросом
+    """
+    missing = [stage['id'] for stage in stages if 'base_duration' not in stage]
+    if not missing:
+        return {}
+    return dict(Stage.objects.filter(id__in=missing).values_list('id', 'duration_months'))
+
+
+def reschedule_stages(stages, dirty):
+    """
+    Инкрементальный пересчет на месте: dirty — индексы этапов, у которых
+    изменились собственные данные (длительность, работы).
+
+    Пересчет идет от первого измененного этапа и заканчивается, как только
+    изменение поглощено: окончание этапа не сдвинулось и никто ниже не
+    ссылается на этапы со сдвинувшимся окончанием. Результат совпадает
+    с schedule_stages(stages, min(dirty)).
+
+    Возвращает (индексы этапов со сдвинутыми сроками, id работ со сдвинутым началом).
+    """
+    changed_stages, changed_works = [], []
+    if not dirty:
+        return changed_stages, changed_works
+    
+    position = {stage['id']: index for index, stage in enumerate(stages)}
+    last_use = {}
+    for index, stage in enumerate(stages):
+        for dep in stage.get('dependencies') or []:
+            if position.get(dep, index) < index:
+                last_use[dep] = index
+    
+    first = min(dirty)
+    horizon = max(dirty)
+    finish = {}
+    current = stages[first - 1]['start'] + stages[first - 1]['duration'] if first else 0
+    
+    for index in range(first, len(stages)):
+        stage = stages[index]
+        if index > horizon:
+            break
+        
+        stage_start = max(
+            [current] + [
+                finish.get(dep, stages[position[dep]]['start'] + stages[position[dep]]['duration'])
+                for dep in stage.get('dependencies') or [] if position.get(dep, index) < index
+            ]
+        )
+        stage_duration = stage.get('base_duration', stage.get('duration') or 0)
+        for work in stage.get('works') or []:
+            start_month = work.get('start_month', 0)
+            stage_duration = max(stage_duration, start_month + work.get('duration_months', 1))
+            work['start_in_stage'] = start_month
+            if work.get('start_global') != stage_start + start_month:
+                work['start_global'] = stage_start + start_month
+                changed_works.append(work['id'])
+        
+        old_finish = stage.get('start', 0) + stage.get('duration', 0)
+        if stage.get('start') != stage_start or stage.get('duration') != stage_duration:
+            stage['start'] = stage_start
+            stage['duration'] = stage['total_duration'] = stage_duration
+            changed_stages.append(index)
+        
+        current = finish[stage['id']] = stage_start + stage_duration
+        if current != old_finish:
+            # Сдвиг окончания затрагивает следующий этап и всех, кто зависит от этого
+            horizon = max(horizon, index + 1, last_use.get(stage['id'], index))
+    
+    return changed_stages, changed_works
+
+
+SCHEDULE_CHANGE_FIELDS = {
+    'work': {'duration_months': 1, 'start_month': 0},
+    'stage': {'duration': 0},
+}
+
+
+def _parse_change(change):
+    if not isinstance(change, dict) or change.get('type') not in SCHEDULE_CHANGE_FIELDS:
+        raise ValueError('Каждое изменение — объект с type: work или stage')
+    try:
+        item_id = int(change.get('id'))
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректный id: {change.get("id")}')
+    
+    fields = SCHEDULE_CHANGE_FIELDS[change['type']]
+    unknown = set(change) - set(fields) - {'type', 'id', 'excluded'}
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    
+    values = {}
+    for field, minimum in fields.items():
+        if field not in change:
+            continue
+        try:
+            values[field] = int(change[field])
+        except (TypeError, ValueError):
+            raise ValueError(f'{field}: ожидается целое число')
+        if values[field] < minimum:
+            raise ValueError(f'{field}: значение должно быть не меньше {minimum}')
+    return change['type'], item_id, values, bool(change.get('excluded'))
+
+
+def apply_schedule_changes(chart_data, changes):
+    """
+    Применяет правки сроков к chart_data на месте и возвращает разницу.
+
+    changes — список {'type': 'work', 'id', 'duration_months'?, 'start_month'?,
+    'excluded'?} и {'type': 'stage', 'id', 'duration'?, 'excluded'?}; начало
+    этапа не задается — оно следует из предыдущего этапа и зависимостей.
+    Исключенные этапы и работы удаляются из диаграммы.
+
+    Разница содержит только изменившиеся полосы: новые сроки этапов
+    и работ и списки удаленных. Ошибки во входных данных — ValueError,
+    chart_data при этом не меняется.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Передайте непустой список изменений')
+    parsed = [_parse_change(change) for change in changes]
+    
+    stages = chart_data.get('stages') or []
+    stage_index = {stage['id']: index for index, stage in enumerate(stages)}
+    work_index = {
+        work['id']: (index, position)
+        for index, stage in enumerate(stages) for position, work in enumerate(stage.get('works') or [])
+    }
+    for kind, item_id, _, _ in parsed:
+        if item_id not in (work_index if kind == 'work' else stage_index):
+            raise ValueError(f'{"Работы" if kind == "work" else "Этапа"} {item_id} нет в диаграмме')
+    
+    own_durations = missing_base_durations(stages)
+    for stage in stages:
+        if 'base_duration' not in stage:
+            stage['base_duration'] = own_durations.get(stage['id'], stage.get('duration') or 0)
+    
+    dirty = set()
+    edited_works = set()
+    removed_works, removed_stages = set(), set()
+    for kind, item_id, values, excluded in parsed:
+        if kind == 'stage':
+            index = stage_index[item_id]
+            if excluded:
+                removed_stages.add(item_id)
+            if 'duration' in values:
+                stages[index]['base_duration'] = values['duration']
+        else:
+            index, position = work_index[item_id]
+            if excluded:
+                removed_works.add(item_id)
+            stages[index]['works'][position].update(values)
+            if 'start_month' in values:
+                # Перенос работы задает новое плановое смещение для выравнивания
+                stages[index]['works'][position].pop('planned_start_month', None)
+            edited_works.add(item_id)
+        dirty.add(stages[index]['id'])
+    
+    if removed_works:
+        for stage in stages:
+            if stage['id'] in dirty:
+                stage['works'] = [work for work in stage.get('works') or [] if work['id'] not in removed_works]
+    if removed_stages:
+        # На место удаленного этапа встает следующий, он и пересчитывается
+        for index, stage in enumerate(stages):
+            if stage['id'] in removed_stages:
+                following = next((item['id'] for item in stages[index + 1:] if item['id'] not in removed_stages), None)
+                if following is not None:
+                    dirty.add(following)
+        stages[:] = [stage for stage in stages if stage['id'] not in removed_stages]
+    
+    leveling = chart_data.get('leveling')
+    if leveling:
+        # Выравнивание связывает работы разных этапов через ресурсы, поэтому пересчитывается вся диаграмма
+        before = {stage['id']: (stage['start'], stage['duration']) for stage in stages}
+        work_before = {work['id']: work.get('start_global') for stage in stages for work in stage.get('works') or []}
+        schedule_stages(stages)
+        level_resources(chart_data, default_capacity=leveling['default_capacity'], capacities=leveling['capacities'])
+        changed_stages = [
+            index for index, stage in enumerate(stages)
+            if before[stage['id']] != (stage['start'], stage['duration'])
+        ]
+        changed_works = {
+            work['id'] for stage in stages for work in stage.get('works') or []
+            if work_before[work['id']] != work.get('start_global')
+        }
+    else:
+        changed_stages, changed_works = reschedule_stages(
+            stages, {index for index, stage in enumerate(stages) if stage['id'] in dirty}
+        )
+        chart_data['total_duration'] = stages[-1]['start'] + stages[-1]['duration'] if stages else 0
+    
+    changed_works = set(changed_works) | (edited_works - removed_works)
+    return {
+        'total_duration': chart_data['total_duration'],
+        'stages': [
+            {'id': stages[index]['id'], 'start': stages[index]['start'], 'duration': stages[index]['duration']}
+            for index in changed_stages
+        ],
+        'works': [
+            {
+                'id': work['id'],
+                'stage_id': stage['id'],
+                'start_global': work.get('start_global'),
+                'start_month': work.get('start_month', 0),
+                'duration_months': work.get('duration_months', 1),
+            }
+            for stage in stages for work in stage.get('works') or [] if work['id'] in changed_works
+        ],
+        'removed': {'stages': sorted(removed_stages), 'works': sorted(removed_works)},
+    }
+
+
+def normalize_executor(name):
+    """
+    Ключ ресурса: регистр и лишние пробелы в названии исполнителя не важны
+    """
+    return ' '.join((name or '').split()).casefold()
+
+
+class ResourceCalendar:
+    """
+    Помесячная загрузка одного ресурса.
+
+    Заполненные месяцы связываются со следующим месяцем (система
+    непересекающихся множеств со сжатием путей), поэтому поиск
+    свободного месяца не просматривает заново уже занятые периоды.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.usage = []
+        self._next_free = {}
+
+    def _free_from(self, month):
+        root = month
+        while root in self._next_free:
+            root = self._next_free[root]
+        while month != root:
+            self._next_free[month], month = root, self._next_free[month]
+        return root
+
+    def _load(self, month):
+        return self.usage[month] if month < len(self.usage) else 0
+
+    def earliest_start(self, release, duration):
+        """
+        Первый месяц не раньше release, с которого ресурс свободен duration месяцев подряд
+        """
+        start = self._free_from(release)
+        while True:
+            for month in range(start, start + duration):
+                if self._load(month) >= self.capacity:
+                    start = self._free_from(month + 1)
+                    break
+            else:
+                return start
+
+    def book(self, start, duration):
+        end = start + duration
+        if end > len(self.usage):
+            self.usage.extend([0] * (end - len(self.usage)))
+        for month in range(start, end):
+            self.usage[month] += 1
+            if self.usage[month] >= self.capacity:
+                self._next_free[month] = month + 1
+
+
+def level_resources(chart_data, default_capacity=DEFAULT_EXECUTOR_CAPACITY, capacities=None):
+    """
+    Выравнивает загрузку исполнителей в chart_data на месте.
+
+    Исполнители приводятся к ресурсам (normalize_executor), у каждого
+    ресурса есть допустимое число одновременных работ: capacities
+    по названию исполнителя или default_capacity. Этапы идут в прежнем
+    порядке и начинаются не раньше окончания предыдущего этапа и своих
+    зависимостей. Внутри этапа работы выбираются из очереди
+    с приоритетом (самое раннее допустимое начало, затем более длинные)
+    и ставятся на первый месяц, где у ресурса есть свободная мощность.
+    Сложность — O(n log n) по числу работ плюс длительность самих работ.
+
+    Результат: новые start_global/start_month у работ, новые сроки
+    этапов и раздел chart_data['leveling'] с ресурсами и их помесячной
+    загрузкой. Плановое смещение работы сохраняется в planned_start_month,
+    и повторное выравнивание начинается с него, а не со сдвинутого start_month.
+    """
+    requested_capacities = dict(capacities or {})
+    capacities = {normalize_executor(name): value for name, value in requested_capacities.items()}
+    resources = {}
+    calendars = {}
+
+    def resource_for(executor):
+        key = normalize_executor(executor)
+        if not key:
+            return None
+        if key not in resources:
+            resources[key] = {
+                'id': len(resources) + 1,
+                'name': ' '.join(executor.split()),
+                'capacity': max(1, int(capacities.get(key, default_capacity))),
+            }
+            calendars[key] = ResourceCalendar(resources[key]['capacity'])
+        return key
+
+    finish = {}
+    current = 0
+    delayed = 0
+    base_total_duration = chart_data.get('total_duration') or 0
+
+    for stage in chart_data.get('stages') or []:
+        stage_start = max(
+            [current] + [finish[dep] for dep in stage.get('dependencies') or [] if dep in finish]
+        )
+        works = stage.get('works') or []
+        # Выравнивание всегда идет от плана: сдвиги прошлого прохода не накапливаются
+        for work in works:
+            work.setdefault('planned_start_month', work.get('start_month') or 0)
+            work.pop('leveling_delay', None)
+        stage_end = stage_start + max(
+            [stage.get('base_duration', stage.get('duration') or 0)]
+            + [work['planned_start_month'] + (work.get('duration_months') or 1) for work in works]
+        )
+
+        queue = [
+            (stage_start + work['planned_start_month'], -(work.get('duration_months') or 1), index)
+            for index, work in enumerate(works)
+        ]
+        heapq.heapify(queue)
+
+        while queue:
+            release, negative_duration, index = heapq.heappop(queue)
+            duration = -negative_duration
+            work = works[index]
+            key = resource_for(work.get('executor'))
+
+            start = release
+            if key is not None:
+                start = calendars[key].earliest_start(release, duration)
+                calendars[key].book(start, duration)
+                work['resource_id'] = resources[key]['id']
+            if start > release:
+                work['leveling_delay'] = start - release
+                delayed += 1
+
+            work['start_global'] = start
+            work['start_month'] = work['start_in_stage'] = start - stage_start
+            stage_end = max(stage_end, start + duration)
+
+        stage['start'] = stage_start
+        stage['duration'] = stage['total_duration'] = stage_end - stage_start
+        finish[stage.get('id')] = stage_end
+        current = stage_end
+
+    chart_data['total_duration'] = current
+    chart_data['leveling'] = {
+        'default_capacity': default_capacity,
+        'capacities': requested_capacities,
+        'base_total_duration': base_total_duration,
+        'delayed_works': delayed,
+        'resources': [
+            {
+                **resource,
+                'peak': max(calendars[key].usage, default=0),
+                'utilization': calendars[key].usage,
+            }
+            for key, resource in resources.items()
+        ],
+    }
+    return chart_data
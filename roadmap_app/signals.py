@@ -0,0 +1,92 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import FAQ, MineralType, Question, Stage, UserGanttChart, Work
+from .stats import invalidate_admin_stats
+from .versioning import VERSIONED_TYPES, linked_ids, record_changes
+
+COUNTED_MODELS = (MineralType, Stage, Work, Question, FAQ, UserGanttChart)
+
+# Пакетное изменение справочника (массовая правка, правка ячеек, отмена):
+# одно событие на операцию вместо post_save на каждую запись.
+# Аргументы: sender — модель, ids — измененные записи, fields — измененные поля
+reference_data_changed = Signal()
+
+
+@receiver(post_save)
+def invalidate_stats_on_create(sender, instance, created, **kwargs):
+    """
+    Сбрасываем кэш статистики при появлении новых записей
+    """
+    if created and sender in COUNTED_MODELS:
+        invalidate_admin_stats()
+
+
+@receiver(post_delete)
+def invalidate_stats_on_delete(sender, instance, **kwargs):
+    """
+    Сбрасываем кэш статистики при удалении записей
+    """
+    if sender in COUNTED_MODELS:
+        invalidate_admin_stats()
+
+
+@receiver(reference_data_changed)
+def invalidate_stats_on_bulk_change(sender, ids, fields, **kwargs):
+    """
+    Смена связей (например, типа ПИ этапа) меняет разбивку статистики
+    """
+    invalidate_admin_stats()
+
+
+@receiver(post_save)
+def record_reference_save(sender, instance, **kwargs):
+    """
+    Новая версия справочника при сохранении записи
+    """
+    if sender in VERSIONED_TYPES:
+        record_changes(VERSIONED_TYPES[sender], [instance.pk], 'save')
+
+
+@receiver(post_delete)
+def record_reference_delete(sender, instance, **kwargs):
+    """
+    Новая версия справочника при удалении записи (в том числе каскадном)
+    """
+    if sender in VERSIONED_TYPES:
+        record_changes(VERSIONED_TYPES[sender], [instance.pk], 'delete')
+
+
+@receiver(m2m_changed)
+def record_reference_links(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Новая версия справочника при изменении связей (зависимости этапов,
+    типы ПИ и целевые этапы вопросов). Связь хранится в состоянии строки,
+    которой принадлежит поле: при изменении с обратной стороны это pk_set
+    """
+    owner = model if reverse else type(instance)
+    if owner not in VERSIONED_TYPES:
+        return
+    if action == 'pre_clear' and reverse:
+        # После очистки связанные строки уже не найти
+        instance._cleared_link_ids = linked_ids(owner, sender, instance.pk)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        ids = [instance.pk] if pk_set or action == 'post_clear' else []
+    elif action == 'post_clear':
+        ids = getattr(instance, '_cleared_link_ids', [])
+    else:
+        ids = pk_set
+    record_changes(VERSIONED_TYPES[owner], ids, 'links')
+
+
+@receiver(reference_data_changed)
+def record_reference_bulk_change(sender, ids, fields, **kwargs):
+    """
+    Одна версия на пакетное изменение
+    """
+    if sender in VERSIONED_TYPES:
+        record_changes(VERSIONED_TYPES[sender], ids, 'bulk')
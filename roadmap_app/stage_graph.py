@@ -0,0 +1,201 @@
+"""
+Проверка графа зависимостей этапов (Stage.depends_on).
+
+Ребро «этап → этап, от которого он зависит» допустимо только внутри
+одного типа ПИ, а сам граф должен быть ациклическим. Циклы ищутся
+алгоритмом Тарьяна (компоненты сильной связности) за O(V + E); для
+каждой компоненты строится кратчайший цикл, чтобы в сообщении был
+понятный путь. Граф читается двумя запросами, поэтому проверка
+одинаково дешева и при сохранении одного этапа, и после импорта.
+
+Проверка выполняется при записи (формы этапа, импорт), поэтому
+prepare_chart_data обходит зависимости без защитных проверок.
+"""
+from collections import deque
+
+from django.core.exceptions import ValidationError
+
+from .models import Stage
+
+
+def strongly_connected_components(graph):
+    """
+    Компоненты сильной связности: graph — {узел: преемники}.
+    Итеративный вариант алгоритма Тарьяна, без рекурсии
+    """
+    index, lowlink = {}, {}
+    stack, on_stack = [], set()
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        path = [(root, iter(graph.get(root, ())))]
+
+        while path:
+            node, successors = path[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    path.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                path.pop()
+                if path:
+                    parent = path[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def _has_cycle(graph, component):
+    return len(component) > 1 or component[0] in graph.get(component[0], ())
+
+
+def _shortest_cycle(graph, component, start):
+    """
+    Кратчайший цикл через start внутри компоненты (поиск в ширину)
+    """
+    members = set(component)
+    parents = {start: None}
+    queue = deque([start])
+
+    while queue:
+        node = queue.popleft()
+        for successor in graph.get(node, ()):
+            if successor == start:
+                cycle = [node]
+                while cycle[-1] != start:
+                    cycle.append(parents[cycle[-1]])
+                return cycle[::-1] + [start]
+            if successor in members and successor not in parents:
+                parents[successor] = node
+                queue.append(successor)
+    return [start, start]
+
+
+def find_cycles(graph):
+    """
+    По одному циклу на каждую компоненту сильной связности с циклом:
+    список путей [a, b, ..., a]
+    """
+    cycles = []
+    for component in strongly_connected_components(graph):
+        if _has_cycle(graph, component):
+            cycles.append(_shortest_cycle(graph, component, component[-1]))
+    return cycles
+
+
+def load_dependency_graph():
+    """
+    Граф зависимостей всех этапов и сведения об этапах {id: (название, тип ПИ)}
+    """
+    stages = {
+        stage_id: (name, mineral_type_id)
+        for stage_id, name, mineral_type_id in Stage.objects.values_list('id', 'name', 'mineral_type_id')
+    }
+    graph = {stage_id: [] for stage_id in stages}
+    through = Stage.depends_on.through
+    for stage_id, dependency_id in through.objects.values_list('from_stage_id', 'to_stage_id'):
+        graph[stage_id].append(dependency_id)
+    return graph, stages
+
+
+def _describe_cycle(cycle, stages):
+    return ' → '.join(stages[stage_id][0] for stage_id in cycle)
+
+
+def dependency_graph_errors(graph=None, stages=None):
+    """
+    Все нарушения в графе: зависимости от этапов другого типа ПИ и циклы
+    """
+    if graph is None:
+        graph, stages = load_dependency_graph()
+
+    errors = []
+    for stage_id, dependencies in graph.items():
+        for dependency_id in dependencies:
+            if stages[dependency_id][1] != stages[stage_id][1]:
+                errors.append(
+                    f'Этап «{stages[stage_id][0]}» зависит от этапа другого типа ПИ: '
+                    f'«{stages[dependency_id][0]}»'
+                )
+    for cycle in find_cycles(graph):
+        errors.append(f'Циклическая зависимость: {_describe_cycle(cycle, stages)}')
+    return errors
+
+
+def new_dependency_graph_errors(known):
+    """
+    Нарушения, которых нет в known — результате dependency_graph_errors()
+    до изменения: уже существующие ошибки графа не мешают пакетным правкам
+    """
+    known = set(known)
+    return [error for error in dependency_graph_errors() if error not in known]
+
+
+def validate_stage_dependencies(stage_id, mineral_type_id, dependency_ids):
+    """
+    Проверяет связи одного этапа до сохранения; stage_id — None для нового этапа.
+    Зависимости этапа и зависящие от него этапы должны быть того же типа ПИ.
+    Ошибки — ValidationError по полям depends_on и mineral_type
+    """
+    graph, stages = load_dependency_graph()
+    node = stage_id if stage_id is not None else 0
+    stages[node] = (stages.get(stage_id, ('Новый этап',))[0], mineral_type_id)
+    graph[node] = list(dependency_ids)
+
+    errors = {}
+    wrong_type = [
+        f'«{stages[dependency_id][0]}» относится к другому типу ПИ'
+        for dependency_id in dependency_ids if stages[dependency_id][1] != mineral_type_id
+    ]
+    if wrong_type:
+        errors['depends_on'] = wrong_type
+    # Смена типа ПИ делает недопустимыми и ребра от этапов, зависящих от этого
+    dependents = [
+        f'От этапа зависит «{stages[dependent_id][0]}» другого типа ПИ'
+        for dependent_id, dependencies in graph.items()
+        if dependent_id != node and node in dependencies and stages[dependent_id][1] != mineral_type_id
+    ]
+    if dependents:
+        errors['mineral_type'] = dependents
+    # Уже существующие циклы, не проходящие через этот этап, его сохранению не мешают
+    for component in strongly_connected_components(graph):
+        if node in component and _has_cycle(graph, component):
+            cycle = _shortest_cycle(graph, component, node)
+            errors.setdefault('depends_on', []).append(
+                f'Циклическая зависимость: {_describe_cycle(cycle, stages)} (→ — «зависит от»)'
+            )
+    if errors:
+        raise ValidationError(errors)
+
+
+def clean_stage_form(form, cleaned_data):
+    """
+    Проверка связей в clean() форм этапа (админка и страницы модератора).
+    Форма пакетной правки без поля depends_on не проверяется: этапы в ней
+    меняются вместе, и граф проверяется после записи всего пакета (bulk)
+    """
+    if not cleaned_data.get('mineral_type') or 'depends_on' not in cleaned_data:
+        return
+    validate_stage_dependencies(
+        form.instance.pk, cleaned_data['mineral_type'].pk,
+        [stage.pk for stage in cleaned_data['depends_on']]
+    )
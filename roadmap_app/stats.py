@@ -0,0 +1,112 @@
+"""
+Статистика для административной панели.
+
+Все счетчики считаются одним агрегирующим запросом и кэшируются
+на короткое время, поэтому стартовая страница модератора не зависит
+от размера таблиц.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FAQ, MineralType, Question, Stage, UserGanttChart, Work
+
+ADMIN_STATS_CACHE_KEY = 'roadmap_app:admin_stats'
+ADMIN_STATS_CACHE_TTL = getattr(settings, 'ADMIN_STATS_CACHE_TTL', 60)
+
+# Периоды для темпа создания диаграмм: ключ -> длина окна
+CHART_RATE_WINDOWS = {
+    'charts_24h': timedelta(days=1),
+    'charts_7d': timedelta(days=7),
+    'charts_30d': timedelta(days=30),
+}
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _totals():
+    """
+    Общие счетчики одним запросом из скалярных подзапросов
+    """
+    created_at = connection.ops.quote_name('created_at')
+    total_duration = connection.ops.quote_name('total_duration')
+    charts = _table(UserGanttChart)
+    now = timezone.now()
+
+    columns = [
+        ('mineral_types', f'SELECT COUNT(*) FROM {_table(MineralType)}', []),
+        ('stages', f'SELECT COUNT(*) FROM {_table(Stage)}', []),
+        ('works', f'SELECT COUNT(*) FROM {_table(Work)}', []),
+        ('questions', f'SELECT COUNT(*) FROM {_table(Question)}', []),
+        ('faqs', f'SELECT COUNT(*) FROM {_table(FAQ)}', []),
+        ('charts', f'SELECT COUNT(*) FROM {charts}', []),
+        ('avg_chart_duration', f'SELECT AVG({total_duration}) FROM {charts}', []),
+    ]
+    for key, window in CHART_RATE_WINDOWS.items():
+        columns.append((
+            key,
+            f'SELECT COUNT(*) FROM {charts} WHERE {created_at} >= %s',
+            [connection.ops.adapt_datetimefield_value(now - window)],
+        ))
+
+    sql = 'SELECT ' + ', '.join(f'({query})' for _, query, _ in columns)
+    params = [param for _, _, query_params in columns for param in query_params]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    totals = dict(zip((key for key, _, _ in columns), row))
+    totals['avg_chart_duration'] = round(totals['avg_chart_duration'] or 0, 1)
+    return totals
+
+
+def _count_subquery(queryset):
+    """
+    Коррелированный подзапрос COUNT(*) для аннотации
+    """
+    # Func вместо Count: агрегат без GROUP BY дает ровно одну строку
+    counted = queryset.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def _mineral_breakdown():
+    """
+    Разбивка по типам ПИ: этапы, работы и диаграммы на каждый тип
+    """
+    return list(
+        MineralType.objects.order_by('name').annotate(
+            stage_count=_count_subquery(Stage.objects.filter(mineral_type=OuterRef('pk'))),
+            work_count=_count_subquery(Work.objects.filter(stage__mineral_type=OuterRef('pk'))),
+            chart_count=_count_subquery(UserGanttChart.objects.filter(mineral_type=OuterRef('pk'))),
+        ).values('id', 'name', 'code', 'stage_count', 'work_count', 'chart_count')
+    )
+
+
+def compute_admin_stats():
+    stats = _totals()
+    stats['by_mineral_type'] = _mineral_breakdown()
+    stats['computed_at'] = timezone.now()
+    return stats
+
+
+def get_admin_stats():
+    """
+    Статистика из кэша; при отсутствии пересчитывается и кладется на ADMIN_STATS_CACHE_TTL
+    """
+    stats = cache.get(ADMIN_STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_admin_stats()
+        cache.set(ADMIN_STATS_CACHE_KEY, stats, ADMIN_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_admin_stats():
+    cache.delete(ADMIN_STATS_CACHE_KEY)
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from roadmap_app.models import UserGanttChart
+from roadmap_app.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+class KeysetPaginationTests(TestCase):
+
+    def test_cursor_keeps_microseconds(self):
+        moment = timezone.now().replace(microsecond=123456)
+        self.assertEqual(decode_cursor(encode_cursor([moment, 7]), 2), [moment, 7])
+
+    def test_same_millisecond_rows_are_not_skipped(self):
+        # Время создания в пределах одной миллисекунды (импорт, перенос базы)
+        user = get_user_model().objects.create_user(username='pager', password='x')
+        base = timezone.now().replace(microsecond=500000)
+        ids = []
+        for index in range(4):
+            chart = UserGanttChart.objects.create(user=user, title=f'chart {index}', chart_data={})
+            UserGanttChart.objects.filter(id=chart.id).update(created_at=base + timedelta(microseconds=100 * index))
+            ids.append(chart.id)
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(
+                UserGanttChart.objects.filter(user=user), ('-created_at', '-id'), cursor=cursor, limit=1
+            )
+            seen.extend(chart.id for chart in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, ids[::-1])
@@ -0,0 +1,195 @@
+"""
+Проверки PostgreSQL: индексы миграции 0013, поиск диаграмм по jsonb
+и перенос данных из SQLite. Выполняются только с DB_ENGINE=postgresql
+(например, на локальном сервере для разработки), иначе пропускаются.
+"""
+import importlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from roadmap_app.chart_queries import SQLITE_REFERENCES, charts_referencing
+from roadmap_app.models import MineralType, Stage, UserGanttChart, Work
+
+indexes = importlib.import_module('roadmap_app.migrations.0013_postgresql_indexes')
+
+ON_POSTGRESQL = connection.vendor == 'postgresql'
+SOURCE_ALIAS = 'roundtrip_source'
+ENSURE_CONNECTION = BaseDatabaseWrapper.ensure_connection
+
+
+def index_names():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+        return {name for name, in cursor.fetchall()}
+
+
+def trigram_index_names():
+    return {name for name, _ in indexes.FAQ_TRIGRAM_INDEXES}
+
+
+@skipUnless(ON_POSTGRESQL, 'нужен DB_ENGINE=postgresql')
+class PostgresIndexMigrationTests(TestCase):
+
+    def rebuild_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            indexes.drop_indexes(None, schema_editor)
+            indexes.create_indexes(None, schema_editor)
+
+    def test_indexes_follow_pg_trgm_availability(self):
+        available = indexes.pg_trgm_available(connection)
+        if available:
+            self.rebuild_indexes()
+        else:
+            with self.assertLogs(indexes.logger, 'WARNING'):
+                self.rebuild_indexes()
+
+        names = index_names()
+        self.assertIn(indexes.CHART_DATA_INDEX[0], names)
+        if available:
+            self.assertLessEqual(trigram_index_names(), names)
+        else:
+            self.assertFalse(trigram_index_names() & names)
+
+    def test_extension_without_rights_skips_trigram_indexes(self):
+        # Роль без права CREATE EXTENSION: команда падает, миграция продолжается
+        with connection.schema_editor() as schema_editor:
+            execute = schema_editor.execute
+
+            def failing_extension(sql, params=()):
+                if 'CREATE EXTENSION' in str(sql):
+                    sql = 'CREATE EXTENSION roadmap_app_missing_extension'
+                return execute(sql, params)
+
+            indexes.drop_indexes(None, schema_editor)
+            with mock.patch.object(indexes, 'pg_trgm_available', return_value=True), \
+                    mock.patch.object(schema_editor, 'execute', side_effect=failing_extension), \
+                    self.assertLogs(indexes.logger, 'WARNING'):
+                indexes.create_indexes(None, schema_editor)
+
+        names = index_names()
+        self.assertIn(indexes.CHART_DATA_INDEX[0], names)
+        self.assertFalse(trigram_index_names() & names)
+
+
+@skipUnless(ON_POSTGRESQL, 'нужен DB_ENGINE=postgresql')
+class ChartsReferencingParityTests(TestCase):
+    """
+    Условие jsonb @> находит те же диаграммы, что и условие json_each для SQLite
+    """
+    CHARTS = [
+        {'mineral_type': {'id': 1}, 'question': {'id': 7},
+         'stages': [{'id': 10, 'works': [{'id': 100}, {'id': 101}]}, {'id': 11, 'works': []}]},
+        {'mineral_type': {'id': 2}, 'stages': [{'id': 11, 'works': [{'id': 102}]}]},
+        {'mineral_type': {'id': 1}, 'question': None, 'stages': []},
+        {},
+    ]
+    CASES = [
+        ('mineral_type', 1), ('mineral_type', 3),
+        ('stage', 10), ('stage', 11), ('stage', 100),
+        ('work', 101), ('work', 102), ('work', 10),
+        ('question', 7), ('question', 1),
+    ]
+
+    def sqlite_matches(self, model_type, object_id):
+        db = sqlite3.connect(':memory:')
+        try:
+            db.execute('CREATE TABLE chart (id INTEGER PRIMARY KEY, chart_data TEXT)')
+            db.executemany('INSERT INTO chart VALUES (?, ?)', [
+                (chart.id, json.dumps(chart.chart_data)) for chart in UserGanttChart.objects.all()
+            ])
+            condition = SQLITE_REFERENCES[model_type].format(column='chart.chart_data').replace('%s', '?')
+            return {row_id for row_id, in db.execute(f'SELECT id FROM chart WHERE {condition}', [object_id])}
+        finally:
+            db.close()
+
+    def test_same_charts_as_sqlite(self):
+        user = get_user_model().objects.create_user(username='parity', password='x')
+        for index, chart_data in enumerate(self.CHARTS):
+            UserGanttChart.objects.create(user=user, title=f'chart {index}', chart_data=chart_data)
+
+        for model_type, object_id in self.CASES:
+            with self.subTest(model_type=model_type, object_id=object_id):
+                found = set(charts_referencing(model_type, object_id).values_list('id', flat=True))
+                self.assertEqual(found, self.sqlite_matches(model_type, object_id))
+
+
+@skipUnless(ON_POSTGRESQL, 'нужен DB_ENGINE=postgresql')
+class MigrateFromSqliteTests(TransactionTestCase):
+    """
+    Перенос файла SQLite в пустую базу PostgreSQL сохраняет id, время и связи
+    """
+
+    def setUp(self):
+        # Файлы SQLite (источник и соединение команды) подключаются уже во время теста,
+        # а TestCase разрешает только базы, известные при запуске класса
+        patcher = mock.patch.object(BaseDatabaseWrapper, 'ensure_connection', ENSURE_CONNECTION)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = os.path.join(tmp.name, 'source.sqlite3')
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings({
+            **connections.settings,
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.source},
+        })[SOURCE_ALIAS]
+        self.addCleanup(self.remove_source_alias)
+        call_command('migrate', database=SOURCE_ALIAS, verbosity=0)
+
+    def remove_source_alias(self):
+        connections[SOURCE_ALIAS].close()
+        del connections[SOURCE_ALIAS]
+        del connections.settings[SOURCE_ALIAS]
+
+    def fill_source(self):
+        # bulk_create без сигналов: версии справочника пишутся в основную базу
+        created = timezone.now().replace(microsecond=123456) - timedelta(days=3)
+        mineral_type = MineralType(id=40, name='Золото', code='gold')
+        MineralType.objects.using(SOURCE_ALIAS).bulk_create([mineral_type])
+        Stage.objects.using(SOURCE_ALIAS).bulk_create([
+            Stage(id=70, mineral_type_id=40, name='Поиски', code='s1', order=1),
+            Stage(id=71, mineral_type_id=40, name='Разведка', code='s2', order=2),
+        ])
+        Stage.depends_on.through.objects.using(SOURCE_ALIAS).bulk_create([
+            Stage.depends_on.through(from_stage_id=71, to_stage_id=70),
+        ])
+        Work.objects.using(SOURCE_ALIAS).bulk_create([
+            Work(id=500, stage_id=71, number='2.1', title='Бурение', executor='Партия'),
+        ])
+        user = get_user_model()(id=9, username='source_user')
+        user.set_password('x')
+        get_user_model().objects.using(SOURCE_ALIAS).bulk_create([user])
+        UserGanttChart.objects.using(SOURCE_ALIAS).bulk_create([
+            UserGanttChart(id=33, user_id=9, title='План', mineral_type_id=40, chart_data={'stages': [{'id': 70}]}),
+        ])
+        MineralType.objects.using(SOURCE_ALIAS).filter(id=40).update(created_at=created)
+        UserGanttChart.objects.using(SOURCE_ALIAS).filter(id=33).update(created_at=created)
+        connections[SOURCE_ALIAS].close()
+        return created
+
+    def test_round_trip(self):
+        created = self.fill_source()
+        call_command('migrate_from_sqlite', source=self.source, stdout=StringIO())
+
+        self.assertEqual(MineralType.objects.get(id=40).created_at, created)
+        self.assertEqual(UserGanttChart.objects.get(id=33).created_at, created)
+        self.assertEqual(list(Stage.objects.get(id=71).depends_on.values_list('id', flat=True)), [70])
+        self.assertEqual(Work.objects.get(id=500).stage_id, 71)
+        self.assertEqual(UserGanttChart.objects.get(id=33).user.username, 'source_user')
+        self.assertTrue(charts_referencing('stage', 70).filter(id=33).exists())
+
+        # Счетчики id продолжаются после перенесенных значений
+        self.assertGreater(MineralType.objects.create(name='Медь', code='cu').id, 40)
+        self.assertGreater(Work.objects.create(stage_id=70, number='1.1', title='т', executor='и').id, 500)
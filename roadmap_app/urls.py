@@ -6,6 +6,16 @@ urlpatterns = [
     path('create/', views.create_gantt, name='create_gantt'),
     path('chart/<int:chart_id>/', views.view_gantt, name='view_gantt'),
     path('chart/<int:chart_id>/delete/', views.delete_gantt, name='delete_gantt'),
+    path('chart/<int:chart_id>/export/<str:export_format>/', views.export_gantt, name='export_gantt'),
+    path('chart/<int:chart_id>/risk/', views.chart_risk, name='chart_risk'),
+    path('chart/<int:chart_id>/schedule/', views.update_chart_schedule, name='update_chart_schedule'),
+    path('chart/<int:chart_id>/scenarios/', views.chart_scenarios, name='chart_scenarios'),
+    path('chart/<int:chart_id>/scenarios/diff/', views.chart_scenario_diff, name='chart_scenario_diff'),
+    path('chart/<int:chart_id>/scenarios/<int:scenario_id>/', views.chart_scenario, name='chart_scenario'),
+    path('trash/<int:entry_id>/restore/', views.restore_trash, name='restore_trash'),
+    path('charts/archive/', views.export_charts_archive, name='export_charts_archive'),
+    path('portfolio/', views.portfolio, name='portfolio'),
+    path('portfolio/data/', views.portfolio_data, name='portfolio_data'),
     path('get-stages/', views.get_filtered_stages, name='get_stages'),
     path('get-questions/', views.get_filtered_questions, name='get_questions'),
     path('get-works/', views.get_works_for_selection, name='get_works'),
@@ -14,6 +24,7 @@ urlpatterns = [
     # Административные маршруты
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin/data/<str:model_type>/', views.data_management, name='data_management'),
+    path('admin/data/<str:model_type>/cells/', views.update_data_cells, name='update_data_cells'),
     path('admin/data/<str:model_type>/<int:item_id>/edit/', views.edit_data, name='edit_data'),
     path('admin/data/<str:model_type>/<int:item_id>/delete/', views.delete_data, name='delete_data'),
     
@@ -22,6 +33,8 @@ urlpatterns = [
     path('admin/import/logs/', views.import_logs, name='import_logs'),
     path('admin/import/logs/<int:log_id>/', views.log_detail, name='log_detail'),
     path('admin/bulk-edit/', views.bulk_edit, name='bulk_edit'),
+    path('admin/bulk-edit/<int:journal_id>/undo/', views.undo_bulk_edit, name='undo_bulk_edit'),
+    path('admin/trash/', views.trash, name='trash'),
     path('admin/template/<str:model_type>/', views.download_template, name='download_template'),
     
     # API для AJAX
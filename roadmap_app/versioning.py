@@ -0,0 +1,223 @@
+"""
+Версии справочника: типы ПИ, этапы, работы и вопросы.
+
+Любое изменение справочника получает номер из одного возрастающего
+счетчика (DataVersion) и записи по измененным строкам (ChangeRecord):
+состояние строки после изменения или None, если строка удалена.
+Журнал только дописывается. Первое изменение записывает исходное
+состояние всего справочника, поэтому история полна с момента
+включения версий.
+
+Снимок на версию N — последнее состояние каждой строки с версией
+не выше N. Снимок версии не меняется, поэтому кэшируется по ее
+номеру без инвалидации. Номер текущей версии — один ключ кэша;
+кэши, зависящие от справочника, включают его в свои ключи, и любое
+изменение справочника делает их записи недействительными.
+
+Операции, меняющие много строк через save() и delete() (импорт, действия
+админки с каскадом), выполняются внутри batched_changes: сигналы
+по строкам только копят id, а версия записывается одна на операцию.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import ChangeRecord, DataVersion, MineralType, Question, Stage, Work
+
+VERSIONED_MODELS = {
+    'mineral_type': MineralType,
+    'stage': Stage,
+    'work': Work,
+    'question': Question,
+}
+VERSIONED_TYPES = {model: model_type for model_type, model in VERSIONED_MODELS.items()}
+# Служебные поля не входят в состояние строки: их изменение не создает версию
+UNVERSIONED_FIELDS = ('created_at', 'updated_at')
+
+REFERENCE_VERSION_CACHE_KEY = 'roadmap_app:reference_version'
+REFERENCE_VERSION_CACHE_TTL = getattr(settings, 'REFERENCE_VERSION_CACHE_TTL', 60)
+REFERENCE_SNAPSHOT_CACHE_TTL = getattr(settings, 'REFERENCE_SNAPSHOT_CACHE_TTL', 24 * 3600)
+
+# Изменения открытого batched_changes: {тип: set(id)}; None — блока нет
+_batch = ContextVar('roadmap_app_reference_batch', default=None)
+
+
+def row_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in UNVERSIONED_FIELDS]
+
+
+def row_values(model, queryset):
+    """
+    Запрос состояний строк queryset (без связей многие-ко-многим)
+    """
+    return queryset.order_by().values(*row_fields(model))
+
+
+def load_rows(model_type, queryset=None):
+    """
+    Текущие строки {id: состояние}; queryset — отбор строк (по умолчанию все).
+    Связи многие-ко-многим читаются одним запросом на связь
+    """
+    model = VERSIONED_MODELS[model_type]
+    queryset = model.objects.all() if queryset is None else queryset
+    rows = {row['id']: row for row in row_values(model, queryset)}
+
+    for field in model._meta.many_to_many:
+        for row in rows.values():
+            row[field.name] = []
+        source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+        links = field.remote_field.through.objects.filter(**{f'{source}__in': queryset.order_by().values('id')})
+        for row_id, linked_id in links.order_by(source, target).values_list(source, target):
+            if row_id in rows:
+                rows[row_id][field.name].append(linked_id)
+    return rows
+
+
+def linked_ids(model, through, target_id):
+    """
+    id строк model, связанных через through со строкой target_id
+    (для обратной стороны связи, когда Django не передает список)
+    """
+    field = next(field for field in model._meta.many_to_many if field.remote_field.through is through)
+    return list(through.objects.filter(
+        **{f'{field.m2m_reverse_field_name()}_id': target_id}
+    ).values_list(f'{field.m2m_field_name()}_id', flat=True))
+
+
+def current_version():
+    """
+    Номер текущей версии справочника (0 — версий еще нет); обычно без запроса к БД
+    """
+    version = cache.get(REFERENCE_VERSION_CACHE_KEY)
+    if version is None:
+        version = DataVersion.objects.aggregate(last=Max('id'))['last'] or 0
+        cache.set(REFERENCE_VERSION_CACHE_KEY, version, REFERENCE_VERSION_CACHE_TTL)
+    return version
+
+
+def _version_committed():
+    transaction.on_commit(lambda: cache.delete(REFERENCE_VERSION_CACHE_KEY))
+
+
+def record_baseline():
+    """
+    Записывает версию с текущим состоянием всех строк справочника
+    """
+    with transaction.atomic():
+        version = DataVersion.objects.create(source='baseline')
+        records = [
+            ChangeRecord(version=version, model_type=model_type, object_id=row_id, data=row)
+            for model_type in VERSIONED_MODELS
+            for row_id, row in load_rows(model_type).items()
+        ]
+        ChangeRecord.objects.bulk_create(records)
+        version.change_count = len(records)
+        version.save(update_fields=['change_count'])
+    _version_committed()
+    return version
+
+
+def record_changes(model_type, ids, source):
+    """
+    Записывает новую версию с текущим состоянием строк ids; отсутствующие
+    строки записываются как удаленные. Возвращает версию или None, если ids пуст
+    или открыт batched_changes (тогда ids войдут в его версию)
+    """
+    batch = _batch.get()
+    if batch is not None:
+        batch.setdefault(model_type, set()).update(ids)
+        return None
+    return record_batch({model_type: ids}, source)
+
+
+@contextmanager
+def batched_changes(source):
+    """
+    Одна версия на все изменения справочника внутри блока. Версия пишется
+    при выходе без исключения; вложенный блок входит во внешний
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    changes = {}
+    token = _batch.set(changes)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    record_batch(changes, source)
+
+
+def record_batch(changes, source):
+    """
+    Одна версия на изменение строк нескольких типов: changes — {тип: id}
+    """
+    from .bulk import id_chunks
+
+    changes = {model_type: sorted(set(ids)) for model_type, ids in changes.items() if ids}
+    if not changes:
+        return None
+    if not current_version() and not DataVersion.objects.exists():
+        # Исходное состояние уже включает это изменение
+        return record_baseline()
+
+    with transaction.atomic():
+        version = DataVersion.objects.create(source=source, change_count=sum(map(len, changes.values())))
+        records = []
+        for model_type, ids in changes.items():
+            model = VERSIONED_MODELS[model_type]
+            for chunk in id_chunks(ids):
+                rows = load_rows(model_type, model.objects.filter(id__in=chunk))
+                records.extend(
+                    ChangeRecord(version=version, model_type=model_type, object_id=row_id, data=rows.get(row_id))
+                    for row_id in chunk
+                )
+        ChangeRecord.objects.bulk_create(records)
+    _version_committed()
+    return version
+
+
+def materialize_snapshot(version):
+    """
+    Состояние справочника на версию: {тип: {id: состояние}} без удаленных строк
+    """
+    result = {}
+    for model_type in VERSIONED_MODELS:
+        rows = {}
+        records = ChangeRecord.objects.filter(
+            model_type=model_type, version_id__lte=version
+        ).order_by('object_id', 'version_id').values_list('object_id', 'data')
+        # Порядок индекса: у каждой строки последней остается самая поздняя запись
+        for object_id, data in records.iterator(chunk_size=2000):
+            rows[object_id] = data
+        result[model_type] = {object_id: data for object_id, data in rows.items() if data is not None}
+    return result
+
+
+def snapshot(version=None):
+    """
+    Снимок справочника на версию (None — текущая) из кэша; ValueError — нет такой версии
+    """
+    version = current_version() if version is None else version
+    key = f'roadmap_app:reference_snapshot:{version}'
+    result = cache.get(key)
+    if result is None:
+        if not DataVersion.objects.filter(id=version).exists():
+            raise ValueError(f'Версия справочника {version} не найдена')
+        result = materialize_snapshot(version)
+        cache.set(key, result, REFERENCE_SNAPSHOT_CACHE_TTL)
+    return result
+
+
+def version_at(moment):
+    """
+    Версия справочника, действовавшая в момент moment; ValueError — версий до него нет
+    """
+    version = DataVersion.objects.filter(created_at__lte=moment).order_by('-id').values_list('id', flat=True).first()
+    if version is None:
+        raise ValueError(f'Нет версий справочника на {moment:%d.%m.%Y %H:%M}')
+    return version
@@ -0,0 +1,109 @@
+"""
+Выборки страниц и AJAX-запросов roadmap_app.
+
+Представления строят запросы этими функциями, а manage.py
+explain_queries проверяет планы тех же запросов: изменение выборки
+в представлении сразу попадает и в проверку индексов.
+"""
+from django.db.models import Exists, OuterRef, Q
+
+from .models import FAQ, DataImportLog, Question, Stage, UserGanttChart, Work
+
+HOME_FAQ_COUNT = 5
+RECENT_IMPORT_COUNT = 5
+
+DASHBOARD_PAGE_SIZE = 24
+# Варианты сортировки карточек: сортируем по сводным колонкам, а не по chart_data
+DASHBOARD_SORTS = {
+    'created': ('-created_at', '-id'),
+    'duration': ('-total_duration', '-id'),
+    'works': ('-work_count', '-id'),
+    'title': ('title', 'id'),
+}
+DASHBOARD_CHART_FIELDS = (
+    'id', 'title', 'created_at', 'updated_at',
+    'total_duration', 'stage_count', 'work_count', 'critical_path_length',
+    'mineral_type__name', 'start_stage__name', 'question__text',
+)
+
+# Поля работы, которые можно запросить через параметр fields
+WORK_LIST_FIELDS = (
+    'id', 'stage_id', 'number', 'title', 'description', 'executor',
+    'duration_months', 'start_month', 'order',
+)
+# По умолчанию не отдаем длинное описание
+WORK_LIST_DEFAULT_FIELDS = (
+    'id', 'stage_id', 'number', 'title', 'executor',
+    'duration_months', 'start_month', 'order',
+)
+# Ключ keyset-пагинации совпадает с индексом Work(stage, order)
+WORK_LIST_ORDERING = ('stage_id', 'order', 'id')
+
+
+def home_faqs():
+    return FAQ.objects.filter(is_active=True).order_by('order')[:HOME_FAQ_COUNT]
+
+
+def search_faqs(query):
+    """
+    Активные FAQ; с query — те, где он встречается в вопросе, ответе или ключевых словах
+    """
+    faqs = FAQ.objects.filter(is_active=True)
+    if query:
+        faqs = faqs.filter(
+            Q(question__icontains=query) |
+            Q(answer__icontains=query) |
+            Q(keywords__icontains=query)
+        )
+    return faqs
+
+
+def dashboard_charts(user):
+    """
+    Карточки диаграмм пользователя: chart_data не загружается, хватает сводных колонок
+    """
+    return UserGanttChart.objects.filter(user=user).select_related(
+        'mineral_type', 'start_stage', 'question'
+    ).only(*DASHBOARD_CHART_FIELDS)
+
+
+def user_charts(user):
+    """
+    Диаграммы пользователя вместе с рабочим календарем (для страницы диаграммы)
+    """
+    return UserGanttChart.objects.select_related('calendar').filter(user=user)
+
+
+def mineral_type_stages(mineral_type_id):
+    return Stage.objects.filter(
+        mineral_type_id=mineral_type_id
+    ).order_by('order').values('id', 'name', 'order', 'description')
+
+
+def mineral_type_questions(mineral_type_id):
+    return Question.objects.filter(
+        mineral_types__id=mineral_type_id
+    ).values('id', 'text', 'code', 'description')
+
+
+def selection_works(mineral_type_id, stage_id=None, question_id=None, executor=None):
+    """
+    Работы для выбора в конструкторе диаграммы; все фильтры — один запрос по индексу Work(stage, order)
+    """
+    works = Work.objects.filter(stage__mineral_type_id=mineral_type_id)
+
+    if stage_id:
+        works = works.filter(stage_id=stage_id)
+    if question_id:
+        # Только работы целевых этапов вопроса: EXISTS по M2M не дублирует строки
+        targets = Question.target_stages.through.objects.filter(
+            question_id=question_id, stage_id=OuterRef('stage_id')
+        )
+        works = works.filter(Exists(targets))
+    if executor:
+        works = works.filter(executor=executor)
+    return works
+
+
+def user_import_logs(user):
+    return DataImportLog.objects.filter(user=user).order_by('-created_at')
@@ -2,11 +2,31 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.views.generic import TemplateView
-from django.db.models import Q
-from .models import FAQ, MineralType, Stage, Question, Work, UserGanttChart
+from django.utils import timezone
+from .models import FAQ, MineralType, Stage, Question, Work, UserGanttChart, ChartScenario
 from .forms import GanttChartCreationForm
-from .models import DataImportLog
+from .pagination import MAX_PAGE_SIZE, keyset_page, parse_limit
+from .view_queries import (
+    DASHBOARD_PAGE_SIZE, DASHBOARD_SORTS, RECENT_IMPORT_COUNT,
+    WORK_LIST_DEFAULT_FIELDS, WORK_LIST_FIELDS, WORK_LIST_ORDERING,
+    dashboard_charts, home_faqs, mineral_type_questions, mineral_type_stages, search_faqs,
+    selection_works, user_charts, user_import_logs,
+)
+from .scheduling import apply_schedule_changes, prepare_chart_data
+from .chart_metrics import summarize_chart_data
+from .stats import get_admin_stats
+from .data_grid import GRIDS, grid_page, sort_links
+from .bulk import EDIT_FORMS, apply_cell_changes, bulk_set_field, editable_fields, revert_bulk_edit
+from .chart_queries import CHART_REFERENCES, charts_referencing
+from .deletion import DELETABLE_MODELS, TRASH_RETENTION_DAYS, delete_object, deletion_impact, restore_trash_entry
+from .rendering import RENDERERS
+from .exporters import EXPORTERS, plan_start_date
+from .artifacts import chart_version, get_or_build, download_name
+from .scenarios import diff_schedules, get_scenario_chart_data, normalize_delta, scenario_chart_data
+from .archive import ARCHIVE_CHART_FIELDS, ARCHIVE_FORMATS, archive_name, iter_archive
+from .models import BulkEditJournal, DataImportLog, TrashEntry
 from .admin_forms import ( 
     MineralTypeForm, StageForm, WorkForm, 
     QuestionForm, FAQForm, DataImportForm,
@@ -14,13 +34,9 @@ from .admin_forms import (
 )
 import json
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-import pandas as pd
-from io import BytesIO, StringIO
-import tempfile
-import os
 from django.contrib.auth.decorators import user_passes_test
 
 
@@ -53,194 +69,49 @@ class HomeView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['faqs'] = FAQ.objects.filter(is_active=True).order_by('order')[:5]
+        context['faqs'] = home_faqs()
         return context
 
+DASHBOARD_DELETED_CHARTS = 5
+DASHBOARD_SORT_LABELS = (
+    ('created', 'по дате'),
+    ('duration', 'по длительности'),
+    ('works', 'по числу работ'),
+    ('title', 'по названию'),
+)
 @login_required
 def dashboard(request):
     """
     Личный кабинет пользователя
     """
-    user_charts = UserGanttChart.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'roadmap_app/dashboard.html', {
-        'charts': user_charts
-    })
-
-def prepare_chart_data(mineral_type, start_stage, question):
-    """
-    Подготавливает данные для диаграммы Ганта с правильными зависимостями
-    """
-    # Получаем все этапы для данного типа ПИ, упорядоченные
-    all_stages = Stage.objects.filter(
-        mineral_type=mineral_type
-    ).prefetch_related('depends_on', 'works').order_by('order')
-    
-    # Создаем словарь для быстрого доступа
-    stage_dict = {stage.id: stage for stage in all_stages}
+    sort = request.GET.get('sort', 'created')
+    if sort not in DASHBOARD_SORTS:
+        sort = 'created'
     
-    # Определяем, до каких этапов нужно идти
-    target_stage_ids = set()
-    
-    if question:
-        # Берем целевые этапы из вопроса
-        target_stage_ids = set(question.target_stages.filter(
-            mineral_type=mineral_type
-        ).values_list('id', flat=True))
-    else:
-        # Если вопроса нет, идем до конца всех этапов
-        start_order = start_stage.order
-        target_stage_ids = set(
-            stage.id for stage in all_stages 
-            if stage.order >= start_order
+    try:
+        charts, next_cursor = keyset_page(
+            dashboard_charts(request.user),
+            DASHBOARD_SORTS[sort],
+            cursor=request.GET.get('after'),
+            limit=DASHBOARD_PAGE_SIZE
         )
+    except ValueError:
+        return redirect('dashboard')
     
-    # Функция для топологической сортировки этапов с учетом зависимостей
-    def topological_sort(stage_ids):
-        visited = set()
-        stack = []
-        
-        def dfs(stage_id):
-            if stage_id in visited:
-                return
-            visited.add(stage_id)
-            
-            stage = stage_dict.get(stage_id)
-            if stage:
-                # Сначала посещаем зависимости
-                for dep in stage.depends_on.all():
-                    if dep.mineral_type == mineral_type:
-                        dfs(dep.id)
-                
-                # Затем добавляем текущий этап
-                if stage_id in stage_ids:
-                    stack.append(stage_id)
-        
-        for stage_id in sorted(stage_ids, key=lambda x: stage_dict[x].order):
-            dfs(stage_id)
-        
-        return stack
-    
-    # Получаем этапы в правильном порядке с учетом зависимостей
-    included_stage_ids = topological_sort(target_stage_ids)
-    
-    # Добавляем начальный этап, если его еще нет
-    if start_stage.id not in included_stage_ids:
-        # Находим его место с учетом зависимостей
-        included_stage_ids.insert(0, start_stage.id)
-    
-    # Фильтруем этапы, которые идут после начального
-    included_stages = [
-        stage_dict[stage_id] for stage_id in included_stage_ids
-        if stage_dict[stage_id].order >= start_stage.order
-    ]
-    
-    # Сортируем по порядку
-    included_stages.sort(key=lambda x: x.order)
-    
-    # Подготавливаем данные для каждого этапа
-    stages_data = []
-    current_global_time = 0
-    
-    for stage in included_stages:
-        # Рассчитываем начало этапа с учетом максимального времени окончания зависимостей
-        stage_start = current_global_time
-        
-        # Если есть зависимости, находим максимальное время их окончания
-        if stage.depends_on.exists():
-            max_dep_end = 0
-            for dep in stage.depends_on.all():
-                if dep.id in [s.id for s in included_stages]:
-                    # Находим предыдущий этап в списке
-                    for prev_stage in stages_data:
-                        if prev_stage['id'] == dep.id:
-                            dep_end = prev_stage['start'] + prev_stage['duration']
-                            if dep_end > max_dep_end:
-                                max_dep_end = dep_end
-            
-            if max_dep_end > stage_start:
-                stage_start = max_dep_end
-        
-        # Получаем работы для этого этапа
-        works = stage.works.all().order_by('order')
-        works_data = []
-        
-        for work in works:
-            works_data.append({
-                'id': work.id,
-                'number': work.number,
-                'title': work.title,
-                'description': work.description,
-                'executor': work.executor,
-                'duration_months': work.duration_months, 
-                'start_month': work.start_month,  # Используем start_month вместо start_in_stage
-                'order': work.order
-            })
-        
-        # Рассчитываем длительность этапа
-        stage_duration = stage.duration_months
-        if works_data:
-            # ИСПРАВЛЕНИЕ: Используем правильные ключи
-            max_work_end = 0
-            for w in works_data:
-                work_start = w.get('start_month', 0)  # Используем start_month
-                work_duration = w.get('duration_months', 1)
-                work_end = work_start + work_duration
-                if work_end > max_work_end:
-                    max_work_end = work_end
-            
-            if max_work_end > stage_duration:
-                stage_duration = max_work_end
-        
-        # Добавляем зависимости для отрисовки стрелок
-        dependencies = []
-        for dep in stage.depends_on.all():
-            if dep.mineral_type == mineral_type:
-                dependencies.append(dep.id)
-        
-        stage_data = {
-            'id': stage.id,
-            'name': stage.name,
-            'order': stage.order,
-            'description': stage.description,
-            'color': stage.color,
-            'start': stage_start,
-            'duration': stage_duration,
-            'works': works_data,
-            'dependencies': dependencies,
-            'total_duration': stage_duration
-        }
-        
-        stages_data.append(stage_data)
-        current_global_time = stage_start + stage_duration
-    
-    # Обновляем works_data с глобальным временем
-    for stage_data in stages_data:
-        for work in stage_data['works']:
-            work['start_global'] = stage_data['start'] + work.get('start_month', 0)
-            # Добавляем совместимость со старым ключом
-            work['start_in_stage'] = work.get('start_month', 0)
-    
-    # Общая длительность
-    total_duration = current_global_time
+    # Недавно удаленные диаграммы можно вернуть из корзины
+    deleted_charts = TrashEntry.objects.filter(
+        user=request.user, model_type='chart', restored_at__isnull=True
+    ).only('id', 'label', 'created_at')[:DASHBOARD_DELETED_CHARTS]
     
-    return {
-        'mineral_type': {
-            'id': mineral_type.id,
-            'name': mineral_type.name,
-            'code': mineral_type.code
-        },
-        'start_stage': {
-            'id': start_stage.id,
-            'name': start_stage.name
-        },
-        'question': {
-            'id': question.id,
-            'text': question.text,
-            'code': question.code
-        } if question else None,
-        'stages': stages_data,
-        'total_duration': total_duration
-    }
+    return render(request, 'roadmap_app/dashboard.html', {
+        'charts': charts,
+        'deleted_charts': deleted_charts,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+        'sort': sort,
+        'sort_options': DASHBOARD_SORT_LABELS,
+        'archive_formats': ARCHIVE_FORMATS
+    })
 
 @login_required
 def create_gantt(request):
@@ -261,7 +132,10 @@ def create_gantt(request):
                 question = form.cleaned_data['question_id']
                 
                 # Подготавливаем данные для диаграммы
-                chart_data = prepare_chart_data(mineral_type, start_stage, question)
+                chart_data = prepare_chart_data(
+                    mineral_type, start_stage, question,
+                    leveling=form.leveling_options()
+                )
                 
                 # Сохраняем данные в диаграмме
                 chart.chart_data = chart_data
@@ -287,7 +161,9 @@ def create_gantt(request):
     
     return render(request, 'roadmap_app/create_gantt.html', {
         'form': form,
-        'mineral_types': mineral_types
+        'mineral_types': mineral_types,
+        # Предпросмотр загружает работы этапа страницами максимального размера
+        'works_page_size': MAX_PAGE_SIZE
     })
 
 @login_required
@@ -295,7 +171,8 @@ def view_gantt(request, chart_id):
     """
     Просмотр конкретной диаграммы Ганта
     """
-    chart = get_object_or_404(UserGanttChart, id=chart_id, user=request.user)
+    from .calendars import chart_dates
+    chart = get_object_or_404(user_charts(request.user), id=chart_id)
     
     # Отладка - посмотрим, что хранится в chart_data
     print("Chart data:", chart.chart_data)
@@ -313,6 +190,10 @@ def view_gantt(request, chart_id):
             }
         else:
             chart_data = chart.chart_data
+            try:
+                chart_data = {**chart_data, 'dates': chart_dates(chart)}
+            except ValueError as e:
+                messages.warning(request, str(e))
             
         # Преобразуем данные в JSON
         chart_data_json = json.dumps(chart_data, ensure_ascii=False, default=str)
@@ -329,9 +210,294 @@ def view_gantt(request, chart_id):
     
     return render(request, 'roadmap_app/gantt_chart.html', {
         'chart': chart,
-        'chart_data_json': chart_data_json
+        'chart_data_json': chart_data_json,
+        'chart_version': chart_version(chart)
     })
 
+@login_required
+@require_http_methods(['PATCH'])
+def update_chart_schedule(request, chart_id):
+    """
+    Правка сроков работ и этапов: {version, changes}. Ответ — только
+    изменившиеся полосы и новая версия диаграммы.
+    
+    version — версия диаграммы, которую видел клиент; если диаграмму
+    успели изменить, ответ 409 с текущей версией и правка не применяется.
+    """
+    from .calendars import changed_dates, chart_dates
+    chart = get_object_or_404(user_charts(request.user), id=chart_id)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+        version = int(payload.get('version'))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Ожидается JSON с version и changes'}, status=400)
+    
+    if version != chart_version(chart):
+        return JsonResponse({
+            'success': False,
+            'error': 'Диаграмма изменена в другом окне, обновите страницу',
+            'version': chart_version(chart)
+        }, status=409)
+    
+    chart_data = chart.chart_data or {}
+    try:
+        dates_before = chart_dates(chart)
+        diff = apply_schedule_changes(chart_data, payload.get('changes'))
+        # Календарные даты могут сдвинуться и у этапов, чьи сроки в месяцах не изменились
+        diff['dates'] = changed_dates(dates_before, chart_dates(chart, chart_data))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Запись только если с момента чтения диаграмма не менялась;
+    # update() обходит save(), поэтому сводные колонки пересчитываются здесь же
+    updated_at = timezone.now()
+    saved = UserGanttChart.objects.filter(id=chart.id, updated_at=chart.updated_at).update(
+        chart_data=chart_data, updated_at=updated_at, **summarize_chart_data(chart_data)
+    )
+    if not saved:
+        chart.refresh_from_db(fields=['updated_at'])
+        return JsonResponse({
+            'success': False,
+            'error': 'Диаграмма изменена в другом окне, обновите страницу',
+            'version': chart_version(chart)
+        }, status=409)
+    
+    chart.updated_at = updated_at
+    return JsonResponse({'success': True, 'version': chart_version(chart), **diff})
+
+@login_required
+def export_gantt(request, chart_id, export_format):
+    """
+    Серверный экспорт диаграммы: SVG, PDF, PNG (параметр dpi),
+    XLSX, MS Project XML и ICS
+    """
+    if export_format in RENDERERS:
+        renderer, content_type = RENDERERS[export_format]
+    elif export_format in EXPORTERS:
+        renderer, content_type = EXPORTERS[export_format]
+    else:
+        raise Http404('Неизвестный формат экспорта')
+    
+    chart = get_object_or_404(UserGanttChart, id=chart_id, user=request.user)
+    options = {'title': chart.title}
+    variant = ''
+    
+    if export_format in EXPORTERS:
+        options['start_date'] = plan_start_date(chart)
+        options['stamp'] = chart.updated_at
+    elif export_format == 'png':
+        try:
+            dpi = int(request.GET.get('dpi', 150))
+        except ValueError:
+            dpi = 150
+        options['dpi'] = min(max(dpi, 72), 600)
+        variant = f"dpi{options['dpi']}"
+    
+    def build(out):
+        if export_format in EXPORTERS:
+            from .calendars import export_dates
+            # Даты по рабочему календарю диаграммы, как на ее странице
+            options['dates'] = export_dates(chart)
+        renderer(chart.chart_data or {}, out, **options)
+    
+    path = get_or_build(chart, export_format, build, variant=variant)
+    
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=download_name(chart, export_format),
+        content_type=content_type
+    )
+
+@login_required
+def chart_risk(request, chart_id):
+    """
+    Анализ рисков сроков методом Монте-Карло: перцентили окончания
+    и индексы критичности этапов. Параметры: iterations, distribution (pert, triangular)
+    """
+    from .risk import DISTRIBUTIONS, RISK_DEFAULT_ITERATIONS, RISK_MAX_ITERATIONS, get_chart_risk
+    chart = get_object_or_404(
+        UserGanttChart.objects.only('id', 'anchor_date', 'created_at', 'updated_at', 'chart_data'),
+        id=chart_id, user=request.user
+    )
+    
+    distribution = request.GET.get('distribution', 'pert')
+    try:
+        iterations = parse_limit(request.GET.get('iterations'), default=RISK_DEFAULT_ITERATIONS, maximum=RISK_MAX_ITERATIONS)
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f'Неизвестное распределение: {distribution}')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    result = get_chart_risk(chart, iterations=iterations, distribution=distribution)
+    return JsonResponse({'success': True, **result})
+
+def _scenario_json(scenario):
+    return {
+        'id': scenario.id,
+        'name': scenario.name,
+        'delta': scenario.delta,
+        'total_duration': scenario.total_duration,
+        'updated_at': scenario.updated_at.isoformat(),
+    }
+
+def _read_scenario_payload(request, scenario=None):
+    """
+    Название и отличия варианта из JSON-тела запроса; ошибки — ValueError
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        raise ValueError('Тело запроса должно быть JSON')
+    if not isinstance(payload, dict):
+        raise ValueError('Тело запроса должно быть объектом')
+    
+    name = str(payload.get('name', scenario.name if scenario else '')).strip()
+    if not name:
+        raise ValueError('Укажите название варианта')
+    delta = normalize_delta(payload['delta']) if 'delta' in payload else (scenario.delta if scenario else {})
+    return name[:200], delta
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def chart_scenarios(request, chart_id):
+    """
+    Варианты диаграммы: GET — список, POST — новый вариант {name, delta}
+    """
+    chart = get_object_or_404(UserGanttChart, id=chart_id, user=request.user)
+    
+    if request.method == 'GET':
+        return JsonResponse({
+            'success': True,
+            'scenarios': [_scenario_json(scenario) for scenario in chart.scenarios.all()]
+        })
+    
+    try:
+        name, delta = _read_scenario_payload(request)
+        chart_data = scenario_chart_data(chart, delta)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    scenario = ChartScenario.objects.create(
+        chart=chart, name=name, delta=delta,
+        total_duration=chart_data.get('total_duration') or 0
+    )
+    return JsonResponse({'success': True, 'scenario': _scenario_json(scenario)}, status=201)
+
+@login_required
+@require_http_methods(['GET', 'POST', 'DELETE'])
+def chart_scenario(request, chart_id, scenario_id):
+    """
+    Вариант диаграммы: GET — расписание варианта, POST — изменение
+    названия или отличий, DELETE — удаление
+    """
+    scenario = get_object_or_404(
+        ChartScenario.objects.select_related('chart'),
+        id=scenario_id, chart_id=chart_id, chart__user=request.user
+    )
+    
+    if request.method == 'DELETE':
+        scenario.delete()
+        return JsonResponse({'success': True})
+    
+    if request.method == 'POST':
+        try:
+            scenario.name, scenario.delta = _read_scenario_payload(request, scenario)
+            chart_data = scenario_chart_data(scenario.chart, scenario.delta)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        scenario.total_duration = chart_data.get('total_duration') or 0
+        scenario.save()
+    
+    return JsonResponse({
+        'success': True,
+        'scenario': _scenario_json(scenario),
+        'chart_data': get_scenario_chart_data(scenario)
+    })
+
+@login_required
+def chart_scenario_diff(request, chart_id):
+    """
+    Сравнение расписаний: параметры a и b — id варианта или base (базовая диаграмма)
+    """
+    chart = get_object_or_404(UserGanttChart, id=chart_id, user=request.user)
+    
+    def schedule(reference):
+        if reference in (None, '', 'base'):
+            return chart.chart_data or {}
+        try:
+            scenario_id = int(reference)
+        except ValueError:
+            raise ValueError(f'Некорректный вариант: {reference}')
+        scenario = chart.scenarios.filter(id=scenario_id).first()
+        if scenario is None:
+            raise ValueError(f'Вариант {scenario_id} не найден')
+        # Базовая диаграмма уже загружена, повторно ее не читаем
+        scenario.chart = chart
+        return get_scenario_chart_data(scenario)
+    
+    try:
+        diff = diff_schedules(schedule(request.GET.get('a')), schedule(request.GET.get('b')))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, **diff})
+
+@login_required
+def export_charts_archive(request):
+    """
+    Потоковый ZIP-архив с выбранными (ids) или всеми диаграммами пользователя
+    в форматах formats: json, csv, xlsx
+    """
+    formats = [f for f in ARCHIVE_FORMATS if f in request.GET.getlist('formats')] or list(ARCHIVE_FORMATS)
+    charts = UserGanttChart.objects.filter(user=request.user)
+    
+    ids = request.GET.getlist('ids')
+    if ids:
+        try:
+            charts = charts.filter(id__in=[int(chart_id) for chart_id in ids])
+        except ValueError:
+            messages.error(request, 'Некорректный список диаграмм')
+            return redirect('dashboard')
+    
+    if not charts.exists():
+        messages.warning(request, 'Нет диаграмм для экспорта')
+        return redirect('dashboard')
+    
+    charts = charts.only(*ARCHIVE_CHART_FIELDS).order_by('id').iterator(chunk_size=50)
+    response = StreamingHttpResponse(iter_archive(charts, formats), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{archive_name()}"'
+    return response
+
+@login_required
+def portfolio(request):
+    """
+    Портфель: все диаграммы пользователя на общей шкале и загрузка исполнителей
+    """
+    from .portfolio import PORTFOLIO_EXECUTOR_CAPACITY
+    return render(request, 'roadmap_app/portfolio.html', {
+        'capacity': PORTFOLIO_EXECUTOR_CAPACITY
+    })
+
+@login_required
+def portfolio_data(request):
+    """
+    Данные портфеля для отрисовки. Параметры: ids (подмножество диаграмм),
+    capacity (допустимое число одновременных работ исполнителя),
+    points (максимум точек в рядах загрузки)
+    """
+    from .portfolio import PORTFOLIO_EXECUTOR_CAPACITY, PORTFOLIO_MAX_POINTS, get_portfolio
+    try:
+        chart_ids = [int(chart_id) for chart_id in request.GET.getlist('ids')]
+        capacity = parse_limit(request.GET.get('capacity'), default=PORTFOLIO_EXECUTOR_CAPACITY, maximum=1000)
+        max_points = parse_limit(request.GET.get('points'), default=PORTFOLIO_MAX_POINTS, maximum=1000)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Некорректные параметры'}, status=400)
+    
+    data = get_portfolio(request.user, chart_ids, capacity=capacity, max_points=max_points)
+    return JsonResponse({'success': True, **data})
+
 @login_required
 def get_filtered_stages(request):
     """AJAX запрос для получения этапов по выбранному типу ПИ"""
@@ -342,9 +508,7 @@ def get_filtered_stages(request):
     
     try:
         mineral_type = MineralType.objects.get(id=mineral_type_id)
-        stages = Stage.objects.filter(
-            mineral_type=mineral_type
-        ).order_by('order').values('id', 'name', 'order', 'description')
+        stages = mineral_type_stages(mineral_type.id)
         
         return JsonResponse({
             'stages': list(stages),
@@ -364,9 +528,7 @@ def get_filtered_questions(request):
     
     try:
         mineral_type = MineralType.objects.get(id=mineral_type_id)
-        questions = Question.objects.filter(
-            mineral_types=mineral_type
-        ).values('id', 'text', 'code', 'description')
+        questions = mineral_type_questions(mineral_type.id)
         
         return JsonResponse({
             'questions': list(questions),
@@ -376,42 +538,66 @@ def get_filtered_questions(request):
     except MineralType.DoesNotExist:
         return JsonResponse({'questions': [], 'success': False})
 
+def _parse_optional_id(value, name):
+    if value in (None, '', 'null', 'None'):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректный параметр {name}')
+
 @login_required
 def get_works_for_selection(request):
     """
     AJAX запрос для получения работ по выбранным параметрам
+
+    Параметры: mineral_type (обязательный), stage, question, executor,
+    fields (список полей через запятую), limit и cursor для постраничной
+    выборки. Все фильтры собираются в один запрос по индексу Work(stage, order).
     """
-    mineral_type_id = request.GET.get('mineral_type')
-    stage_id = request.GET.get('stage')
-    question_id = request.GET.get('question')
-    
-    if not mineral_type_id or not stage_id:
-        return JsonResponse({'works': []})
-    
     try:
-        # Используем реальные модели
-        works = Work.objects.filter(stage_id=stage_id)
-        
-        works_data = []
-        for work in works.order_by('order'):
-            works_data.append({
-                'id': work.id,
-                'number': work.number,
-                'title': work.title,
-                'description': work.description,
-                'executor': work.executor,
-                'duration_months': work.duration_months, 
-                'start_month': work.start_month, 
-                'order': work.order
-            })
-        
-        return JsonResponse({
-            'works': works_data,
-            'success': True
-        })
-        
-    except Exception:
-        return JsonResponse({'works': [], 'success': False})
+        mineral_type_id = _parse_optional_id(request.GET.get('mineral_type'), 'mineral_type')
+        stage_id = _parse_optional_id(request.GET.get('stage'), 'stage')
+        question_id = _parse_optional_id(request.GET.get('question'), 'question')
+        limit = parse_limit(request.GET.get('limit'))
+
+        fields_param = request.GET.get('fields')
+        if fields_param:
+            fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+            unknown = [f for f in fields if f not in WORK_LIST_FIELDS]
+            if unknown:
+                raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+        else:
+            fields = list(WORK_LIST_DEFAULT_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'works': [], 'success': False, 'error': str(e)}, status=400)
+
+    if not mineral_type_id:
+        return JsonResponse({'works': [], 'success': True, 'next_cursor': None})
+
+    works = selection_works(
+        mineral_type_id, stage_id=stage_id, question_id=question_id,
+        executor=request.GET.get('executor', '').strip()
+    )
+
+    # Поля ключа сортировки нужны для курсора, поэтому выбираются всегда
+    selected = list(dict.fromkeys([*fields, *WORK_LIST_ORDERING]))
+
+    try:
+        rows, next_cursor = keyset_page(
+            works.values(*selected),
+            WORK_LIST_ORDERING,
+            cursor=request.GET.get('cursor'),
+            limit=limit
+        )
+    except ValueError as e:
+        return JsonResponse({'works': [], 'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'works': rows,
+        'next_cursor': next_cursor,
+        'success': True
+    })
 
 @login_required
 def delete_gantt(request, chart_id):
@@ -421,8 +607,8 @@ def delete_gantt(request, chart_id):
     chart = get_object_or_404(UserGanttChart, id=chart_id, user=request.user)
     
     if request.method == 'POST':
-        chart.delete()
-        messages.success(request, 'Диаграмма успешно удалена')
+        delete_object('chart', chart.id, user=request.user, trash=True)
+        messages.success(request, 'Диаграмма удалена, ее можно восстановить из списка удаленных')
         return redirect('dashboard')
     
     return render(request, 'roadmap_app/confirm_delete.html', {'chart': chart})
@@ -432,15 +618,7 @@ def faq_search(request):
     Поиск по FAQ
     """
     query = request.GET.get('q', '')
-    faqs = FAQ.objects.filter(is_active=True)
-    
-    if query:
-        # Ищем по ключевым словам и тексту вопроса
-        faqs = faqs.filter(
-            Q(question__icontains=query) |
-            Q(answer__icontains=query) |
-            Q(keywords__icontains=query)
-        )
+    faqs = search_faqs(query)
     
     return render(request, 'roadmap_app/faq_search.html', {
         'faqs': faqs,
@@ -454,20 +632,15 @@ def admin_dashboard(request):
     Административная панель для управления данными
     """
     
-    # Статистика
-    stats = {
-        'mineral_types': MineralType.objects.count(),
-        'stages': Stage.objects.count(),
-        'works': Work.objects.count(),
-        'questions': Question.objects.count(),
-        'faqs': FAQ.objects.count(),
-        'recent_imports': DataImportLog.objects.filter(
-            user=request.user
-        ).order_by('-created_at')[:5] if hasattr(DataImportLog, 'user') else []
-    }
+    # Счетчики берутся из кэша (один агрегирующий запрос при промахе)
+    stats = get_admin_stats()
+    
+    # Последние импорты зависят от пользователя и не кэшируются
+    recent_imports = user_import_logs(request.user)[:RECENT_IMPORT_COUNT]
     
     return render(request, 'admin/admin_dashboard.html', {
-        'stats': stats
+        'stats': stats,
+        'recent_imports': recent_imports
     })
 
 @login_required
@@ -475,22 +648,26 @@ def admin_dashboard(request):
 def data_management(request, model_type):
     """
     Управление данными конкретного типа
+
+    Таблица выводится постранично (см. data_grid); с format=json
+    возвращается страница для подгрузки при прокрутке.
     """
     
-    # Определяем модель по типу
-    model_map = {
-        'mineral_type': MineralType,
-        'stage': Stage,
-        'work': Work,
-        'question': Question,
-        'faq': FAQ,
-    }
-    
-    if model_type not in model_map:
+    if model_type not in GRIDS:
         return redirect('admin_dashboard')
     
-    model = model_map[model_type]
-    items = model.objects.all()
+    model = GRIDS[model_type]['model']
+    
+    try:
+        page = grid_page(model_type, request.GET)
+    except ValueError as e:
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        messages.error(request, f'❌ {e}')
+        return redirect('data_management', model_type=model_type)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'success': True, **page})
     
     # Определяем форму для добавления
     form_map = {
@@ -512,14 +689,46 @@ def data_management(request, model_type):
     else:
         form = form_class()
     
+    columns = sort_links(page)
+    editable = set(editable_fields(model_type))
+    for column in columns:
+        column['editable'] = column['key'] in editable
+    
     return render(request, 'admin/data_management.html', {
         'model_type': model_type,
         'model_name': model._meta.verbose_name_plural,
-        'items': items,
+        'grid': page,
+        'columns': columns,
+        'rows': [(row['id'], [(column, row[column['key']]) for column in columns]) for row in page['rows']],
+        'mineral_types': MineralType.objects.order_by('name').values('id', 'name') if 'mineral_type' in GRIDS[model_type]['filters'] else None,
         'form': form,
-        'total_count': items.count()
+        # Счетчики берутся из кэша статистики, без COUNT по всей таблице
+        'total_count': get_admin_stats()[GRIDS[model_type]['stat']]
     })
 
+@login_required
+@moderator_required
+@require_http_methods(['POST'])
+def update_data_cells(request, model_type):
+    """
+    Пакетная правка ячеек таблицы: {changes: [{id, field, value}, ...]}.
+    
+    Все изменения проверяются вместе и записываются одной транзакцией;
+    при ошибках не записывается ничего, ответ 400 с ошибками по ячейкам.
+    """
+    if model_type not in EDIT_FORMS:
+        return JsonResponse({'success': False, 'error': 'Неизвестный тип данных'}, status=404)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+        result = apply_cell_changes(model_type, payload.get('changes'))
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Ожидается JSON со списком changes'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse(result, status=200 if result['success'] else 400)
+
 @login_required
 @moderator_required
 def edit_data(request, model_type, item_id):
@@ -574,39 +783,87 @@ def edit_data(request, model_type, item_id):
 @moderator_required
 def delete_data(request, model_type, item_id):
     """
-    Удаление записи
+    Удаление записи: на GET — предпросмотр каскада, на POST — удаление
+    (по умолчанию в корзину)
     """
-    
-    model_map = {
-        'mineral_type': MineralType,
-        'stage': Stage,
-        'work': Work,
-        'question': Question,
-        'faq': FAQ,
-    }
-    
-    if model_type not in model_map:
+    if model_type not in EDIT_FORMS:
         return redirect('admin_dashboard')
     
-    model = model_map[model_type]
+    model = DELETABLE_MODELS[model_type]
     item = get_object_or_404(model, id=item_id)
     
     if request.method == 'POST':
-        item.delete()
-        messages.success(request, f'✅ Запись успешно удалена')
+        trash = bool(request.POST.get('to_trash'))
+        try:
+            impact, entry = delete_object(model_type, item.id, user=request.user, trash=trash)
+        except ValueError as e:
+            messages.error(request, f'❌ {e}')
+            return redirect('delete_data', model_type=model_type, item_id=item.id)
+        total = sum(entry['count'] for entry in impact if entry['kind'] == 'rows')
+        where = ' и перемещена в корзину' if trash else ''
+        messages.success(request, f'✅ Запись удалена{where} (удалено строк: {total})')
         return redirect('data_management', model_type=model_type)
     
     return render(request, 'admin/confirm_delete.html', {
         'model_type': model_type,
-        'item': item
+        'model_name': model._meta.verbose_name,
+        'item': item,
+        'impact': deletion_impact(model_type, item.id),
+        # Сохраненные диаграммы содержат копию справочника и после удаления не меняются
+        'chart_count': charts_referencing(model_type, item.id).count() if model_type in CHART_REFERENCES else 0,
+        'retention_days': TRASH_RETENTION_DAYS,
+    })
+
+@login_required
+@moderator_required
+def trash(request):
+    """
+    Корзина: удаленные записи справочника и диаграммы
+    """
+    entries = TrashEntry.objects.select_related('user').defer('payload')
+    
+    try:
+        page, next_cursor = keyset_page(
+            entries, ('-created_at', '-id'), cursor=request.GET.get('after'), limit=parse_limit(request.GET.get('limit'))
+        )
+    except ValueError:
+        return redirect('trash')
+    
+    return render(request, 'admin/trash.html', {
+        'entries': page,
+        'next_cursor': next_cursor,
+        'retention_days': TRASH_RETENTION_DAYS,
     })
 
+@login_required
+@require_http_methods(['POST'])
+def restore_trash(request, entry_id):
+    """
+    Восстановление из корзины: диаграмму — владелец, справочник — модератор
+    """
+    entry = get_object_or_404(TrashEntry, id=entry_id)
+    is_moderator = check_moderator(request.user)
+    if not is_moderator and not (entry.model_type == 'chart' and entry.user_id == request.user.id):
+        raise Http404
+    
+    try:
+        restore_trash_entry(entry)
+    except ValueError as e:
+        messages.error(request, f'❌ {e}')
+    else:
+        messages.success(request, f'↩️ Восстановлено: {entry.label}')
+    
+    if entry.model_type == 'chart' and not is_moderator:
+        return redirect('dashboard')
+    return redirect('trash')
+
 @login_required
 @moderator_required
 def import_data(request):
     """
     Импорт данных из файла
     """
+    from .data_exchange import process_import_file
     
     if request.method == 'POST':
         form = DataImportForm(request.POST, request.FILES)
@@ -649,160 +906,13 @@ def import_data(request):
     
     return render(request, 'admin/import_data.html', {'form': form})
 
-def process_import_file(import_log, import_mode, validate_data=True):
-    """
-    Обработка файла импорта
-    """
-    result = {
-        'success': False,
-        'imported_count': 0,
-        'error_count': 0,
-        'errors': []
-    }
-    
-    try:
-        file_path = import_log.import_file.path
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        # Чтение файла в зависимости от формата
-        if file_ext == '.json':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                df = pd.DataFrame(data)
-        elif file_ext == '.csv':
-            df = pd.read_csv(file_path, encoding='utf-8')
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path)
-        else:
-            raise ValueError(f'Неподдерживаемый формат файла: {file_ext}')
-        
-        # Обработка данных в зависимости от типа модели
-        model_map = {
-            'mineral_type': MineralType,
-            'stage': Stage,
-            'work': Work,
-            'question': Question,
-            'faq': FAQ,
-        }
-        
-        model = model_map.get(import_log.model_type)
-        if not model:
-            raise ValueError(f'Неизвестный тип модели: {import_log.model_type}')
-        
-        # Валидация данных
-        if validate_data:
-            validation_errors = validate_import_data(df, import_log.model_type)
-            if validation_errors:
-                result['errors'] = validation_errors
-                result['error_count'] = len(validation_errors)
-                return result
-        
-        # Импорт данных
-        imported_count = 0
-        for _, row in df.iterrows():
-            try:
-                data_dict = row.to_dict()
-                
-                if import_mode == 'create':
-                    # Создание новой записи
-                    instance = model(**data_dict)
-                    instance.save()
-                    imported_count += 1
-                    
-                elif import_mode == 'update':
-                    # Обновление существующей записи
-                    # Предполагаем, что есть поле 'id' или 'code' для поиска
-                    if 'id' in data_dict and data_dict['id']:
-                        instance = model.objects.filter(id=data_dict['id']).first()
-                    elif 'code' in data_dict:
-                        instance = model.objects.filter(code=data_dict['code']).first()
-                    else:
-                        result['errors'].append(f'Нет идентификатора для обновления: {data_dict}')
-                        result['error_count'] += 1
-                        continue
-                    
-                    if instance:
-                        for key, value in data_dict.items():
-                            if hasattr(instance, key):
-                                setattr(instance, key, value)
-                        instance.save()
-                        imported_count += 1
-                    else:
-                        result['errors'].append(f'Запись не найдена: {data_dict}')
-                        result['error_count'] += 1
-                        
-                elif import_mode == 'upsert':
-                    # Создание или обновление
-                    if 'id' in data_dict and data_dict['id']:
-                        instance, created = model.objects.update_or_create(
-                            id=data_dict['id'],
-                            defaults=data_dict
-                        )
-                    elif 'code' in data_dict:
-                        instance, created = model.objects.update_or_create(
-                            code=data_dict['code'],
-                            defaults=data_dict
-                        )
-                    else:
-                        result['errors'].append(f'Нет идентификатора для upsert: {data_dict}')
-                        result['error_count'] += 1
-                        continue
-                    
-                    imported_count += 1
-                
-            except Exception as e:
-                result['errors'].append(f'Ошибка обработки строки {_}: {str(e)}')
-                result['error_count'] += 1
-        
-        result['imported_count'] = imported_count
-        result['success'] = imported_count > 0
-        
-    except Exception as e:
-        result['errors'].append(f'Ошибка обработки файла: {str(e)}')
-        result['error_count'] += 1
-    
-    return result
-
-def validate_import_data(df, model_type):
-    """
-    Валидация импортируемых данных
-    """
-    errors = []
-    
-    # Базовые проверки
-    if df.empty:
-        errors.append('Файл пустой')
-        return errors
-    
-    # Проверки в зависимости от типа модели
-    if model_type == 'mineral_type':
-        required_fields = ['name', 'code']
-        for field in required_fields:
-            if field not in df.columns:
-                errors.append(f'Отсутствует обязательное поле: {field}')
-        
-        # Проверка уникальности кодов
-        if 'code' in df.columns:
-            duplicates = df[df['code'].duplicated()]
-            if not duplicates.empty:
-                errors.append(f'Найдены дублирующиеся коды: {duplicates["code"].tolist()}')
-    
-    elif model_type == 'stage':
-        required_fields = ['mineral_type', 'name', 'code', 'order']
-        for field in required_fields:
-            if field not in df.columns:
-                errors.append(f'Отсутствует обязательное поле: {field}')
-    
-    # ... дополнительные проверки для других моделей
-    
-    return errors
-
 @login_required
 @moderator_required
 def export_data(request):
     """
     Экспорт данных
     """
+    from .data_exchange import write_export
     
     if request.method == 'POST':
         form = ExportDataForm(request.POST)
@@ -810,42 +920,20 @@ def export_data(request):
             model_type = form.cleaned_data['model_type']
             export_format = form.cleaned_data['format']
             
-            # Получение данных
-            model_map = {
-                'mineral_type': MineralType,
-                'stage': Stage,
-                'work': Work,
-                'question': Question,
-                'faq': FAQ,
-            }
-            
-            model = model_map.get(model_type)
-            queryset = model.objects.all()
-            
-            # Конвертация в DataFrame
-            data = list(queryset.values())
-            df = pd.DataFrame(data)
-            
             # Создание файла
             if export_format == 'json':
                 response = HttpResponse(content_type='application/json')
                 response['Content-Disposition'] = f'attachment; filename="{model_type}_export.json"'
-                df.to_json(response, orient='records', force_ascii=False, indent=2)
                 
             elif export_format == 'csv':
-                response = HttpResponse(content_type='text/csv')
+                response = HttpResponse(content_type='text/csv; charset=utf-8')
                 response['Content-Disposition'] = f'attachment; filename="{model_type}_export.csv"'
-                df.to_csv(response, index=False, encoding='utf-8-sig')
                 
             elif export_format == 'excel':
                 response = HttpResponse(content_type='application/vnd.ms-excel')
                 response['Content-Disposition'] = f'attachment; filename="{model_type}_export.xlsx"'
-                
-                with BytesIO() as bio:
-                    with pd.ExcelWriter(bio, engine='openpyxl') as writer:
-                        df.to_excel(writer, index=False, sheet_name='Data')
-                    response.write(bio.getvalue())
             
+            write_export(model_type, export_format, response)
             return response
     else:
         form = ExportDataForm()
@@ -859,7 +947,7 @@ def import_logs(request):
     Просмотр логов импорта
     """
     
-    logs = DataImportLog.objects.filter(user=request.user).order_by('-created_at')
+    logs = user_import_logs(request.user)
     
     return render(request, 'admin/import_logs.html', {
         'logs': logs
@@ -889,42 +977,52 @@ def log_detail(request, log_id):
 def bulk_edit(request):
     """
     Массовое редактирование
+
+    Значение приводится и проверяется полем модели, записи обновляются
+    частями, прежние значения пишутся в журнал для отмены (см. bulk).
     """
     
     if request.method == 'POST':
         form = BulkEditForm(request.POST)
         if form.is_valid():
             model_type = form.cleaned_data['model_type']
-            ids = form.cleaned_data['ids']
-            field = form.cleaned_data['field_to_edit']
-            value = form.cleaned_data['new_value']
-            
-            model_map = {
-                'mineral_type': MineralType,
-                'stage': Stage,
-                'work': Work,
-                'question': Question,
-            }
-            
-            model = model_map.get(model_type)
-            if not model:
-                messages.error(request, 'Неизвестный тип модели')
-                return redirect('bulk_edit')
-            
-            # Проверяем, существует ли поле в модели
-            if not hasattr(model(), field):
-                messages.error(request, f'Поле "{field}" не существует в модели')
-                return redirect('bulk_edit')
             
-            # Обновляем записи
-            updated_count = model.objects.filter(id__in=ids).update(**{field: value})
-            
-            messages.success(request, f'✅ Обновлено {updated_count} записей')
-            return redirect('data_management', model_type=model_type)
+            try:
+                journal = bulk_set_field(
+                    model_type,
+                    form.cleaned_data['ids'],
+                    form.cleaned_data['field_to_edit'],
+                    form.cleaned_data['new_value'],
+                    user=request.user
+                )
+            except ValidationError as e:
+                messages.error(request, f'❌ {" ".join(e.messages)}')
+            else:
+                messages.success(request, f'✅ Обновлено {journal.row_count} записей. Правку можно отменить в журнале массового редактирования')
+                return redirect('data_management', model_type=model_type)
     else:
         form = BulkEditForm()
     
-    return render(request, 'admin/bulk_edit.html', {'form': form})
+    recent_edits = BulkEditJournal.objects.filter(user=request.user)[:10]
+    
+    return render(request, 'admin/bulk_edit.html', {'form': form, 'recent_edits': recent_edits})
+
+@login_required
+@moderator_required
+@require_http_methods(['POST'])
+def undo_bulk_edit(request, journal_id):
+    """
+    Отмена массовой правки по журналу
+    """
+    journal = get_object_or_404(BulkEditJournal, id=journal_id)
+    
+    try:
+        restored = revert_bulk_edit(journal)
+    except ValueError as e:
+        messages.error(request, f'❌ {e}')
+    else:
+        messages.success(request, f'↩️ Правка отменена, восстановлено записей: {restored}')
+    return redirect('bulk_edit')
 
 @login_required
 @moderator_required
@@ -935,20 +1033,11 @@ def get_model_fields(request):
     
     model_type = request.GET.get('model_type')
     
-    model_map = {
-        'mineral_type': MineralType,
-        'stage': Stage,
-        'work': Work,
-        'question': Question,
-        'faq': FAQ,
-    }
-    
-    if model_type not in model_map:
+    if model_type not in EDIT_FORMS:
         return JsonResponse({'fields': []})
     
-    model = model_map[model_type]
-    fields = [f.name for f in model._meta.get_fields() 
-              if not f.is_relation or f.one_to_one]
+    # Только поля, которые принимает массовая правка
+    fields = editable_fields(model_type)
     
     return JsonResponse({'fields': fields})
 
@@ -958,264 +1047,9 @@ def download_template(request, model_type):
     """
     Скачивание шаблона для импорта
     """
+    from .data_exchange import write_template
     
-    # Создаем пример данных для шаблона
-    template_data = []
-    
-    if model_type == 'mineral_type':
-        template_data = [
-            {
-                'name': 'Уголь',
-                'code': 'COAL',
-                'description': 'Каменный уголь'
-            },
-            {
-                'name': 'Золото',
-                'code': 'GOLD', 
-                'description': 'Россыпное золото'
-            },
-            {
-                'name': 'Нефть',
-                'code': 'OIL',
-                'description': 'Сырая нефть'
-            },
-            {
-                'name': 'Газ',
-                'code': 'GAS',
-                'description': 'Природный газ'
-            }
-        ]
-        
-    elif model_type == 'stage':
-        template_data = [
-            {
-                'mineral_type_id': 1,
-                'name': 'Геологическое изучение',
-                'code': 'GEOLOGY',
-                'order': 1,
-                'description': 'Предварительное геологическое изучение',
-                'duration_months': 6,
-                'start_month': 0,
-                'color': '#4285F4'
-            },
-            {
-                'mineral_type_id': 1,
-                'name': 'Лицензирование',
-                'code': 'LICENSING',
-                'order': 2,
-                'description': 'Получение лицензии на недропользование',
-                'duration_months': 12,
-                'start_month': 6,
-                'color': '#34A853'
-            },
-            {
-                'mineral_type_id': 1,
-                'name': 'Разведка',
-                'code': 'EXPLORATION',
-                'order': 3,
-                'description': 'Детальная разведка месторождения',
-                'duration_months': 18,
-                'start_month': 18,
-                'color': '#FBBC05'
-            }
-        ]
-        
-    elif model_type == 'work':
-        template_data = [
-            {
-                'stage_id': 1,
-                'number': '1.1',
-                'title': 'Сбор и анализ геологической информации',
-                'description': 'Сбор архивных материалов, анализ предыдущих исследований',
-                'executor': 'Геологическая служба',
-                'duration_months': 3,
-                'start_month': 0,
-                'order': 1
-            },
-            {
-                'stage_id': 1,
-                'number': '1.2',
-                'title': 'Полевые геологические работы',
-                'description': 'Маршрутные исследования, опробование',
-                'executor': 'Полевая геологическая партия',
-                'duration_months': 3,
-                'start_month': 3,
-                'order': 2
-            },
-            {
-                'stage_id': 2,
-                'number': '2.1',
-                'title': 'Подготовка документов для лицензии',
-                'description': 'Сбор необходимых документов и оформление заявки',
-                'executor': 'Юридический отдел',
-                'duration_months': 4,
-                'start_month': 0,
-                'order': 1
-            }
-        ]
-        
-    elif model_type == 'question':
-        template_data = [
-            {
-                'text': 'Какие документы нужны для получения лицензии?',
-                'code': 'LICENSE_DOCS',
-                'description': 'Вопрос о необходимых документах для лицензирования',
-                'mineral_types_ids': [1, 2],  # Можно указывать несколько ID через запятую
-                'target_stages_ids': [2]      # ID целевых этапов
-            },
-            {
-                'text': 'Сколько времени занимает геологическая разведка?',
-                'code': 'EXPLORATION_TIME',
-                'description': 'Вопрос о сроках проведения геологоразведочных работ',
-                'mineral_types_ids': [1, 2, 3, 4],
-                'target_stages_ids': [3, 4]
-            }
-        ]
-        
-    elif model_type == 'faq':
-        template_data = [
-            {
-                'question': 'Как создать диаграмму Ганта?',
-                'answer': 'Для создания диаграммы перейдите в раздел "Мои диаграммы" и нажмите "Создать новую". Затем выберите тип ПИ, стадию и целевой вопрос.',
-                'keywords': 'создание, диаграмма, гант, инструкция',
-                'order': 1,
-                'is_active': True
-            },
-            {
-                'question': 'Какой формат файлов поддерживается для импорта?',
-                'answer': 'Система поддерживает импорт данных из файлов JSON, CSV и Excel (.xlsx, .xls).',
-                'keywords': 'импорт, файлы, формат, json, csv, excel',
-                'order': 2,
-                'is_active': True
-            }
-        ]
-    
-    # Создаем DataFrame
-    df = pd.DataFrame(template_data)
-    
-    # Создаем инструкции
-    instructions_data = get_import_instructions(model_type)
-    
-    # Создаем ответ
     response = HttpResponse(content_type='application/vnd.ms-excel')
     response['Content-Disposition'] = f'attachment; filename="{model_type}_template.xlsx"'
-    
-    with BytesIO() as bio:
-        with pd.ExcelWriter(bio, engine='openpyxl') as writer:
-            # Лист с данными
-            df.to_excel(writer, index=False, sheet_name='Данные')
-            
-            # Лист с инструкциями
-            instructions_df = pd.DataFrame(instructions_data)
-            instructions_df.to_excel(writer, index=False, sheet_name='Инструкции')
-            
-            # Лист со справочником ID
-            if model_type in ['stage', 'work', 'question']:
-                id_ref_data = get_id_reference_data(model_type)
-                if id_ref_data:
-                    id_ref_df = pd.DataFrame(id_ref_data)
-                    id_ref_df.to_excel(writer, index=False, sheet_name='Справочник_ID')
-        
-        response.write(bio.getvalue())
-    
+    write_template(model_type, response)
     return response
-
-def get_import_instructions(model_type):
-    """Получение инструкций для импорта"""
-    instructions = []
-    
-    if model_type == 'mineral_type':
-        instructions = [
-            {'Поле': 'name', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название типа полезного ископаемого'},
-            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Уникальный код (латинскими буквами)'},
-            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Описание типа ПИ'}
-        ]
-    elif model_type == 'stage':
-        instructions = [
-            {'Поле': 'mineral_type_id', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'ID типа ПИ (см. справочник)'},
-            {'Поле': 'name', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название этапа'},
-            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Код этапа'},
-            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'Порядковый номер этапа'},
-            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Описание этапа'},
-            {'Поле': 'duration_months', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Длительность в месяцах (по умолчанию: 1)'},
-            {'Поле': 'start_month', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Старт от начала (по умолчанию: 0)'},
-            {'Поле': 'color', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Цвет в HEX формате (например: #4285F4)'}
-        ]
-    elif model_type == 'work':
-        instructions = [
-            {'Поле': 'stage_id', 'Тип': 'integer', 'Обязательное': 'Да', 'Описание': 'ID этапа (см. справочник)'},
-            {'Поле': 'number', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Номер работы (например: 1.1.1)'},
-            {'Поле': 'title', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Название работы'},
-            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Подробное описание работы'},
-            {'Поле': 'executor', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Исполнитель работы'},
-            {'Поле': 'duration_months', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Длительность в месяцах (по умолчанию: 1)'},
-            {'Поле': 'start_month', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Старт от начала этапа (по умолчанию: 0)'},
-            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Порядок в рамках этапа'}
-        ]
-    elif model_type == 'question':
-        instructions = [
-            {'Поле': 'text', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Текст вопроса'},
-            {'Поле': 'code', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Уникальный код вопроса'},
-            {'Поле': 'description', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Подробное описание вопроса'},
-            {'Поле': 'mineral_types_ids', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'ID типов ПИ через запятую (например: 1,2,3)'},
-            {'Поле': 'target_stages_ids', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'ID целевых этапов через запятую'}
-        ]
-    elif model_type == 'faq':
-        instructions = [
-            {'Поле': 'question', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Текст вопроса'},
-            {'Поле': 'answer', 'Тип': 'string', 'Обязательное': 'Да', 'Описание': 'Ответ на вопрос'},
-            {'Поле': 'keywords', 'Тип': 'string', 'Обязательное': 'Нет', 'Описание': 'Ключевые слова через запятую'},
-            {'Поле': 'order', 'Тип': 'integer', 'Обязательное': 'Нет', 'Описание': 'Порядок отображения'},
-            {'Поле': 'is_active', 'Тип': 'boolean', 'Обязательное': 'Нет', 'Описание': 'Активен (true/false)'}
-        ]
-    
-    return instructions
-
-def get_id_reference_data(model_type):
-    """Получение справочника ID для импорта"""
-    data = []
-    
-    if model_type == 'stage':
-        # Получаем список типов ПИ для справочника
-        mineral_types = MineralType.objects.all()
-        for mt in mineral_types:
-            data.append({
-                'ID': mt.id,
-                'Тип ПИ': mt.name,
-                'Код': mt.code
-            })
-    elif model_type == 'work':
-        # Получаем список этапов для справочника
-        stages = Stage.objects.select_related('mineral_type').all()
-        for stage in stages:
-            data.append({
-                'ID': stage.id,
-                'Этап': stage.name,
-                'Тип ПИ': stage.mineral_type.name,
-                'Код этапа': stage.code
-            })
-    elif model_type == 'question':
-        # Получаем списки типов ПИ и этапов
-        mineral_types = MineralType.objects.all()
-        stages = Stage.objects.all()
-        
-        data.append({'СПРАВОЧНИК ТИПОВ ПИ': ''})
-        for mt in mineral_types:
-            data.append({
-                'ID': mt.id,
-                'Название': mt.name,
-                'Код': mt.code
-            })
-        
-        data.append({})  # Пустая строка
-        
-        data.append({'СПРАВОЧНИК ЭТАПОВ': ''})
-        for stage in stages:
-            data.append({
-                'ID': stage.id,
-                'Этап': stage.name,
-                'Тип ПИ ID': stage.mineral_type.id,
-                'Код': stage.code
-            })
-    
-    return data
\ No newline at end of file
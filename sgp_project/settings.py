@@ -36,6 +36,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # ДОБАВЬТЕ ЭТУ СТРОЧКУ
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'roadmap_app.db_routing.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -63,11 +64,67 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'sgp_project.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# База данных: DB_ENGINE=postgresql — PostgreSQL (параметры POSTGRES_*), иначе SQLite (db.sqlite3)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'sgp'),
+            'USER': os.getenv('POSTGRES_USER', 'sgp'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Постоянные соединения: рабочий процесс не подключается заново на каждый запрос
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    # Реплика только для чтения (roadmap_app.db_routing), если задан ее хост
+    if os.getenv('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+            'PORT': os.getenv('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Блокировка записи берется в начале транзакции, поэтому busy_timeout ждет, а не падает
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
+    # Реплика только для чтения (roadmap_app.db_routing): по умолчанию тот же файл SQLite в режиме mode=ro,
+    # DB_REPLICA_NAME — путь к отдельной реплике, DB_READ_REPLICA=0 — все запросы в основную базу
+    if os.getenv('DB_READ_REPLICA', '1') == '1':
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f"{Path(os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME'])).resolve().as_uri()}?mode=ro",
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['roadmap_app.db_routing.PrimaryReplicaRouter']
+# Сколько секунд после записи сессия читает из основной базы
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+# PRAGMA для каждого соединения SQLite (roadmap_app.db_tuning); {} — настройки SQLite по умолчанию.
+# Режим журнала сохраняется в самом файле базы, поэтому учебная db.sqlite3 из репозитория
+# остается в DELETE; при развертывании задайте SQLITE_JOURNAL_MODE=WAL
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'DELETE')
+SQLITE_PRAGMAS = {
+    'journal_mode': SQLITE_JOURNAL_MODE,
+    # NORMAL безопасен только в WAL; с журналом отката — FULL
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL' if SQLITE_JOURNAL_MODE.upper() == 'WAL' else 'FULL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536')),
+    'temp_store': 'MEMORY',
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -101,10 +158,72 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Экспорт диаграмм: кэш готовых файлов и TrueType-шрифт с кириллицей для PDF/PNG
+CHART_EXPORT_CACHE_DIR = Path(os.getenv('CHART_EXPORT_CACHE_DIR', MEDIA_ROOT / 'chart_exports'))
+GANTT_EXPORT_FONT = os.getenv('GANTT_EXPORT_FONT') or None
+# Потоки подготовки файлов при выгрузке нескольких диаграмм одним архивом
+CHART_ARCHIVE_WORKERS = int(os.getenv('CHART_ARCHIVE_WORKERS', '4'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кэш: REDIS_URL — общий для всех рабочих процессов кэш Redis, иначе кэш в памяти процесса
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sgp-default',
+        }
+    }
+
+# Сессии: с общим кэшем (REDIS_URL) читаются из кэша, база — при промахе и для записи.
+# С кэшем в памяти процесса — только из базы: иначе другой рабочий процесс
+# отдавал бы из своей памяти сессию, завершенную при выходе
+if os.getenv('REDIS_URL'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Время жизни кэша статистики административной панели (секунды)
+ADMIN_STATS_CACHE_TTL = int(os.getenv('ADMIN_STATS_CACHE_TTL', '60'))
+
+# Портфель диаграмм: время жизни кэша и допустимая загрузка исполнителя (одновременных работ)
+PORTFOLIO_CACHE_TTL = int(os.getenv('PORTFOLIO_CACHE_TTL', '300'))
+PORTFOLIO_EXECUTOR_CAPACITY = int(os.getenv('PORTFOLIO_EXECUTOR_CAPACITY', '2'))
+
+# Анализ рисков сроков: время жизни кэша и число процессов симуляции (1 — без пула)
+RISK_CACHE_TTL = int(os.getenv('RISK_CACHE_TTL', '3600'))
+RISK_SIMULATION_WORKERS = int(os.getenv('RISK_SIMULATION_WORKERS', '1'))
+
+# Версии справочника: сколько процесс может не видеть чужую новую версию и время жизни снимков (секунды)
+REFERENCE_VERSION_CACHE_TTL = int(os.getenv('REFERENCE_VERSION_CACHE_TTL', '60'))
+REFERENCE_SNAPSHOT_CACHE_TTL = int(os.getenv('REFERENCE_SNAPSHOT_CACHE_TTL', '86400'))
+
+# Сколько дней удаленные записи хранятся в корзине (manage.py purge_trash)
+TRASH_RETENTION_DAYS = int(os.getenv('TRASH_RETENTION_DAYS', '30'))
+
+# Бюджет времени импорта модулей при старте рабочего процесса (manage.py check_startup), мс
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '800'))
+
 AUTH_USER_MODEL = 'users_app.CustomUser'
 
+# Пользователь сессии берется из LRU процесса (users_app.backends);
+# ModelBackend оставлен для сессий, созданных до его включения
+AUTHENTICATION_BACKENDS = [
+    'users_app.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Размер LRU пользователей и сколько секунд живет запись. Сохранение пользователя
+# сбрасывает записи через общий кэш, поэтому без REDIS_URL LRU выключен (0)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '512'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '30' if os.getenv('REDIS_URL') else '0'))
+
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
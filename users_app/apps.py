@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class UsersAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users_app'
-    verbose_name = 'Пользователи'
\ No newline at end of file
+    verbose_name = 'Пользователи'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,122 @@
+"""
+Аутентификация с кэшем пользователей в памяти процесса.
+
+AuthenticationMiddleware на каждом запросе загружает пользователя
+сессии отдельным запросом к базе. CachedModelBackend хранит недавно
+загруженных пользователей в LRU (USER_CACHE_SIZE записей) и отдает
+копию без запроса; проверки ролей (is_moderator, is_admin) читают
+поля этой копии и тоже обходятся без запросов.
+
+Сохранение и удаление CustomUser (users_app.signals) сбрасывает запись
+в текущем процессе и увеличивает счетчик user:<id>:gen в кэше по
+умолчанию. Запись из LRU отдается, только пока счетчик не изменился,
+поэтому с общим кэшем (REDIS_URL) другие процессы видят изменение на
+следующем запросе. Кэш в памяти процесса другим процессам не виден:
+без REDIS_URL USER_CACHE_TTL по умолчанию 0 и LRU не используется.
+Изменения через QuerySet.update() сигналов не вызывают и видны не позже
+чем через USER_CACHE_TTL секунд.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_CACHE_SIZE = getattr(settings, 'USER_CACHE_SIZE', 512)
+USER_CACHE_TTL = getattr(settings, 'USER_CACHE_TTL', 30)
+
+# id пользователя -> (момент загрузки, счетчик user:<id>:gen, пользователь); порядок — от давно использованных
+_users = OrderedDict()
+_lock = threading.Lock()
+# Счетчик сбросов: пользователь, загруженный до сброса, в кэш не попадает
+_generation = 0
+
+
+def _shared_generation_key(user_id):
+    return f'users_app:user:{user_id}:gen'
+
+
+def shared_generation(user_id):
+    return cache.get(_shared_generation_key(user_id), 0)
+
+
+def invalidate_user(user_id):
+    """
+    Сбрасывает пользователя в этом процессе и во всех процессах с тем же кэшем
+    """
+    global _generation
+    with _lock:
+        _users.pop(user_id, None)
+        _generation += 1
+    key = _shared_generation_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен между add и incr: любое новое значение сбрасывает записи
+        cache.set(key, time.time_ns(), None)
+
+
+def clear_user_cache():
+    global _generation
+    with _lock:
+        _users.clear()
+        _generation += 1
+
+
+def _detached(user):
+    """
+    Копия для одного запроса: свои поля, _state и кэш связанных объектов,
+    поэтому запрос может менять request.user, не затрагивая другие запросы и потоки
+    """
+    clone = copy.copy(user)
+    clone._state = copy.copy(user._state)
+    clone._state.fields_cache = {}
+    return clone
+
+
+def cached_user(user_id):
+    """
+    Пользователь по id из LRU или из базы; None, если его нет
+    """
+    if USER_CACHE_TTL <= 0:
+        User = get_user_model()
+        return User._default_manager.filter(pk=user_id).first()
+
+    now = time.monotonic()
+    # Счетчик читается до загрузки из базы: изменение во время загрузки не потеряется
+    shared = shared_generation(user_id)
+    with _lock:
+        entry = _users.get(user_id)
+        if entry is not None and now - entry[0] < USER_CACHE_TTL and entry[1] == shared:
+            _users.move_to_end(user_id)
+            return _detached(entry[2])
+        generation = _generation
+
+    User = get_user_model()
+    try:
+        user = User._default_manager.get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+
+    with _lock:
+        if generation == _generation:
+            _users[user_id] = (now, shared, user)
+            _users.move_to_end(user_id)
+            while len(_users) > USER_CACHE_SIZE:
+                _users.popitem(last=False)
+    return _detached(user)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, загружающий пользователя сессии через cached_user
+    """
+
+    def get_user(self, user_id):
+        user = cached_user(get_user_model()._meta.pk.to_python(user_id))
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from .backends import invalidate_user
+
 User = get_user_model()
 
 @receiver(post_save, sender=User)
@@ -11,4 +13,12 @@ def set_default_role_for_admin(sender, instance, created, **kwargs):
     """
     if created and instance.is_superuser and not instance.role:
         instance.role = 'admin'
-        instance.save(update_fields=['role'])
\ No newline at end of file
+        instance.save(update_fields=['role'])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Сбрасываем пользователя в кэше CachedModelBackend всех процессов
+    """
+    invalidate_user(instance.pk)